@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Run the benchmark suites and write the results as JSON
+
+    python benchmarks/run.py                                  # all suites, stub models
+    python benchmarks/run.py --suites batch,export --compare benchmarks/results/baseline.json
+    python benchmarks/run.py --suites batch --real_models     # same scheduling benchmark, real models
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / "script" / "tagging"))
+
+logger = logging.getLogger("benchmarks")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    from suites import SUITES
+
+    parser = argparse.ArgumentParser(description="Reproducible benchmarks of the tagging pipeline and scripts")
+    parser.add_argument("--suites", type=str, default=",".join(SUITES),
+                        help=f"Comma-separated suites (default: {','.join(SUITES)})")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="Baseline result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change reported as a regression (default: 0.10)")
+    parser.add_argument("--packs", type=int, default=4, help="Synthetic packs (default: 4)")
+    parser.add_argument("--icons", type=int, default=25, help="Icons per pack (default: 25)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Repetitions of the short suites, the best one is kept (default: 3)")
+    parser.add_argument("--workers", type=str, default="1,2",
+                        help="Worker counts for the batch suite (default: 1,2)")
+    parser.add_argument("--cache_entries", type=int, default=5000,
+                        help="Entries for the cache suite (default: 5000)")
+    parser.add_argument("--export_dirs", type=int, default=1000,
+                        help="Directories for the export suite (default: 1000)")
+    parser.add_argument("--export_icons", type=int, default=5,
+                        help="Icons per directory for the export suite (default: 5)")
+    parser.add_argument("--export_workers", type=int, default=8,
+                        help="Threads of the threaded export (default: 8)")
+    parser.add_argument("--unzip_workers", type=int, default=0,
+                        help="Processes of the parallel unzip, 0 = the scripts' automatic choice (default: 0)")
+    parser.add_argument("--caption_ms", type=float, default=20.0, help="Stub BLIP latency (default: 20)")
+    parser.add_argument("--clip_ms", type=float, default=10.0, help="Stub CLIP latency (default: 10)")
+    parser.add_argument("--tags_ms", type=float, default=10.0, help="Stub KeyBERT latency (default: 10)")
+    parser.add_argument("--latency_mode", type=str, choices=["spin", "sleep"], default="spin",
+                        help="Stub latency burns CPU (spin) or idles (sleep) (default: spin)")
+    parser.add_argument("--real_models", action="store_true",
+                        help="Use the real models instead of the stubs")
+    parser.add_argument("--workdir", type=str, default=None,
+                        help="Keep generated data in this directory (default: a temporary directory)")
+
+    args = parser.parse_args(argv)
+    args.workers = [int(w) for w in args.workers.split(",") if w]
+    args.suites = [s for s in args.suites.split(",") if s]
+    unknown = [s for s in args.suites if s not in SUITES]
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(unknown)}")
+    return args
+
+def environment(args):
+    """Context stored with the results, to only compare like with like"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "real_models": args.real_models,
+        "packs": args.packs,
+        "icons_per_pack": args.icons,
+        "seed": args.seed,
+        "stub_latency_ms": None if args.real_models else {
+            "caption": args.caption_ms, "clip": args.clip_ms, "tags": args.tags_ms, "mode": args.latency_mode
+        }
+    }
+
+def compare(results, baseline, threshold):
+    """
+    Compare numeric results with a baseline
+
+    Returns:
+        List of (suite, metric, baseline, current, relative change, is_regression)
+    """
+    rows = []
+    for suite, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(suite, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            if metric.endswith("_per_sec") or metric.endswith("_ratio"):
+                regression = change < -threshold
+            elif metric.endswith("_sec") or metric.endswith("_uss_mb"):
+                regression = change > threshold
+            else:
+                regression = False
+            rows.append((suite, metric, old, value, change, regression))
+    return rows
+
+def main(argv=None):
+    """Run the selected suites"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+
+    if not args.real_models:
+        import stubs
+        stubs.install_stub_models()
+        stubs.configure(caption_ms=args.caption_ms, clip_ms=args.clip_ms, tags_ms=args.tags_ms, mode=args.latency_mode)
+
+    from suites import SUITES, CheckFailed
+
+    # The pipeline's own per-image logging would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tagforge_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    results = {}
+    failed_checks = []
+    for name in args.suites:
+        logger.info(f"Running {name}...")
+        start = time.perf_counter()
+        try:
+            results[name] = SUITES[name](workdir, args)
+        except CheckFailed as e:
+            logger.error(f"Suite {name} check failed: {e}")
+            results[name] = {"check_failed": str(e)}
+            failed_checks.append(name)
+        except Exception as e:
+            logger.error(f"Suite {name} failed: {e}")
+            results[name] = {"error": str(e)}
+        logger.info(f"  {name}: {json.dumps(results[name])} ({time.perf_counter() - start:.1f}s)")
+
+    output = args.output or str(BENCH_DIR / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({"environment": environment(args), "results": results}, f, ensure_ascii=False, indent=2)
+    logger.info(f"Results written: {output}")
+
+    if not args.workdir:
+        import shutil
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failed_checks:
+        logger.error(f"Checks failed in {', '.join(failed_checks)}")
+        return 1
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        regressions = 0
+        for suite, metric, old, new, change, regression in compare(results, baseline, args.threshold):
+            regressions += regression
+            marker = "REGRESSION" if regression else ""
+            logger.info(f"{suite}.{metric}: {old:.4g} -> {new:.4g} ({change:+.1%}) {marker}")
+        if regressions:
+            logger.warning(f"{regressions} metrics regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
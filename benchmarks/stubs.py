@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Deterministic stand-ins for ClipInterrogatorModel and TagGenerator
+
+They keep the real interfaces and cache behaviour (desc_/tags_ cache files), but
+replace inference with a configurable latency, so pipeline overhead can be
+measured without downloading any model.
+"""
+
+import os
+import sys
+import time
+import types
+import hashlib
+
+from models.utils import get_cache_path, save_to_cache, load_from_cache, setup_cache_dir
+from models.metrics import METRICS, timed
+from models.sources import open_image_source
+
+WORDS = [
+    "simple", "flat", "outline", "symbol", "minimal", "business", "travel", "food", "nature",
+    "holiday", "sport", "office", "weather", "speech", "gift", "music", "home", "health"
+]
+
+# Simulated latency per call, in milliseconds, and how it is spent
+LATENCY = {"caption_ms": 20.0, "clip_ms": 10.0, "tags_ms": 10.0, "mode": "spin"}
+
+def configure(caption_ms=None, clip_ms=None, tags_ms=None, mode=None):
+    """Set the simulated latencies (mode 'spin' burns CPU like inference, 'sleep' does not)"""
+    for key, value in (("caption_ms", caption_ms), ("clip_ms", clip_ms), ("tags_ms", tags_ms), ("mode", mode)):
+        if value is not None:
+            LATENCY[key] = value
+
+def _wait(milliseconds):
+    if milliseconds <= 0:
+        return
+    if LATENCY["mode"] == "sleep":
+        time.sleep(milliseconds / 1000)
+        return
+    deadline = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+def _words(seed_text, count):
+    digest = hashlib.sha256(seed_text.encode("utf-8")).digest()
+    return [WORDS[b % len(WORDS)] for b in digest[:count]]
+
+class StubClipInterrogatorModel:
+    """Same interface as models.clip_model.ClipInterrogatorModel"""
+
+    def __init__(self, clip_model_name=None, device=None, cache_dir="data/cache", **kwargs):
+        self.cache_dir = setup_cache_dir(cache_dir)
+        self.device = device or "cpu"
+
+    @timed("blip_generate")
+    def _caption(self, image_path):
+        _wait(LATENCY["caption_ms"])
+        name = os.path.splitext(os.path.basename(image_path))[0].split("-", 1)[-1]
+        return f"a {' '.join(_words(image_path, 2))} {name} on a plain background"
+
+    @timed("clip_interrogate")
+    def _details(self, image_path):
+        _wait(LATENCY["clip_ms"])
+        return _words(image_path + "#clip", 3)
+
+    def generate_description(self, image_path, use_cache=True, cheap=False):
+        cache_path = get_cache_path(image_path, prefix="desc_", cache_dir=self.cache_dir)
+        if use_cache:
+            cached_data = load_from_cache(cache_path, image_path)
+            if cached_data:
+                return cached_data["description"]
+
+        with METRICS.timer("image_decode"):
+            source = open_image_source(image_path)
+            with (open(source, "rb") if isinstance(source, str) else source) as f:
+                f.read()
+        description = self._caption(image_path)
+        if not cheap:
+            description += f". It features elements like {', '.join(self._details(image_path))}."
+            save_to_cache({"description": description}, cache_path, image_path)
+        return description
+
+    def generate_descriptions(self, image_paths, use_cache=True):
+        return [self.generate_description(path, use_cache=use_cache) for path in image_paths]
+
+class StubTagGenerator:
+    """Same interface as models.tag_generator.TagGenerator"""
+
+    def __init__(self, model_name=None, device=None, cache_dir="data/cache", **kwargs):
+        self.cache_dir = setup_cache_dir(cache_dir)
+
+    @timed("keybert")
+    def _extract(self, description, num_tags):
+        _wait(LATENCY["tags_ms"])
+        return list(dict.fromkeys(description.lower().replace(".", "").replace(",", "").split()))[:num_tags]
+
+    def generate_tags(self, description, image_path=None, num_tags=25, diversity=0.7, use_cache=True):
+        cache_path = None
+        if image_path and use_cache:
+            cache_path = get_cache_path(image_path, prefix="tags_", cache_dir=self.cache_dir)
+            cached_data = load_from_cache(cache_path, image_path)
+            if cached_data:
+                return cached_data["tags"]
+
+        tags = self._extract(description, num_tags)
+        if cache_path:
+            save_to_cache({"tags": tags}, cache_path, image_path)
+        return tags
+
+def install_stub_models():
+    """
+    Make `from models.clip_model import ClipInterrogatorModel` (and TagGenerator) resolve to the stubs
+
+    Worker processes inherit this through fork; with the spawn start method
+    (Windows/macOS) the workers would load the real models instead.
+    """
+    clip_module = types.ModuleType("models.clip_model")
+    clip_module.ClipInterrogatorModel = StubClipInterrogatorModel
+    tag_module = types.ModuleType("models.tag_generator")
+    tag_module.TagGenerator = StubTagGenerator
+    sys.modules["models.clip_model"] = clip_module
+    sys.modules["models.tag_generator"] = tag_module
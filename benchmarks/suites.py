@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark suites, each returning a flat dict of numbers (rates end in _per_sec, durations in _sec, memory in _uss_mb)"""
+
+import io
+import os
+import sys
+import time
+import json
+import shutil
+import zipfile
+import random
+import importlib.util
+import contextlib
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+from synthetic import generate_packs, dataset_size
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TAGGING_DIR = REPO_ROOT / "script" / "tagging"
+UNZIP_DIR = REPO_ROOT / "script" / "unzip"
+
+# Modules that must stay out of the startup path (loaded only when a model is needed)
+STARTUP_FORBIDDEN_MODULES = ("torch", "transformers", "gensim", "keybert")
+
+class CheckFailed(Exception):
+    """A suite measured a result that must not ship (run.py exits with an error)"""
+
+def _load_script_module(path, name):
+    """Import a standalone script whose own `config` module would clash with script/tagging/config.py"""
+    saved_config = sys.modules.pop("config", None)
+    sys.path.insert(0, str(Path(path).parent))
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        # Registered so its functions can be pickled to the process pools of the scripts
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        sys.path.remove(str(Path(path).parent))
+        sys.modules.pop("config", None)
+        if saved_config is not None:
+            sys.modules["config"] = saved_config
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the print-based scripts (unzip, colorizer) while they are timed"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def bench_batch(workdir, options):
+    """BatchProcessor scheduling: cold runs per worker count, then a fully cached run"""
+    from pipeline.batch import BatchProcessor
+    from models.metrics import METRICS
+
+    input_dir = Path(workdir) / "batch_input"
+    generate_packs(input_dir, packs=options.packs, icons_per_pack=options.icons, seed=options.seed)
+    images = options.packs * options.icons
+
+    # Short admission poll: the stubs warm up instantly, real models take far longer than this
+    BatchProcessor.ADMISSION_POLL_INTERVAL = 0.1
+
+    results = {"images": images}
+    cache_dir = None
+    for workers in options.workers:
+        cache_dir = Path(workdir) / f"batch_cache_{workers}"
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        METRICS.reset()
+        processor = BatchProcessor(use_gpu=options.real_models, workers=workers, cache_dir=str(cache_dir),
+                                   image_timeout=None, share_weights=False)
+        start = time.perf_counter()
+        processor.process_batch(str(input_dir))
+        elapsed = time.perf_counter() - start
+        results[f"cold_workers{workers}_sec"] = elapsed
+        results[f"cold_workers{workers}_images_per_sec"] = images / elapsed
+
+    # Everything cached: measures discovery and the cache pre-scan only
+    processor = BatchProcessor(use_gpu=False, workers=options.workers[-1], cache_dir=str(cache_dir))
+    start = time.perf_counter()
+    processor.process_batch(str(input_dir))
+    elapsed = time.perf_counter() - start
+    results["cached_sec"] = elapsed
+    results["cached_images_per_sec"] = images / elapsed
+
+    # Same packs as ZIPs: extract then tag, against tagging straight from the archives
+    zip_dir = Path(workdir) / "batch_zips"
+    zip_files = generate_packs(zip_dir, packs=options.packs, icons_per_pack=options.icons, seed=options.seed, zipped=True)
+    for label, zip_sources in (("extract_then_tag", "off"), ("zip_sources", "only")):
+        cache_dir = Path(workdir) / f"batch_cache_{label}"
+        extract_dir = Path(workdir) / "batch_extracted"
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        shutil.rmtree(extract_dir, ignore_errors=True)
+        processor = BatchProcessor(use_gpu=options.real_models, workers=options.workers[-1], cache_dir=str(cache_dir),
+                                   image_timeout=None, share_weights=False, zip_sources=zip_sources)
+        start = time.perf_counter()
+        if zip_sources == "off":
+            for zip_path in zip_files:
+                with zipfile.ZipFile(zip_path) as zip_ref:
+                    zip_ref.extractall(extract_dir)
+        processor.process_batch(str(extract_dir if zip_sources == "off" else zip_dir))
+        elapsed = time.perf_counter() - start
+        results[f"{label}_sec"] = elapsed
+        results[f"{label}_images_per_sec"] = images / elapsed
+    return results
+
+def bench_cache(workdir, options):
+    """JSON file cache: put, hit and miss throughput"""
+    from models.utils import get_cache_path, save_to_cache, load_from_cache
+
+    cache_dir = Path(workdir) / "cache_bench"
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    cache_dir.mkdir(parents=True)
+    count = options.cache_entries
+    keys = [f"/icons/{i // 50}/png/{i:06d}-icon.png" for i in range(count)]
+    payload = {"description": "A simple flat outline symbol of a house. It features elements like roof, door."}
+
+    start = time.perf_counter()
+    for key in keys:
+        save_to_cache(payload, get_cache_path(key, prefix="desc_", cache_dir=str(cache_dir)))
+    put_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        load_from_cache(get_cache_path(key, prefix="desc_", cache_dir=str(cache_dir)))
+    hit_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        load_from_cache(get_cache_path(key, prefix="tags_", cache_dir=str(cache_dir)))
+    miss_sec = time.perf_counter() - start
+
+    return {
+        "entries": count,
+        "put_per_sec": count / put_sec,
+        "get_hit_per_sec": count / hit_sec,
+        "get_miss_per_sec": count / miss_sec
+    }
+
+def _synthetic_metadata(pack_dir):
+    rows = []
+    for svg in sorted((Path(pack_dir) / "svg").glob("*.svg")):
+        rows.append({
+            "filename": svg.name,
+            "title": svg.stem.split("-", 1)[-1],
+            "keywords": "simple,flat,outline,\"quoted\",back\\slash",
+            "Artist": "",
+            "description": f"A simple flat outline symbol of a {svg.stem}, with a comma."
+        })
+    return rows
+
+def bench_export(workdir, options):
+    """MetadataExporter over many directories: serial vs threaded, then an unchanged re-export"""
+    from pipeline.export import MetadataExporter, write_metadata_csv
+
+    input_dir = Path(workdir) / "export_input"
+    shutil.rmtree(input_dir, ignore_errors=True)
+    pack_dirs = generate_packs(input_dir, packs=options.export_dirs, icons_per_pack=options.export_icons,
+                               seed=options.seed, with_png=False)
+    batch_results = {Path(d).name: _synthetic_metadata(d) for d in pack_dirs}
+    rows = sum(len(r) for r in batch_results.values())
+    results = {"directories": len(batch_results), "rows": rows}
+
+    for label, workers in (("serial", 1), ("threaded", options.export_workers)):
+        output_dir = Path(workdir) / f"export_output_{label}"
+        shutil.rmtree(output_dir, ignore_errors=True)
+        exporter = MetadataExporter(output_base_dir=str(output_dir), asset_mode="copy", workers=workers)
+        start = time.perf_counter()
+        exporter.export_batch_results(batch_results, str(input_dir))
+        elapsed = time.perf_counter() - start
+        results[f"{label}_sec"] = elapsed
+        results[f"{label}_directories_per_sec"] = len(batch_results) / elapsed
+
+    # Same input again: csv rewritten, svg folders left alone
+    start = time.perf_counter()
+    exporter.export_batch_results(batch_results, str(input_dir))
+    elapsed = time.perf_counter() - start
+    results["resync_sec"] = elapsed
+    results["resync_directories_per_sec"] = len(batch_results) / elapsed
+
+    # The streaming writer must stay byte-identical to the former pandas export
+    try:
+        import pandas as pd
+    except ImportError:
+        return results
+    sample = next(iter(batch_results.values()))
+    pandas_path = Path(workdir) / "export_pandas.csv"
+    stream_path = Path(workdir) / "export_stream.csv"
+    pd.DataFrame(sample)[["filename", "title", "keywords", "Artist", "description"]].to_csv(
+        pandas_path, index=False, encoding='utf-8', quoting=1, quotechar='"', escapechar='\\')
+    write_metadata_csv(stream_path, sample)
+    results["pandas_identical"] = int(pandas_path.read_bytes() == stream_path.read_bytes())
+    return results
+
+def bench_unzip(workdir, options):
+    """unzip_files_all.py and unzip_files_svg_only.py extraction throughput (best of --repeat)"""
+    zip_dir = Path(workdir) / "zips"
+    shutil.rmtree(zip_dir, ignore_errors=True)
+    zip_paths = generate_packs(zip_dir, packs=options.packs, icons_per_pack=options.icons, seed=options.seed, zipped=True)
+    megabytes = dataset_size(zip_paths) / 2**20
+    files = options.packs * options.icons * 2
+
+    results = {"archives": len(zip_paths), "zip_size_mb": megabytes}
+    for label, script in (("all", "unzip_files_all.py"), ("svg_only", "unzip_files_svg_only.py")):
+        module = _load_script_module(UNZIP_DIR / script, f"bench_unzip_{label}")
+        output_dir = Path(workdir) / f"unzip_{label}"
+        timings = []
+        for _ in range(options.repeat):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            output_dir.mkdir(parents=True)
+            start = time.perf_counter()
+            with _quiet():
+                for zip_path in zip_paths:
+                    module.process_zip_file(Path(zip_path), output_dir)
+            timings.append(time.perf_counter() - start)
+        elapsed = min(timings)
+        results[f"{label}_sec"] = elapsed
+        results[f"{label}_mb_per_sec"] = megabytes / elapsed
+        results[f"{label}_files_per_sec"] = files / elapsed
+
+        # Same archives through the process pool of the scripts
+        timings = []
+        for _ in range(options.repeat):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            output_dir.mkdir(parents=True)
+            start = time.perf_counter()
+            with _quiet():
+                summary = module.process_archives(module.process_zip_file, [Path(p) for p in zip_paths], output_dir,
+                                                  workers=options.unzip_workers)
+            timings.append(time.perf_counter() - start)
+        elapsed = min(timings)
+        results["unzip_workers"] = summary["workers"]
+        results[f"{label}_parallel_sec"] = elapsed
+        results[f"{label}_parallel_mb_per_sec"] = megabytes / elapsed
+
+    # main.py --mode both: both trees from a single pass over each archive
+    module = _load_script_module(UNZIP_DIR / "main.py", "bench_unzip_main")
+    output_dirs = {"all": Path(workdir) / "unzip_both_all", "svg_only": Path(workdir) / "unzip_both_svg_only"}
+    timings = []
+    for _ in range(options.repeat):
+        for output_dir in output_dirs.values():
+            shutil.rmtree(output_dir, ignore_errors=True)
+            output_dir.mkdir(parents=True)
+        start = time.perf_counter()
+        with _quiet():
+            for zip_path in zip_paths:
+                module.process_zip_file(Path(zip_path), output_dirs)
+        timings.append(time.perf_counter() - start)
+    results["both_sec"] = min(timings)
+    results["both_vs_separate_ratio"] = (results["all_sec"] + results["svg_only_sec"]) / results["both_sec"]
+
+    # Second run over unchanged archives: only the manifests are checked
+    with _quiet():
+        module.unzip(str(zip_dir), mode="both", workers=1, force=True)
+        start = time.perf_counter()
+        module.unzip(str(zip_dir), mode="both", workers=1)
+    results["unchanged_rerun_sec"] = time.perf_counter() - start
+    return results
+
+def bench_colorizer(workdir, options):
+    """colorizer.py: SVG recolouring throughput (best of --repeat)"""
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    from script.svg_painter import colorizer
+
+    input_dir = Path(workdir) / "colorizer_input"
+    output_dir = Path(workdir) / "colorizer_output"
+    shutil.rmtree(output_dir, ignore_errors=True)
+    generate_packs(input_dir, packs=options.packs, icons_per_pack=options.icons, seed=options.seed)
+    colorizer.SVG_INPUT_DIR = str(input_dir)
+    colorizer.SVG_OUTPUT_DIR = str(output_dir)
+
+    rng = random.Random(options.seed)
+    palettes = {str(i): {"colors": ["#%06x" % rng.randrange(0x1000000) for _ in range(5)]} for i in range(50)}
+    random.seed(options.seed)
+    manager = colorizer.ColorPaletteManager(palettes)
+    svg_files = colorizer.find_svg_files(str(input_dir))
+
+    timings = []
+    for _ in range(options.repeat):
+        start = time.perf_counter()
+        with _quiet():
+            for svg_file in svg_files:
+                colorizer.process_svg_file(svg_file, manager)
+        timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+    return {"svg_files": len(svg_files), "colorize_sec": elapsed, "svg_per_sec": len(svg_files) / elapsed}
+
+def bench_pipeline(workdir, options):
+    """runserver.py orchestrate: per-pack DAG against running each stage over every pack in turn"""
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.append(str(REPO_ROOT))
+    from pipeline.orchestrator import Pack, PackPipeline, PackStages
+    from pipeline.export import MetadataExporter
+    from pipeline.processor import ImageProcessor
+
+    zip_dir = Path(workdir) / "pipeline_zips"
+    zip_files = generate_packs(zip_dir, packs=options.packs, icons_per_pack=options.icons, seed=options.seed, zipped=True)
+    rng = random.Random(options.seed)
+    palettes_file = Path(workdir) / "pipeline_palettes.json"
+    palettes_file.write_text(json.dumps({str(i): {"colors": ["#%06x" % rng.randrange(0x1000000) for _ in range(5)]}
+                                         for i in range(50)}))
+
+    def pack_stages(label):
+        base = Path(workdir) / f"pipeline_{label}"
+        shutil.rmtree(base, ignore_errors=True)
+        cache_dir = str(base / "cache")
+        return PackStages(base / "extracted", base / "colorized", MetadataExporter(str(base / "output"), workers=1),
+                          lambda: ImageProcessor(use_gpu=options.real_models, cache_dir=cache_dir),
+                          cache_dir=cache_dir, palettes_file=str(palettes_file))
+
+    # One stage at a time over every pack, as the separate scripts do: the first pack is done at the end
+    stages = pack_stages("staged")
+    packs = [Pack(index, zip_path) for index, zip_path in enumerate(zip_files)]
+    start = time.perf_counter()
+    with _quiet():
+        for pack in packs:
+            stages.extract(pack)
+        for pack in packs:
+            call = stages.colorize_args(pack)
+            if call:
+                call[0](*call[1:])
+        for pack in packs:
+            stages.tag(pack)
+        for pack in packs:
+            stages.export(pack)
+    staged = time.perf_counter() - start
+
+    stages = pack_stages("streaming")
+    pipeline = PackPipeline(stages.stages(extract_workers=2, colorize_workers=max(1, (os.cpu_count() or 2) - 1)),
+                            max_in_flight=8)
+    with _quiet():
+        summary = pipeline.run(zip_files)
+
+    results = {"packs": len(zip_files), "staged_sec": staged, "streaming_sec": summary["elapsed_sec"],
+               "streaming_first_pack_sec": summary["first_pack_sec"]}
+    for name, stage in summary["stages"].items():
+        results[f"{name}_items_per_sec"] = stage["items_per_sec"]
+    return results
+
+def bench_startup(workdir, options):
+    """Cold start of runserver.py (--help) and the heavy modules its import pulls in"""
+    timings = []
+    for _ in range(options.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(TAGGING_DIR / "runserver.py"), "--help"],
+                       cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+
+    probe = (
+        "import sys; sys.path.insert(0, {path!r}); import runserver; "
+        "print(','.join(m for m in ('torch', 'transformers', 'gensim', 'keybert', 'pandas', 'PIL') if m in sys.modules))"
+    ).format(path=str(TAGGING_DIR))
+    heavy = subprocess.run([sys.executable, "-c", probe], cwd=workdir, capture_output=True, text=True,
+                           check=True).stdout.strip()
+    heavy = [m for m in heavy.split(",") if m]
+    forbidden = [m for m in heavy if m in STARTUP_FORBIDDEN_MODULES]
+    if forbidden:
+        raise CheckFailed(f"runserver.py imports {', '.join(forbidden)} at startup")
+    return {"help_best_sec": min(timings), "help_mean_sec": sum(timings) / len(timings),
+            "heavy_modules_imported": len(heavy)}
+
+def _uss_of_workers(context, target, args, workers):
+    """Sum of the unique memory of forked workers once they signal they are warm"""
+    import psutil
+
+    ready = context.Queue()
+    release = context.Event()
+    processes = [context.Process(target=target, args=args + (ready, release)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get(timeout=120)
+    total = sum(psutil.Process(p.pid).memory_full_info().uss for p in processes)
+    release.set()
+    for process in processes:
+        process.join()
+    return total
+
+def _touch_shared(model, ready, release):
+    import torch
+    with torch.no_grad():
+        model(torch.ones(1, model[0].in_features))
+    ready.put(True)
+    release.wait()
+
+def _load_private(layers, width, ready, release):
+    import torch
+    model = torch.nn.Sequential(*[torch.nn.Linear(width, width) for _ in range(layers)])
+    with torch.no_grad():
+        model(torch.ones(1, width))
+    ready.put(True)
+    release.wait()
+
+def bench_shared_memory(workdir, options):
+    """Worker memory with weights loaded per worker vs shared from the parent (stand-in model)"""
+    try:
+        import torch
+        import psutil  # noqa: F401
+    except ImportError:
+        return {"skipped": "torch and psutil are required"}
+    from pipeline.shared import fork_context, freeze_for_sharing
+
+    context = fork_context()
+    if context is None:
+        return {"skipped": "fork start method unavailable"}
+
+    # 128 MB of weights: well above the private memory a forked worker needs for itself
+    layers, width = 8, 2048
+    weight_mb = layers * (width * width + width) * 4 / 2**20
+    workers = max(2, min(4, multiprocessing.cpu_count()))
+
+    private = _uss_of_workers(context, _load_private, (layers, width), workers)
+    model = torch.nn.Sequential(*[torch.nn.Linear(width, width) for _ in range(layers)])
+    freeze_for_sharing(model)
+    shared = _uss_of_workers(context, _touch_shared, (model,), workers)
+    # Without sharing, each worker holds its own copy: the total is then above workers x weights
+    if shared / 2**20 >= workers * weight_mb:
+        raise CheckFailed(f"Workers sharing the weights use {shared / 2**20:.0f} MB, "
+                          f"not below {workers} x {weight_mb:.0f} MB of weights")
+    return {
+        "workers": workers,
+        "weights_mb": weight_mb,
+        "private_total_uss_mb": private / 2**20,
+        "shared_total_uss_mb": shared / 2**20,
+        "saving_ratio": private / shared if shared else 0.0
+    }
+
+SUITES = {
+    "batch": bench_batch,
+    "cache": bench_cache,
+    "export": bench_export,
+    "unzip": bench_unzip,
+    "colorizer": bench_colorizer,
+    "pipeline": bench_pipeline,
+    "startup": bench_startup,
+    "shared_memory": bench_shared_memory,
+}
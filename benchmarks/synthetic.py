@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Deterministic synthetic icon packs (PNG + SVG, optionally zipped) for benchmarks"""
+
+import os
+import zlib
+import struct
+import random
+import zipfile
+from pathlib import Path
+
+ICON_NAMES = [
+    "apple", "bicycle", "camera", "diamond", "envelope", "flower", "guitar", "house",
+    "island", "jacket", "kettle", "lamp", "mountain", "notebook", "orange", "pencil",
+    "queen", "rocket", "sun", "tree", "umbrella", "violin", "whale", "yacht"
+]
+
+PACK_THEMES = ["speeches", "holidays", "travel", "kitchen", "sports", "weather", "office", "nature"]
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xffffffff)
+
+def make_png(size, rng):
+    """
+    Encode an RGB icon (coloured shapes on white) as PNG bytes without any imaging library
+
+    Args:
+        size: Width and height in pixels
+        rng: random.Random used for the shapes
+    """
+    pixels = bytearray(b"\xff" * (size * size * 3))
+    for _ in range(rng.randint(2, 5)):
+        color = bytes(rng.randrange(256) for _ in range(3))
+        x0, y0 = rng.randrange(size // 2), rng.randrange(size // 2)
+        x1, y1 = x0 + rng.randrange(size // 4, size // 2), y0 + rng.randrange(size // 4, size // 2)
+        for y in range(y0, min(y1, size)):
+            row = y * size * 3
+            for x in range(x0, min(x1, size)):
+                pixels[row + x * 3:row + x * 3 + 3] = color
+
+    raw = b"".join(b"\x00" + bytes(pixels[y * size * 3:(y + 1) * size * 3]) for y in range(size))
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(raw, 6)) + _png_chunk(b"IEND", b""))
+
+def make_svg(rng, elements=12):
+    """SVG icon with black and default-black shapes, like the packs the colorizer handles"""
+    shapes = []
+    for _ in range(elements):
+        kind = rng.choice(["path", "circle", "rect"])
+        fill = rng.choice(['fill="#000000"', 'style="fill:#000"', "", 'fill="#ff8800"'])
+        if kind == "circle":
+            shapes.append(f'<circle cx="{rng.randrange(64)}" cy="{rng.randrange(64)}" r="{rng.randrange(2, 20)}" {fill}/>')
+        elif kind == "rect":
+            shapes.append(f'<rect x="{rng.randrange(48)}" y="{rng.randrange(48)}" width="16" height="16" {fill}/>')
+        else:
+            points = " ".join(f"L{rng.randrange(64)} {rng.randrange(64)}" for _ in range(6))
+            shapes.append(f'<path d="M{rng.randrange(64)} {rng.randrange(64)} {points} Z" {fill}/>')
+    return ('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 64 64">'
+            + "".join(shapes) + "</svg>")
+
+def generate_packs(root_dir, packs=4, icons_per_pack=20, icon_size=64, seed=0, zipped=False, with_png=True):
+    """
+    Create packs laid out like the real input: <root>/<id>-<theme>/{png,svg}/<n>-<name>.{png,svg}
+
+    Args:
+        root_dir: Output directory
+        packs: Number of packs
+        icons_per_pack: Icons in each pack
+        icon_size: PNG width/height
+        seed: Seed for the shapes and names (same seed = same bytes)
+        zipped: Write <root>/<pack>.zip archives instead of directories
+        with_png: Also write the PNG renders (export-only benchmarks only need the SVGs)
+
+    Returns:
+        List of created pack directories, or ZIP paths when zipped
+    """
+    rng = random.Random(seed)
+    root_dir = Path(root_dir)
+    root_dir.mkdir(parents=True, exist_ok=True)
+    created = []
+
+    for pack_index in range(packs):
+        pack_name = f"{100000 + pack_index}-{PACK_THEMES[pack_index % len(PACK_THEMES)]}"
+        files = {}
+        for icon_index in range(icons_per_pack):
+            name = f"{icon_index + 1:03d}-{ICON_NAMES[(pack_index + icon_index) % len(ICON_NAMES)]}"
+            if with_png:
+                files[f"png/{name}.png"] = make_png(icon_size, rng)
+            files[f"svg/{name}.svg"] = make_svg(rng).encode("utf-8")
+
+        if zipped:
+            zip_path = root_dir / f"{pack_name}.zip"
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                for relative, data in sorted(files.items()):
+                    zf.writestr(f"{pack_name}/{relative}", data)
+            created.append(zip_path)
+        else:
+            pack_dir = root_dir / pack_name
+            for relative, data in files.items():
+                path = pack_dir / relative
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(data)
+            created.append(pack_dir)
+
+    return created
+
+def dataset_size(paths):
+    """Total bytes of files under the given paths"""
+    total = 0
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            total += path.stat().st_size
+        else:
+            total += sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    return total
+
+if __name__ == "__main__":
+    import sys
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join("benchmarks", "data")
+    for path in generate_packs(target):
+        print(path)
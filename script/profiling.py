@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Opt-in profiling shared by runserver.py, colorizer.py and the unzip scripts
+
+Each process records its own profile, split by the stage markers active at the
+time, and writes it as <output_dir>/<role>-<pid>.collapsed when stopped. Two modes:
+
+- sample: a background thread samples the stacks of all threads (low overhead,
+  real call stacks)
+- cprofile: deterministic cProfile of the thread that started profiling, also
+  written as <role>-<pid>.prof for pstats/snakeviz; its collapsed stacks follow
+  the heaviest caller of each function, so they are an approximation
+
+merge_profiles() folds every process into merged.collapsed, the "frame;frame count"
+format read by flamegraph.pl, speedscope and inferno. Nothing is recorded until
+start() is called; stage() is a shared no-op context manager until then.
+"""
+
+import os
+import sys
+import glob
+import threading
+import contextlib
+from collections import Counter
+
+MODES = ("sample", "cprofile")
+
+# Profiler of this process (None = profiling off)
+_PROFILER = None
+_NO_STAGE = contextlib.nullcontext()
+
+def _code_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _pstats_label(func):
+    filename, lineno, name = func
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+class StackSampler:
+    """Sample the Python stacks of all threads every `interval` seconds"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.counts = Counter()
+        self._stages = {}
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        main_ident = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = self._labels.get(code)
+                    if label is None:
+                        label = self._labels[code] = _code_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.reverse()
+                prefix = [] if ident == main_ident else [f"thread:{names.get(ident, ident)}"]
+                prefix += [f"stage:{name}" for name in list(self._stages.get(ident, ()))]
+                self.counts[";".join(prefix + stack)] += 1
+
+    def push_stage(self, name):
+        self._stages.setdefault(threading.get_ident(), []).append(name)
+
+    def pop_stage(self):
+        self._stages[threading.get_ident()].pop()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def abandon(self):
+        """Forget a profiler inherited through fork (its thread does not exist here)"""
+
+    def save(self, path):
+        """Write the collapsed stacks (values are sample counts)"""
+        _write_collapsed(path + ".collapsed", self.counts)
+
+class DeterministicProfiler:
+    """cProfile with one profile per stage path, switched by the stage markers"""
+
+    def __init__(self):
+        import cProfile
+        self._factory = cProfile.Profile
+        self._ident = threading.get_ident()
+        self._stack = []
+        self._current = None
+        self.profiles = {}
+
+    def _switch(self):
+        if self._current is not None:
+            self._current.disable()
+        key = tuple(self._stack)
+        profile = self.profiles.get(key)
+        if profile is None:
+            profile = self.profiles[key] = self._factory()
+        self._current = profile
+        profile.enable()
+
+    def start(self):
+        self._switch()
+
+    def push_stage(self, name):
+        if threading.get_ident() == self._ident:
+            self._stack.append(name)
+            self._switch()
+
+    def pop_stage(self):
+        if threading.get_ident() == self._ident:
+            self._stack.pop()
+            self._switch()
+
+    def stop(self):
+        if self._current is not None:
+            self._current.disable()
+            self._current = None
+
+    def abandon(self):
+        """Stop recording in a child that inherited this profiler through fork"""
+        self.stop()
+
+    def save(self, path):
+        """Write the collapsed stacks (values are microseconds of own time) and the merged .prof"""
+        import pstats
+
+        counts = Counter()
+        merged = None
+        for key, profile in self.profiles.items():
+            try:
+                stats = pstats.Stats(profile)
+            except TypeError:
+                # Nothing was recorded under this stage
+                continue
+            counts.update(_collapse_pstats(stats.stats, [f"stage:{name}" for name in key]))
+            if merged is None:
+                merged = stats
+            else:
+                merged.add(stats)
+        _write_collapsed(path + ".collapsed", counts)
+        if merged is not None:
+            merged.dump_stats(path + ".prof")
+
+def _collapse_pstats(stats, prefix):
+    """Approximate stacks from cProfile caller edges: each function under its heaviest callers"""
+    counts = Counter()
+    for func, (_, _, own_time, _, _) in stats.items():
+        if own_time <= 0:
+            continue
+        path = [func]
+        current = func
+        while len(path) < 64:
+            callers = stats.get(current, (0, 0, 0, 0, {}))[4]
+            candidates = [caller for caller in callers if caller not in path]
+            if not candidates:
+                break
+            current = max(candidates, key=lambda caller: callers[caller][3])
+            path.append(current)
+        labels = prefix + [_pstats_label(f) for f in reversed(path)]
+        counts[";".join(labels)] += max(1, int(own_time * 1e6))
+    return counts
+
+def _write_collapsed(path, counts):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, value in sorted(counts.items()):
+            f.write(f"{stack} {value}\n")
+
+def start(output_dir, role="main", mode="sample", interval=0.01, save_at_exit=False):
+    """
+    Start profiling this process
+
+    Args:
+        output_dir: Directory receiving <role>-<pid>.collapsed (and .prof)
+        role: Root frame of this process' stacks ("main", "worker", ...)
+        mode: "sample" or "cprofile"
+        interval: Sampling interval in seconds (sample mode)
+        save_at_exit: Save when a multiprocessing child exits (workers never call stop())
+
+    Returns:
+        The profiler
+    """
+    global _PROFILER
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode: {mode} (expected one of {', '.join(MODES)})")
+    if _PROFILER is not None:
+        if _PROFILER.pid == os.getpid():
+            return _PROFILER
+        _PROFILER.abandon()
+
+    os.makedirs(output_dir, exist_ok=True)
+    profiler = StackSampler(interval) if mode == "sample" else DeterministicProfiler()
+    profiler.pid = os.getpid()
+    profiler.path = os.path.join(output_dir, f"{role}-{profiler.pid}")
+    profiler.start()
+    _PROFILER = profiler
+
+    if save_at_exit:
+        # multiprocessing children leave through os._exit, which skips atexit
+        from multiprocessing import util
+        util.Finalize(None, stop, exitpriority=10)
+    return profiler
+
+def start_worker(options, role="worker"):
+    """Start profiling in a worker process from the options of the parent (see options())"""
+    return start(options["output_dir"], role=role, mode=options.get("mode", "sample"),
+                 interval=options.get("interval", 0.01), save_at_exit=True)
+
+def run_directory(base_dir):
+    """Fresh timestamped directory under base_dir, so runs never mix their profiles"""
+    import time
+    return os.path.join(base_dir, time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}")
+
+def options(output_dir, mode="sample", interval=0.01):
+    """Picklable profiling options to hand to worker processes"""
+    return {"output_dir": os.path.abspath(output_dir), "mode": mode, "interval": interval}
+
+def stop():
+    """
+    Stop profiling this process and write its profile
+
+    Returns:
+        Path of the .collapsed file, or None if profiling was off
+    """
+    global _PROFILER
+    profiler, _PROFILER = _PROFILER, None
+    if profiler is None:
+        return None
+    if profiler.pid != os.getpid():
+        profiler.abandon()
+        return None
+    profiler.stop()
+    profiler.save(profiler.path)
+    return profiler.path + ".collapsed"
+
+def stage(name):
+    """Context manager marking a pipeline stage in the profile (no-op when profiling is off)"""
+    if _PROFILER is None:
+        return _NO_STAGE
+    return _stage(_PROFILER, name)
+
+@contextlib.contextmanager
+def _stage(profiler, name):
+    profiler.push_stage(name)
+    try:
+        yield
+    finally:
+        profiler.pop_stage()
+
+@contextlib.contextmanager
+def profile_run(base_dir, role="main", mode="sample"):
+    """
+    Profile the enclosed block of a single-process script when base_dir is set
+
+    The profile goes to a fresh subdirectory of base_dir and is merged on exit.
+    """
+    if not base_dir:
+        yield None
+        return
+    output_dir = run_directory(base_dir)
+    start(output_dir, role=role, mode=mode)
+    try:
+        yield output_dir
+    finally:
+        stop()
+        print(f"Profile written to {merge_profiles(output_dir)}")
+
+def merge_profiles(output_dir):
+    """
+    Merge the per-process profiles of a run
+
+    Returns:
+        Path of merged.collapsed, or None if there was nothing to merge
+    """
+    collapsed = [p for p in glob.glob(os.path.join(output_dir, "*.collapsed"))
+                 if os.path.basename(p) != "merged.collapsed"]
+    if not collapsed:
+        return None
+
+    counts = Counter()
+    for path in collapsed:
+        role = os.path.basename(path).rsplit("-", 1)[0]
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                stack, _, value = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    counts[f"{role};{stack}"] += int(value)
+    merged_path = os.path.join(output_dir, "merged.collapsed")
+    _write_collapsed(merged_path, counts)
+
+    profiles = [p for p in glob.glob(os.path.join(output_dir, "*.prof"))
+                if os.path.basename(p) != "merged.prof"]
+    if profiles:
+        import pstats
+        pstats.Stats(*profiles).dump_stats(os.path.join(output_dir, "merged.prof"))
+    return merged_path
@@ -1,5 +1,6 @@
 import os
 import json
+import argparse
 import random
 import re
 import shutil
@@ -15,13 +16,14 @@ parent_dir = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, parent_dir)
 
 from script.svg_painter.config import (
-    SVG_INPUT_DIR, SVG_OUTPUT_DIR, MERGED_COLORS_FILE,
+    SVG_INPUT_DIR, SVG_OUTPUT_DIR, MERGED_COLORS_FILE, PROFILE_DIR,
     BLACK_COLOR_VARIANTS, BLACK_RGB_THRESHOLD, DEFAULT_BLACK_ATTRIBUTES
 )
+from script import profiling
 
-def load_color_palettes() -> Dict:
+def load_color_palettes(path: str = MERGED_COLORS_FILE) -> Dict:
     """Load color palettes from the merged JSON file"""
-    with open(MERGED_COLORS_FILE, 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 def hex_to_rgb(hex_color: str) -> Tuple[int, int, int]:
@@ -146,15 +148,15 @@ class ColorPaletteManager:
         
         return palette_id, selected_colors
 
-def process_svg_file(svg_path: str, palette_manager: ColorPaletteManager) -> None:
-    """Process a single SVG file"""
+def process_svg_file(svg_path: str, palette_manager: ColorPaletteManager, output_path: str = None) -> str:
+    """Process a single SVG file, returning the written path (None if it could not be parsed)"""
     # Parse SVG file
     try:
         tree = ET.parse(svg_path)
         root = tree.getroot()
     except ET.ParseError:
         print(f"Error parsing SVG file: {svg_path}")
-        return
+        return None
 
     # Get next unused palette with 1-2 colors
     palette_id, palette = palette_manager.get_next_palette()
@@ -222,32 +224,48 @@ def process_svg_file(svg_path: str, palette_manager: ColorPaletteManager) -> Non
     process_element(root)
     
     # Create output directory if needed
-    output_path = get_relative_output_path(svg_path)
+    output_path = output_path or get_relative_output_path(svg_path)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
     # Save the modified SVG
     tree.write(output_path, encoding='utf-8', xml_declaration=True)
     print(f"Processed: {svg_path} -> {output_path} (using palette {palette_id} with {len(palette)} colors)")
+    return output_path
 
-def main():
-    """Main function to process all SVG files"""
+def run():
+    """Process all SVG files"""
     # Load color palettes
     color_palettes = load_color_palettes()
     palette_manager = ColorPaletteManager(color_palettes)
     
     # Copy non-svg directories first
-    copy_non_svg_dirs(SVG_INPUT_DIR, SVG_OUTPUT_DIR)
+    with profiling.stage("copy_non_svg_dirs"):
+        copy_non_svg_dirs(SVG_INPUT_DIR, SVG_OUTPUT_DIR)
     
     # Find all SVG files
-    svg_files = find_svg_files(SVG_INPUT_DIR)
+    with profiling.stage("find_svg_files"):
+        svg_files = find_svg_files(SVG_INPUT_DIR)
     print(f"Found {len(svg_files)} SVG files to process")
     
     # Process each SVG file
     for svg_file in svg_files:
         try:
-            process_svg_file(svg_file, palette_manager)
+            with profiling.stage("process_svg_file"):
+                process_svg_file(svg_file, palette_manager)
         except Exception as e:
             print(f"Error processing {svg_file}: {str(e)}")
 
+def main():
+    """Main function to process all SVG files"""
+    parser = argparse.ArgumentParser(description="Recolor black SVG elements with random palette colors")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, default=None,
+                        help=f"Profile the run, writing collapsed stacks for flamegraph tools (default: {PROFILE_DIR})")
+    parser.add_argument("--profile_mode", choices=profiling.MODES, default="sample",
+                        help="Stack sampling or deterministic cProfile (default: sample)")
+    args = parser.parse_args()
+    
+    with profiling.profile_run(args.profile, role="colorizer", mode=args.profile_mode):
+        run()
+
 if __name__ == '__main__':
     main()
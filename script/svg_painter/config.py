@@ -22,6 +22,9 @@ SVG_OUTPUT_DIR = os.path.join(BASE_DIR, 'sample', 'unziped_all', 'svg_painter')
 # Create SVG output directory
 os.makedirs(SVG_OUTPUT_DIR, exist_ok=True)
 
+# Base directory of --profile output
+PROFILE_DIR = os.environ.get('CANVA_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
 # Color detection settings
 BLACK_COLOR_VARIANTS = [
     '#000000', '#000', 'black', 'rgb(0,0,0)', 'rgb(0, 0, 0)',
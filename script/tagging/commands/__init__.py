@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Commands package - Các lệnh phụ của runserver.py (python runserver.py <command> ...)
+
+import importlib
+
+# Command name -> module implementing main(argv)
+COMMANDS = {
+    "export-onnx": "commands.export_onnx",
+    "merge-shards": "commands.merge_shards",
+    "orchestrate": "commands.orchestrate",
+    "precision-report": "commands.precision_report",
+    "prepare-models": "commands.prepare_models",
+    "serve": "commands.serve",
+    "tune": "commands.tune",
+    "watch": "commands.watch",
+}
+
+def run_command(name, argv):
+    """Import the module of a command and run its main function"""
+    module = importlib.import_module(COMMANDS[name])
+    return module.main(argv)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+from config import PathConfig, ModelConfig, ExecutionConfig
+from models.clip_model import ClipInterrogatorModel
+from models.onnx_backend import export_onnx_models
+from models.utils import load_image
+
+logger = logging.getLogger("export_onnx")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py export-onnx",
+        description="Export BLIP and CLIP to ONNX for the onnx CPU backend"
+    )
+    
+    parser.add_argument(
+        "--onnx_dir", 
+        type=str,
+        default=ModelConfig.ONNX_DIR,
+        help=f"Output directory for the .onnx files (default: {ModelConfig.ONNX_DIR})"
+    )
+    
+    parser.add_argument(
+        "--opset", 
+        type=int,
+        default=17,
+        help="ONNX opset version (default: 17)"
+    )
+    
+    parser.add_argument(
+        "--verify", 
+        type=str,
+        default=None,
+        help="Directory of sample PNGs: compare captions and throughput of torch vs onnx after export"
+    )
+    
+    parser.add_argument(
+        "--limit", 
+        type=int,
+        default=20,
+        help="Maximum number of sample images used by --verify (default: 20)"
+    )
+    
+    parser.add_argument(
+        "--intra_op_threads", 
+        type=int,
+        default=ExecutionConfig.INTRA_OP_THREADS,
+        help="ONNX Runtime intra-op threads used by --verify (default: runtime default)"
+    )
+    
+    return parser.parse_args(argv)
+
+def _time_model(model, images):
+    """Generate captions and full descriptions, return captions and images/sec"""
+    captions = [model._generate_blip_caption(image) for _, image in images]
+    
+    start_time = time.time()
+    for image_path, _ in images:
+        model.generate_description(image_path, use_cache=False)
+    elapsed = time.time() - start_time
+    
+    return captions, len(images) / elapsed if elapsed > 0 else 0.0
+
+def verify_backends(torch_model, onnx_model, sample_dir, limit=20):
+    """
+    Compare the onnx backend against torch on sample images
+    
+    Args:
+        torch_model: ClipInterrogatorModel with backend="torch"
+        onnx_model: ClipInterrogatorModel with backend="onnx"
+        sample_dir: Directory searched recursively for PNG files
+        limit: Maximum number of images
+        
+    Returns:
+        Dict report with caption parity and throughput of both backends
+    """
+    png_files = sorted(Path(sample_dir).rglob("*.png"))[:limit]
+    images = [(str(p), load_image(p)) for p in png_files]
+    images = [(p, image) for p, image in images if image is not None]
+    if not images:
+        raise ValueError(f"No readable PNG files found in {sample_dir}")
+    
+    torch_captions, torch_rate = _time_model(torch_model, images)
+    onnx_captions, onnx_rate = _time_model(onnx_model, images)
+    
+    matches = sum(1 for a, b in zip(torch_captions, onnx_captions) if a == b)
+    return {
+        "num_images": len(images),
+        "caption_exact_match": matches / len(images),
+        "torch_images_per_sec": torch_rate,
+        "onnx_images_per_sec": onnx_rate,
+        "speedup": onnx_rate / torch_rate if torch_rate else None,
+        "mismatches": [
+            {"image": p, "torch": a, "onnx": b}
+            for (p, _), a, b in zip(images, torch_captions, onnx_captions) if a != b
+        ]
+    }
+
+def main(argv=None):
+    """Export the ONNX graphs and optionally verify them"""
+    args = parse_args(argv)
+    
+    logger.info("Loading torch models for export...")
+    torch_model = ClipInterrogatorModel(device="cpu", cache_dir=PathConfig.DEFAULT_CACHE_DIR)
+    export_onnx_models(torch_model, args.onnx_dir, opset=args.opset)
+    
+    if not args.verify:
+        return 0
+    
+    # Dùng cache tạm để không ghi đè cache thật khi so sánh
+    with tempfile.TemporaryDirectory() as temp_cache:
+        torch_model.cache_dir = temp_cache
+        onnx_model = ClipInterrogatorModel(
+            device="cpu",
+            cache_dir=temp_cache,
+            backend="onnx",
+            onnx_dir=args.onnx_dir,
+            intra_op_threads=args.intra_op_threads
+        )
+        report = verify_backends(torch_model, onnx_model, args.verify, limit=args.limit)
+    
+    report_path = os.path.join(args.onnx_dir, "parity_report.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    logger.info(f"Caption exact match: {report['caption_exact_match']:.1%} on {report['num_images']} images")
+    logger.info(f"Throughput: torch {report['torch_images_per_sec']:.2f} img/s, onnx {report['onnx_images_per_sec']:.2f} img/s")
+    logger.info(f"Parity report saved: {report_path}")
+    return 0
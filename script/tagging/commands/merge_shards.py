@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import argparse
+from pathlib import Path
+
+from config import PathConfig, ExecutionConfig
+from pipeline.export import MetadataExporter
+from pipeline.catalog import CatalogWriter
+from pipeline.sharding import load_shard_results
+
+logger = logging.getLogger("merge_shards")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py merge-shards",
+        description="Export the results written by all hosts of a sharded run"
+    )
+
+    parser.add_argument(
+        "shard_dir",
+        type=str,
+        help="Shared directory passed as --shard_dir to every host"
+    )
+
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=PathConfig.DEFAULT_OUTPUT_DIR,
+        help=f"Output directory (default: {PathConfig.DEFAULT_OUTPUT_DIR})"
+    )
+
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=PathConfig.CATALOG_PATH,
+        help="Also write a run-level catalog of all images (.parquet or .jsonl) (default: none)"
+    )
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Merge per-host results into metadata.csv files and one failure report"""
+    args = parse_args(argv)
+
+    results = load_shard_results(args.shard_dir)
+    if not results:
+        logger.error(f"No shard results found in {args.shard_dir}")
+        return 1
+
+    # Directories claimed but never finished (their host died and nobody took over yet)
+    leases = sorted(p.stem for p in Path(args.shard_dir, "leases").glob("*.lease"))
+    if leases:
+        logger.warning(f"{len(leases)} directories are still leased and missing from the merge: {', '.join(leases[:10])}")
+
+    catalog = CatalogWriter(args.catalog) if args.catalog else None
+    exporter = MetadataExporter(output_base_dir=args.output_dir, asset_mode=ExecutionConfig.ASSET_MODE,
+                                workers=ExecutionConfig.EXPORT_WORKERS, catalog=catalog,
+                                csv_mode=ExecutionConfig.CSV_MODE)
+    failures = {}
+    success_count = 0
+    hosts = set()
+
+    try:
+        for result in results:
+            hosts.add(result["host"])
+            target_dir = result["target_dir"]
+            if result.get("error"):
+                failures[target_dir] = [{"directory": result["png_dir"], "reason": "error", "error": result["error"]}]
+                continue
+            if result["failures"]:
+                failures[target_dir] = result["failures"]
+            if exporter.export_metadata(target_dir, result["metadata"], result["input_root"]):
+                success_count += 1
+    finally:
+        if catalog is not None:
+            catalog.close()
+
+    if failures:
+        exporter.export_failure_report(failures)
+
+    logger.info(f"Merged {success_count}/{len(results)} directories from {len(hosts)} hosts into {args.output_dir}")
+    return 0
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+from config import PROJECT_ROOT, PathConfig, ModelConfig, ExecutionConfig, PipelineConfig
+from models.utils import check_cuda
+from models.metrics import METRICS
+from pipeline.export import MetadataExporter
+
+logger = logging.getLogger("orchestrate")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py orchestrate",
+        description="Run every pack ZIP through extract -> colorize / tag -> export, pack by pack"
+    )
+
+    parser.add_argument(
+        "zip_dir",
+        type=str,
+        help="Directory containing the pack ZIPs"
+    )
+
+    parser.add_argument(
+        "--extract_dir",
+        type=str,
+        default=None,
+        help="Where the ZIPs are extracted (default: <zip_dir>/unziped_all)"
+    )
+
+    parser.add_argument(
+        "--colorized_dir",
+        type=str,
+        default=None,
+        help="Where the recolored svg folders are written (default: <extract_dir>/svg_painter)"
+    )
+
+    parser.add_argument(
+        "--no_colorize",
+        action="store_true",
+        help="Skip the colorize stage"
+    )
+
+    parser.add_argument(
+        "--palettes",
+        type=str,
+        default=None,
+        help="Merged palettes JSON of the colorize stage (default: svg_painter/output/merged_colors.json)"
+    )
+
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=PathConfig.DEFAULT_OUTPUT_DIR,
+        help=f"Output directory (default: {PathConfig.DEFAULT_OUTPUT_DIR})"
+    )
+
+    parser.add_argument(
+        "--extract_workers",
+        type=int,
+        default=PipelineConfig.EXTRACT_WORKERS,
+        help=f"Packs extracted at once (default: {PipelineConfig.EXTRACT_WORKERS})"
+    )
+
+    parser.add_argument(
+        "--colorize_workers",
+        type=int,
+        default=PipelineConfig.COLORIZE_WORKERS,
+        help=f"Processes recoloring packs at once (default: {PipelineConfig.COLORIZE_WORKERS})"
+    )
+
+    parser.add_argument(
+        "--tag_workers",
+        type=int,
+        default=PipelineConfig.TAG_WORKERS,
+        help=f"Packs tagged at once, each worker with its own models (default: {PipelineConfig.TAG_WORKERS})"
+    )
+
+    parser.add_argument(
+        "--export_workers",
+        type=int,
+        default=PipelineConfig.EXPORT_WORKERS,
+        help=f"Packs exported at once (default: {PipelineConfig.EXPORT_WORKERS})"
+    )
+
+    parser.add_argument(
+        "--max_in_flight",
+        type=int,
+        default=PipelineConfig.MAX_IN_FLIGHT,
+        help=f"Packs between extraction and export at the same time (default: {PipelineConfig.MAX_IN_FLIGHT})"
+    )
+
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Extract and recolor every pack again, even those unchanged since the last run"
+    )
+
+    parser.add_argument(
+        "--gpu",
+        type=bool,
+        default=ExecutionConfig.USE_GPU,
+        help=f"Use GPU if available (default: {ExecutionConfig.USE_GPU})"
+    )
+
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=PathConfig.DEFAULT_CACHE_DIR,
+        help=f"Cache directory (default: {PathConfig.DEFAULT_CACHE_DIR})"
+    )
+
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=["torch", "onnx"],
+        default=ModelConfig.BACKEND,
+        help=f"Inference backend for BLIP/CLIP, onnx runs on CPU only (default: {ModelConfig.BACKEND})"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        choices=["fp32", "int8", "bf16"],
+        default=ModelConfig.PRECISION,
+        help=f"CPU inference precision (default: {ModelConfig.PRECISION})"
+    )
+
+    parser.add_argument(
+        "--model_store",
+        type=str,
+        default=PathConfig.MODEL_STORE_DIR,
+        help=f"Local model store from 'runserver.py prepare-models' (default: {PathConfig.MODEL_STORE_DIR})"
+    )
+
+    return parser.parse_args(argv)
+
+def log_summary(summary):
+    """Log the per-stage throughput of a run"""
+    first = summary["first_pack_sec"]
+    logger.info(f"{summary['packs'] - summary['packs_failed']}/{summary['packs']} packs in {summary['elapsed_sec']:.1f}s"
+                f"{f', first one after {first:.1f}s' if first is not None else ''}")
+    for name, stage in summary["stages"].items():
+        failed = f", {stage['failed']} failed" if stage["failed"] else ""
+        logger.info(f"  {name:<9} {stage['packs']:>5} packs {stage['items']:>7} items  "
+                    f"{stage['packs_per_sec']:7.2f} packs/s {stage['items_per_sec']:9.1f} items/s  "
+                    f"{stage['workers']} workers {stage['utilization']:.0%} busy{failed}")
+
+def main(argv=None):
+    """Run the pipeline over the ZIPs of a directory"""
+    args = parse_args(argv)
+
+    if not os.path.isdir(args.zip_dir):
+        logger.error(f"ZIP directory does not exist: {args.zip_dir}")
+        return 1
+    zip_files = sorted(Path(args.zip_dir).glob("*.zip"))
+    if not zip_files:
+        logger.error(f"No ZIP files found in {args.zip_dir}")
+        return 1
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    # The extract and colorize stages use script/unzip and script/svg_painter
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.append(str(PROJECT_ROOT))
+    from pipeline.orchestrator import PackPipeline, PackStages
+
+    extract_dir = args.extract_dir or os.path.join(args.zip_dir, "unziped_all")
+    colorized_dir = None
+    if not args.no_colorize:
+        from script.svg_painter.config import MERGED_COLORS_FILE
+        palettes_file = args.palettes or MERGED_COLORS_FILE
+        if os.path.isfile(palettes_file):
+            colorized_dir = args.colorized_dir or os.path.join(extract_dir, "svg_painter")
+        else:
+            logger.warning(f"Palettes file not found: {palettes_file} (run svg_painter/palettes/merge_color.py), "
+                           f"skipping the colorize stage")
+
+    processor_kwargs = {
+        "cache_dir": args.cache_dir,
+        "backend": args.backend,
+        "onnx_dir": ModelConfig.ONNX_DIR,
+        "intra_op_threads": ExecutionConfig.INTRA_OP_THREADS,
+        "precision": args.precision,
+        "model_store_dir": args.model_store,
+        "torch_threads": ExecutionConfig.TORCH_THREADS
+    }
+
+    def create_processor():
+        # Models are loaded by each tag worker on its first cache miss
+        from pipeline.processor import ImageProcessor
+        use_gpu = args.gpu and args.backend == "torch" and check_cuda()
+        return ImageProcessor(use_gpu=use_gpu, **processor_kwargs)
+
+    exporter = MetadataExporter(args.output_dir, asset_mode=ExecutionConfig.ASSET_MODE, csv_mode=ExecutionConfig.CSV_MODE)
+    stages = PackStages(
+        extract_dir,
+        colorized_dir,
+        exporter,
+        create_processor,
+        cache_dir=args.cache_dir,
+        batch_size=ExecutionConfig.BATCH_SIZE,
+        palettes_file=args.palettes,
+        force=args.force,
+        overwrite=True
+    )
+    pipeline = PackPipeline(
+        stages.stages(
+            extract_workers=args.extract_workers,
+            colorize_workers=args.colorize_workers,
+            tag_workers=args.tag_workers,
+            export_workers=args.export_workers
+        ),
+        max_in_flight=args.max_in_flight
+    )
+
+    logger.info(f"Processing {len(zip_files)} packs from {args.zip_dir} "
+                f"({', '.join(stage.name for stage in pipeline.stages)})")
+    summary = pipeline.run(zip_files)
+    log_summary(summary)
+    exporter.export_run_report(METRICS.report(pipeline=summary))
+    return 0 if not summary["packs_failed"] else 1
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+import psutil
+
+from config import PathConfig
+from pipeline.processor import ImageProcessor
+
+logger = logging.getLogger("precision_report")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py precision-report",
+        description="Compare captions and tags of a reduced precision mode against fp32"
+    )
+    
+    parser.add_argument(
+        "sample_dir", 
+        type=str,
+        help="Directory searched recursively for sample PNG files"
+    )
+    
+    parser.add_argument(
+        "--precision", 
+        type=str,
+        choices=["int8", "bf16"],
+        default="int8",
+        help="Precision to compare against fp32 (default: int8)"
+    )
+    
+    parser.add_argument(
+        "--limit", 
+        type=int,
+        default=50,
+        help="Number of sample images, taken in sorted order (default: 50)"
+    )
+    
+    parser.add_argument(
+        "--output", 
+        type=str,
+        default=os.path.join(PathConfig.DEFAULT_CACHE_DIR, "precision_report.json"),
+        help="Path of the JSON report"
+    )
+    
+    return parser.parse_args(argv)
+
+def _jaccard(a, b):
+    """Jaccard similarity of two collections"""
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def _run(precision, png_files, cache_dir):
+    """Load an ImageProcessor with the given precision and process the samples"""
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    processor = ImageProcessor(use_gpu=False, cache_dir=cache_dir, precision=precision)
+    model_memory = process.memory_info().rss - rss_before
+    
+    results = {}
+    start_time = time.time()
+    for png_file in png_files:
+        results[png_file] = processor.process_image(png_file, use_cache=False)
+    elapsed = time.time() - start_time
+    
+    del processor
+    return results, {
+        "precision": precision,
+        "images_per_sec": len(png_files) / elapsed if elapsed > 0 else 0.0,
+        "model_memory_mb": model_memory / 2**20
+    }
+
+def build_report(sample_dir, precision, limit=50):
+    """
+    Run fp32 and the reduced precision on the same fixed sample set
+    
+    Returns:
+        Dict with per-image agreement and aggregate quality/throughput/memory figures
+    """
+    png_files = [str(p) for p in sorted(Path(sample_dir).rglob("*.png"))[:limit]]
+    if not png_files:
+        raise ValueError(f"No PNG files found in {sample_dir}")
+    
+    # Cache riêng cho từng chế độ để kết quả không bị lẫn
+    with tempfile.TemporaryDirectory() as fp32_cache, tempfile.TemporaryDirectory() as reduced_cache:
+        baseline, baseline_stats = _run("fp32", png_files, fp32_cache)
+        reduced, reduced_stats = _run(precision, png_files, reduced_cache)
+    
+    images = []
+    for png_file in png_files:
+        a, b = baseline[png_file], reduced[png_file]
+        if not a or not b:
+            images.append({"image": png_file, "failed": "fp32" if not a else precision})
+            continue
+        images.append({
+            "image": png_file,
+            "description_match": a["description"] == b["description"],
+            "description_word_jaccard": _jaccard(a["description"].lower().split(), b["description"].lower().split()),
+            "tag_jaccard": _jaccard(a["keywords"].split(","), b["keywords"].split(","))
+        })
+    
+    compared = [item for item in images if "failed" not in item]
+    count = len(compared) or 1
+    return {
+        "sample_dir": str(sample_dir),
+        "num_images": len(png_files),
+        "num_compared": len(compared),
+        "description_exact_match": sum(item["description_match"] for item in compared) / count,
+        "mean_description_word_jaccard": sum(item["description_word_jaccard"] for item in compared) / count,
+        "mean_tag_jaccard": sum(item["tag_jaccard"] for item in compared) / count,
+        "fp32": baseline_stats,
+        precision: reduced_stats,
+        "images": images
+    }
+
+def main(argv=None):
+    """Write the agreement report of a precision mode against fp32"""
+    args = parse_args(argv)
+    
+    report = build_report(args.sample_dir, args.precision, limit=args.limit)
+    
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    fp32, reduced = report["fp32"], report[args.precision]
+    logger.info(f"Description exact match: {report['description_exact_match']:.1%}, "
+                f"mean tag Jaccard: {report['mean_tag_jaccard']:.3f} ({report['num_compared']} images)")
+    logger.info(f"Throughput: fp32 {fp32['images_per_sec']:.2f} img/s, "
+                f"{args.precision} {reduced['images_per_sec']:.2f} img/s")
+    logger.info(f"Model memory: fp32 {fp32['model_memory_mb']:.0f} MB, "
+                f"{args.precision} {reduced['model_memory_mb']:.0f} MB")
+    logger.info(f"Report saved: {args.output}")
+    return 0
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import argparse
+
+from config import PathConfig, ModelConfig
+from models.store import ModelStore
+
+logger = logging.getLogger("prepare_models")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py prepare-models",
+        description="Download all models once into the local model store (safetensors) for offline runs"
+    )
+    
+    parser.add_argument(
+        "--model_store", 
+        type=str,
+        default=PathConfig.MODEL_STORE_DIR,
+        help=f"Model store directory (default: {PathConfig.MODEL_STORE_DIR})"
+    )
+    
+    parser.add_argument(
+        "--clip_model", 
+        type=str,
+        default=ModelConfig.CLIP_MODEL_NAME,
+        help=f"CLIP model (default: {ModelConfig.CLIP_MODEL_NAME})"
+    )
+    
+    parser.add_argument(
+        "--keybert_model", 
+        type=str,
+        default=ModelConfig.KEYBERT_MODEL_NAME,
+        help=f"SentenceTransformer model for KeyBERT (default: {ModelConfig.KEYBERT_MODEL_NAME})"
+    )
+    
+    parser.add_argument(
+        "--word2vec", 
+        type=str,
+        default=ModelConfig.WORD2VEC_PATH,
+        help=f"word2vec binary to convert, skipped if missing (default: {ModelConfig.WORD2VEC_PATH})"
+    )
+    
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Fill the model store"""
+    args = parse_args(argv)
+    
+    store = ModelStore(args.model_store)
+    manifest = store.prepare(args.clip_model, args.keybert_model, word2vec_source=args.word2vec)
+    
+    logger.info(f"Prepared models: {manifest}")
+    return 0
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import argparse
+
+from config import PathConfig, ModelConfig, ExecutionConfig, ServiceConfig
+from models.utils import check_cuda
+from pipeline.service import TaggingService, create_server
+
+logger = logging.getLogger("serve")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py serve",
+        description="Keep the models warm and tag images over a local HTTP API (TCP or Unix socket)"
+    )
+
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=ServiceConfig.HOST,
+        help=f"Address to listen on (default: {ServiceConfig.HOST})"
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=ServiceConfig.PORT,
+        help=f"TCP port (default: {ServiceConfig.PORT})"
+    )
+
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=ServiceConfig.SOCKET_PATH,
+        help="Listen on this Unix domain socket instead of TCP"
+    )
+
+    parser.add_argument(
+        "--max_batch_size",
+        type=int,
+        default=ServiceConfig.MAX_BATCH_SIZE,
+        help=f"Largest micro-batch of images per model call (default: {ServiceConfig.MAX_BATCH_SIZE})"
+    )
+
+    parser.add_argument(
+        "--max_batch_delay_ms",
+        type=float,
+        default=ServiceConfig.MAX_BATCH_DELAY_MS,
+        help=f"How long the first request of a micro-batch waits for others (default: {ServiceConfig.MAX_BATCH_DELAY_MS})"
+    )
+
+    parser.add_argument(
+        "--max_finished_jobs",
+        type=int,
+        default=ServiceConfig.MAX_FINISHED_JOBS,
+        help=f"Finished directory jobs kept for polling, oldest forgotten first (default: {ServiceConfig.MAX_FINISHED_JOBS})"
+    )
+
+    parser.add_argument(
+        "--request_timeout",
+        type=float,
+        default=ExecutionConfig.IMAGE_TIMEOUT,
+        help=f"Seconds to wait for a single-image result, 0 waits forever (default: {ExecutionConfig.IMAGE_TIMEOUT})"
+    )
+
+    parser.add_argument(
+        "--gpu",
+        type=bool,
+        default=ExecutionConfig.USE_GPU,
+        help=f"Use GPU if available (default: {ExecutionConfig.USE_GPU})"
+    )
+
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=PathConfig.DEFAULT_CACHE_DIR,
+        help=f"Cache directory (default: {PathConfig.DEFAULT_CACHE_DIR})"
+    )
+
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=["torch", "onnx"],
+        default=ModelConfig.BACKEND,
+        help=f"Inference backend for BLIP/CLIP, onnx runs on CPU only (default: {ModelConfig.BACKEND})"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        choices=["fp32", "int8", "bf16"],
+        default=ModelConfig.PRECISION,
+        help=f"CPU inference precision (default: {ModelConfig.PRECISION})"
+    )
+
+    parser.add_argument(
+        "--model_store",
+        type=str,
+        default=PathConfig.MODEL_STORE_DIR,
+        help=f"Local model store from 'runserver.py prepare-models' (default: {PathConfig.MODEL_STORE_DIR})"
+    )
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Load the models once and serve requests until interrupted"""
+    args = parse_args(argv)
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    use_gpu = args.gpu and args.backend == "torch" and check_cuda()
+    service = TaggingService(
+        {
+            "use_gpu": use_gpu,
+            "cache_dir": args.cache_dir,
+            "backend": args.backend,
+            "onnx_dir": ModelConfig.ONNX_DIR,
+            "intra_op_threads": ExecutionConfig.INTRA_OP_THREADS,
+            "precision": args.precision,
+            "model_store_dir": args.model_store,
+            "torch_threads": ExecutionConfig.TORCH_THREADS
+        },
+        max_batch_size=args.max_batch_size,
+        max_batch_delay=args.max_batch_delay_ms / 1000,
+        max_finished_jobs=args.max_finished_jobs
+    )
+    service.start()
+
+    server = create_server(
+        service,
+        host=args.host,
+        port=args.port,
+        socket_path=args.socket,
+        request_timeout=args.request_timeout or None
+    )
+    address = args.socket or f"http://{args.host}:{args.port}"
+    logger.info(f"Tagging service listening on {address} (max batch {args.max_batch_size}, "
+                f"max delay {args.max_batch_delay_ms:.0f} ms)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down tagging service")
+    finally:
+        server.server_close()
+        service.stop()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import argparse
+from pathlib import Path
+
+import psutil
+
+from config import PathConfig, ModelConfig
+from pipeline.tuner import calibrate, candidate_configs, save_profile
+
+logger = logging.getLogger("tune")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py tune",
+        description="Calibrate worker count and torch threads on sample icons and save the best profile for this host"
+    )
+    
+    parser.add_argument(
+        "sample_dir", 
+        type=str,
+        help="Directory searched recursively for sample PNG files"
+    )
+    
+    parser.add_argument(
+        "--limit", 
+        type=int,
+        default=32,
+        help="Number of sample images per configuration (default: 32)"
+    )
+    
+    parser.add_argument(
+        "--max_workers", 
+        type=int,
+        default=None,
+        help="Largest worker count to try (default: CPU count - 1)"
+    )
+    
+    parser.add_argument(
+        "--memory_fraction", 
+        type=float,
+        default=0.8,
+        help="Skip configurations expected to use more than this fraction of available memory (default: 0.8)"
+    )
+    
+    parser.add_argument(
+        "--backend", 
+        type=str,
+        choices=["torch", "onnx"],
+        default=ModelConfig.BACKEND,
+        help=f"Inference backend to calibrate (default: {ModelConfig.BACKEND})"
+    )
+    
+    parser.add_argument(
+        "--precision", 
+        type=str,
+        choices=["fp32", "int8", "bf16"],
+        default=ModelConfig.PRECISION,
+        help=f"Precision to calibrate (default: {ModelConfig.PRECISION})"
+    )
+    
+    parser.add_argument(
+        "--profile", 
+        type=str,
+        default=PathConfig.TUNING_PROFILE,
+        help=f"Profile file (default: {PathConfig.TUNING_PROFILE})"
+    )
+    
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the calibration and persist the best profile"""
+    args = parse_args(argv)
+    
+    image_paths = [str(p) for p in sorted(Path(args.sample_dir).rglob("*.png"))[:args.limit]]
+    if not image_paths:
+        logger.error(f"No PNG files found in {args.sample_dir}")
+        return 1
+    
+    processor_kwargs = {
+        "use_gpu": False,
+        "backend": args.backend,
+        "onnx_dir": ModelConfig.ONNX_DIR,
+        "precision": args.precision,
+        "model_store_dir": PathConfig.MODEL_STORE_DIR
+    }
+    configs = candidate_configs(max_workers=args.max_workers)
+    memory_limit_mb = psutil.virtual_memory().available / 2**20 * args.memory_fraction
+    
+    logger.info(f"Calibrating {len(configs)} configurations on {len(image_paths)} images")
+    best, results = calibrate(image_paths, processor_kwargs, configs=configs, memory_limit_mb=memory_limit_mb)
+    
+    profile = dict(best, backend=args.backend, precision=args.precision)
+    save_profile(args.profile, profile)
+    
+    logger.info(f"All results: {json.dumps(results)}")
+    logger.info(f"Best profile: workers={best['workers']}, torch_threads={best['torch_threads']}, "
+                f"{best['images_per_sec']:.2f} img/s, peak RSS {best['peak_rss_mb']:.0f} MB")
+    logger.info(f"Profile saved: {args.profile}")
+    return 0
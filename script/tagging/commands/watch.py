@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import argparse
+
+from config import PathConfig, ModelConfig, ExecutionConfig, WatchConfig
+from models.utils import check_cuda
+from pipeline.export import MetadataExporter
+from pipeline.watch import FolderWatcher
+
+logger = logging.getLogger("watch")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="runserver.py watch",
+        description="Watch a folder for new pack ZIPs or png directories and tag them as they land"
+    )
+
+    parser.add_argument(
+        "watch_dir",
+        type=str,
+        help="Folder where pack ZIPs (or extracted <pack>/png directories) arrive"
+    )
+
+    parser.add_argument(
+        "--extract_dir",
+        type=str,
+        default=None,
+        help="Where new ZIPs are extracted (default: <watch_dir>/unziped_all)"
+    )
+
+    parser.add_argument(
+        "--no_extract",
+        action="store_true",
+        help="Tag new ZIPs in place, reading their PNGs and svg folder from the archive"
+    )
+
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=PathConfig.DEFAULT_OUTPUT_DIR,
+        help=f"Output directory (default: {PathConfig.DEFAULT_OUTPUT_DIR})"
+    )
+
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=WatchConfig.DEBOUNCE,
+        help=f"Seconds a new file must stay unchanged before it is processed (default: {WatchConfig.DEBOUNCE})"
+    )
+
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=WatchConfig.POLL_INTERVAL,
+        help=f"Polling interval in seconds when inotify is unavailable (default: {WatchConfig.POLL_INTERVAL})"
+    )
+
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=WatchConfig.QUEUE_SIZE,
+        help=f"Maximum number of packs waiting to be processed (default: {WatchConfig.QUEUE_SIZE})"
+    )
+
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Use polling even if inotify (watchdog) is available"
+    )
+
+    parser.add_argument(
+        "--process_existing",
+        action="store_true",
+        help="Also process packs already present when the watcher starts"
+    )
+
+    parser.add_argument(
+        "--gpu",
+        type=bool,
+        default=ExecutionConfig.USE_GPU,
+        help=f"Use GPU if available (default: {ExecutionConfig.USE_GPU})"
+    )
+
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=PathConfig.DEFAULT_CACHE_DIR,
+        help=f"Cache directory (default: {PathConfig.DEFAULT_CACHE_DIR})"
+    )
+
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=["torch", "onnx"],
+        default=ModelConfig.BACKEND,
+        help=f"Inference backend for BLIP/CLIP, onnx runs on CPU only (default: {ModelConfig.BACKEND})"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        choices=["fp32", "int8", "bf16"],
+        default=ModelConfig.PRECISION,
+        help=f"CPU inference precision (default: {ModelConfig.PRECISION})"
+    )
+
+    parser.add_argument(
+        "--model_store",
+        type=str,
+        default=PathConfig.MODEL_STORE_DIR,
+        help=f"Local model store from 'runserver.py prepare-models' (default: {PathConfig.MODEL_STORE_DIR})"
+    )
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Watch the folder until interrupted"""
+    args = parse_args(argv)
+
+    if not os.path.isdir(args.watch_dir):
+        logger.error(f"Watch directory does not exist: {args.watch_dir}")
+        return 1
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    processor_kwargs = {
+        "cache_dir": args.cache_dir,
+        "backend": args.backend,
+        "onnx_dir": ModelConfig.ONNX_DIR,
+        "intra_op_threads": ExecutionConfig.INTRA_OP_THREADS,
+        "precision": args.precision,
+        "model_store_dir": args.model_store,
+        "torch_threads": ExecutionConfig.TORCH_THREADS
+    }
+
+    def create_processor():
+        # Models are loaded on the first pack that is not fully cached, then stay warm
+        from pipeline.processor import ImageProcessor
+        use_gpu = args.gpu and args.backend == "torch" and check_cuda()
+        return ImageProcessor(use_gpu=use_gpu, **processor_kwargs)
+
+    watcher = FolderWatcher(
+        args.watch_dir,
+        None if args.no_extract else args.extract_dir or os.path.join(args.watch_dir, "unziped_all"),
+        MetadataExporter(args.output_dir, asset_mode=ExecutionConfig.ASSET_MODE, csv_mode=ExecutionConfig.CSV_MODE),
+        create_processor,
+        cache_dir=args.cache_dir,
+        debounce=args.debounce,
+        poll_interval=args.poll_interval,
+        queue_size=args.queue_size,
+        batch_size=ExecutionConfig.BATCH_SIZE,
+        use_inotify=not args.polling
+    )
+    watcher.run(process_existing=args.process_existing)
+    logger.info(f"Processed {watcher.processed} packs")
+    return 0
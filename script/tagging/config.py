@@ -18,6 +18,15 @@ class PathConfig:
     # Cache directory for CLIP Interrogator and KeyBERT
     DEFAULT_CACHE_DIR = os.environ.get('CANVA_CACHE_DIR', str(Path(__file__).parent / "data" / "cache"))
     
+    # Per-host profiles written by 'runserver.py tune'
+    TUNING_PROFILE = os.environ.get('CANVA_TUNING_PROFILE', os.path.join(DEFAULT_CACHE_DIR, "tuning_profiles.json"))
+    
+    # Local model store (safetensors) filled by 'runserver.py prepare-models'
+    MODEL_STORE_DIR = os.environ.get('CANVA_MODEL_STORE_DIR', os.path.join(DEFAULT_CACHE_DIR, "models"))
+    
+    # Optional run-level catalog (.parquet or .jsonl), None = per-theme metadata.csv only
+    CATALOG_PATH = os.environ.get('CANVA_CATALOG', None)
+    
     # Ensure directories exist
     @classmethod
     def ensure_dirs(cls):
@@ -37,6 +46,18 @@ class ModelConfig:
     
     # Tag diversity level (0-1)
     TAG_DIVERSITY = float(os.environ.get('CANVA_TAG_DIVERSITY', "0.7"))
+    
+    # Inference backend for BLIP and CLIP: "torch" or "onnx" (CPU only)
+    BACKEND = os.environ.get('CANVA_BACKEND', "torch")
+    
+    # Pre-trained word2vec binary (converted into the model store by prepare-models)
+    WORD2VEC_PATH = os.environ.get('CANVA_WORD2VEC_PATH', str(Path(__file__).parent / "models" / "GoogleNews-vectors-negative300.bin.gz"))
+    
+    # Numeric precision on CPU: "fp32", "int8" (dynamic quantization) or "bf16" (autocast)
+    PRECISION = os.environ.get('CANVA_PRECISION', "fp32")
+    
+    # Directory containing the exported ONNX graphs
+    ONNX_DIR = os.environ.get('CANVA_ONNX_DIR', os.path.join(PathConfig.DEFAULT_CACHE_DIR, "onnx"))
 
 # Execution configuration
 class ExecutionConfig:
@@ -51,11 +72,109 @@ class ExecutionConfig:
     if NUM_WORKERS:
         NUM_WORKERS = int(NUM_WORKERS)
     
+    # torch intra-op threads per worker (None = CPU count / workers, or the tuning profile)
+    TORCH_THREADS = os.environ.get('CANVA_TORCH_THREADS', None)
+    if TORCH_THREADS:
+        TORCH_THREADS = int(TORCH_THREADS)
+    
+    # ONNX Runtime intra-op threads per worker (None = runtime default)
+    INTRA_OP_THREADS = os.environ.get('CANVA_INTRA_OP_THREADS', None)
+    if INTRA_OP_THREADS:
+        INTRA_OP_THREADS = int(INTRA_OP_THREADS)
+    
+    # Per-image time budget in seconds, enforced by a supervised worker (0 = disabled)
+    IMAGE_TIMEOUT = float(os.environ.get('CANVA_IMAGE_TIMEOUT', "120"))
+    
+    # Fraction of available memory kept free when admitting another CPU worker
+    MEMORY_SAFETY_MARGIN = float(os.environ.get('CANVA_MEMORY_SAFETY_MARGIN', "0.15"))
+    
+    # System memory use (%) above which no new workers are started
+    MEMORY_PRESSURE_PERCENT = float(os.environ.get('CANVA_MEMORY_PRESSURE_PERCENT', "90"))
+    
+    # Load the models once in the parent and share their weights with forked CPU workers
+    SHARE_WEIGHTS = os.environ.get('CANVA_SHARE_WEIGHTS', "True").lower() in ('true', '1', 'yes')
+    
+    # Also copy the shared weights to /dev/shm (needs a /dev/shm larger than the models)
+    SHARE_WEIGHTS_SHM = os.environ.get('CANVA_SHARE_WEIGHTS_SHM', "False").lower() in ('true', '1', 'yes')
+    
     # Whether to use cache
     USE_CACHE = os.environ.get('CANVA_USE_CACHE', "True").lower() in ('true', '1', 'yes')
+    
+    # How exported svg folders are materialized: auto (reflink, else hardlink, else copy), reflink, hardlink, copy
+    ASSET_MODE = os.environ.get('CANVA_ASSET_MODE', "auto")
+    
+    # Directories exported concurrently (threads writing metadata.csv and syncing svg folders)
+    EXPORT_WORKERS = int(os.environ.get('CANVA_EXPORT_WORKERS', "8"))
+    
+    # metadata.csv export: rewrite (every row regenerated) or update (only rows whose source image changed)
+    CSV_MODE = os.environ.get('CANVA_CSV_MODE', "rewrite")
+    
+    # PNGs read straight from pack ZIPs under the input directory: auto (packs not already extracted there),
+    # off (extracted directories only), only (ZIPs only, nothing needs to be extracted first)
+    ZIP_SOURCES = os.environ.get('CANVA_ZIP_SOURCES', "auto")
 
-# Create directories if they don't exist
-PathConfig.ensure_dirs()
+class ShardConfig:
+    # Shared directory of a multi-host run (leases, done markers, per-host results); None = local run
+    SHARD_DIR = os.environ.get('CANVA_SHARD_DIR', None)
+    
+    # A lease not renewed for this many seconds is considered abandoned and taken over
+    LEASE_TTL = float(os.environ.get('CANVA_LEASE_TTL', "300"))
+    
+    # Seconds between lease renewals
+    HEARTBEAT = float(os.environ.get('CANVA_LEASE_HEARTBEAT', "60"))
+
+class ServiceConfig:
+    # Address of the local tagging service (runserver.py serve)
+    HOST = os.environ.get('CANVA_SERVICE_HOST', "127.0.0.1")
+    PORT = int(os.environ.get('CANVA_SERVICE_PORT', "8765"))
+    
+    # Unix domain socket to listen on instead of TCP (None = TCP)
+    SOCKET_PATH = os.environ.get('CANVA_SERVICE_SOCKET', None)
+    
+    # Micro-batching of concurrent single-image requests
+    MAX_BATCH_SIZE = int(os.environ.get('CANVA_SERVICE_MAX_BATCH_SIZE', "8"))
+    MAX_BATCH_DELAY_MS = float(os.environ.get('CANVA_SERVICE_MAX_BATCH_DELAY_MS', "50"))
+    
+    # Finished directory jobs kept for GET /jobs/<job_id> (older ones are forgotten)
+    MAX_FINISHED_JOBS = int(os.environ.get('CANVA_SERVICE_MAX_FINISHED_JOBS', "100"))
+
+class WatchConfig:
+    # Seconds a new ZIP/png directory must stay unchanged before it is processed
+    DEBOUNCE = float(os.environ.get('CANVA_WATCH_DEBOUNCE', "2"))
+    
+    # Polling interval in seconds (fallback when inotify/watchdog is unavailable)
+    POLL_INTERVAL = float(os.environ.get('CANVA_WATCH_POLL_INTERVAL', "5"))
+    
+    # Maximum number of packs waiting to be processed
+    QUEUE_SIZE = int(os.environ.get('CANVA_WATCH_QUEUE_SIZE', "16"))
+
+class PipelineConfig:
+    # Packs handled at once by each stage of 'runserver.py orchestrate' (ZIP -> extract -> colorize/tag -> export)
+    EXTRACT_WORKERS = int(os.environ.get('CANVA_PIPELINE_EXTRACT_WORKERS', "2"))
+    COLORIZE_WORKERS = int(os.environ.get('CANVA_PIPELINE_COLORIZE_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+    # Each tag worker loads its own copy of the models
+    TAG_WORKERS = int(os.environ.get('CANVA_PIPELINE_TAG_WORKERS', "1"))
+    EXPORT_WORKERS = int(os.environ.get('CANVA_PIPELINE_EXPORT_WORKERS', "2"))
+    
+    # Packs between extraction and export at the same time (bounds what piles up ahead of the slowest stage)
+    MAX_IN_FLIGHT = int(os.environ.get('CANVA_PIPELINE_MAX_IN_FLIGHT', "8"))
+
+class LoggingConfig:
+    # Root log level (DEBUG also logs every processed image)
+    LEVEL = os.environ.get('CANVA_LOG_LEVEL', "INFO")
+    
+    # Log file, written asynchronously together with the console
+    LOG_FILE = os.environ.get('CANVA_LOG_FILE', "tagging.log")
+
+class ProfileConfig:
+    # Base directory of --profile output (one timestamped subdirectory per run)
+    PROFILE_DIR = os.environ.get('CANVA_PROFILE_DIR', str(PROJECT_ROOT / "profiles"))
+    
+    # "sample" (stack sampling, low overhead) or "cprofile" (deterministic, also writes .prof files)
+    MODE = os.environ.get('CANVA_PROFILE_MODE', "sample")
+    
+    # Sampling interval in seconds
+    INTERVAL = float(os.environ.get('CANVA_PROFILE_INTERVAL', "0.01"))
 
 # Print configuration information when module is imported
 if __name__ == "__main__":
@@ -65,4 +184,6 @@ if __name__ == "__main__":
     print(f"Cache directory: {PathConfig.DEFAULT_CACHE_DIR}")
     print(f"Use GPU: {ExecutionConfig.USE_GPU}")
     print(f"CLIP model: {ModelConfig.CLIP_MODEL_NAME}")
+    print(f"Backend: {ModelConfig.BACKEND}")
+    print(f"Precision: {ModelConfig.PRECISION}")
     print(f"Number of tags: {ModelConfig.NUM_TAGS}") 
\ No newline at end of file
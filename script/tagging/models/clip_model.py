@@ -8,27 +8,74 @@ import logging
 import re
 from clip_interrogator import Config, Interrogator
 from transformers import BlipProcessor, BlipForConditionalGeneration
-from models.utils import get_cache_path, save_to_cache, load_from_cache, setup_cache_dir
+from models.utils import get_cache_path, save_to_cache, load_from_cache, setup_cache_dir, log_load_time
+from models.sources import open_image_source
+from models.precision import resolve_precision, quantize_linear, autocast
+from models.metrics import METRICS, timed
 
 logger = logging.getLogger("clip_model")
 
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-large"
+
+# BLIP caption generation parameters (shared by the torch and onnx backends)
+BLIP_GENERATE_KWARGS = dict(
+    max_new_tokens=30,          # Shorter to avoid rambling
+    min_length=15,              # Ensure reasonable length
+    num_beams=7,                # More beams for better quality
+    length_penalty=1.5,         # Favor slightly longer sentences
+    temperature=0.7,            # Lower temperature for more focused output
+    repetition_penalty=1.2,     # Avoid repetitive phrases
+    no_repeat_ngram_size=2      # Prevent repeating word pairs
+)
+
+# Cheap settings used to retry images that exceeded their time budget
+CHEAP_GENERATE_KWARGS = dict(
+    max_new_tokens=20,
+    min_length=5,
+    num_beams=1,                # Greedy decoding
+    repetition_penalty=1.2,
+    no_repeat_ngram_size=2
+)
+CHEAP_MAX_IMAGE_SIZE = 512      # Downscale huge images before inference
+
 class ClipInterrogatorModel:
     """Wrapper for CLIP Interrogator to generate descriptions from images"""
     
-    def __init__(self, clip_model_name="ViT-L-14/laion2b_s32b_b82k", device=None, cache_dir="data/cache"):
+    def __init__(self, clip_model_name="ViT-L-14/laion2b_s32b_b82k", device=None, cache_dir="data/cache",
+                 backend="torch", onnx_dir=None, intra_op_threads=None, precision="fp32", model_store=None):
         self.cache_dir = setup_cache_dir(cache_dir)
+        self.backend = backend
+        onnx_dir = onnx_dir or os.path.join(self.cache_dir, "onnx")
         
         # Determine device (CPU/GPU)
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        logger.info(f"Using device: {self.device}")
+        self.precision = resolve_precision(precision, self.device)
+        logger.info(f"Using device: {self.device}, backend: {self.backend}, precision: {self.precision}")
+        
+        if self.backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown inference backend: {self.backend}")
+        if self.backend == "onnx" and self.device != "cpu":
+            raise ValueError("The onnx backend only supports device='cpu'")
+        
+        # Load from the local model store (strictly offline) once prepare-models has run
+        use_store = model_store is not None and model_store.has_blip() and model_store.has_clip(clip_model_name)
+        blip_source = model_store.blip_dir if use_store else BLIP_MODEL_NAME
+        load_kwargs = {"local_files_only": True, "use_safetensors": True} if use_store else {}
+        if use_store:
+            logger.info(f"Loading models offline from model store: {model_store.root_dir}")
         
         try:
             # Initialize BLIP model for better captions
             logger.info("Loading BLIP model...")
-            self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
-            self.blip_model = BlipForConditionalGeneration.from_pretrained(
-                "Salesforce/blip-image-captioning-large"
-            ).to(self.device)
+            with log_load_time("BLIP processor"):
+                self.processor = BlipProcessor.from_pretrained(blip_source, local_files_only=use_store)
+            if self.backend == "onnx":
+                from models.onnx_backend import OnnxBlipCaptioner
+                with log_load_time("BLIP (onnx)"):
+                    self.onnx_captioner = OnnxBlipCaptioner(onnx_dir, self.processor, intra_op_threads)
+            else:
+                with log_load_time("BLIP model"):
+                    self.blip_model = BlipForConditionalGeneration.from_pretrained(blip_source, **load_kwargs).to(self.device)
             
             # Initialize CLIP Interrogator for additional details
             logger.info("Loading CLIP Interrogator...")
@@ -40,30 +87,82 @@ class ClipInterrogatorModel:
                 config.blip_offload = False
                 config.chunk_size = 2048 if torch.cuda.get_device_properties(0).total_memory >= 16e9 else 1024
             
-            self.ci = Interrogator(config)
+            if self.backend == "onnx":
+                # Captions for interrogate_fast come from the ONNX decoder, so skip the Interrogator's own BLIP
+                config.caption_model_name = None
+            
+            if use_store:
+                self._configure_interrogator_from_store(config, model_store, clip_model_name, blip_source, load_kwargs)
+            
+            with log_load_time("CLIP Interrogator"):
+                self.ci = Interrogator(config)
+            
+            if self.precision == "int8":
+                # Dynamic int8 quantization of the BLIP Linear layers (ours and the Interrogator's)
+                caption_model = getattr(self.ci, "caption_model", None)
+                if self.backend == "torch":
+                    quantized = quantize_linear(self.blip_model)
+                    if caption_model is self.blip_model:
+                        self.ci.caption_model = quantized
+                        caption_model = None
+                    self.blip_model = quantized
+                if caption_model is not None:
+                    self.ci.caption_model = quantize_linear(caption_model)
+            
+            if self.backend == "onnx":
+                from models.onnx_backend import OnnxClipImageEncoder
+                clip_encoder = OnnxClipImageEncoder(onnx_dir, self.ci.clip_preprocess, self.device, intra_op_threads)
+                self.ci.image_to_features = clip_encoder.image_to_features
+            
             logger.info("Models initialized successfully")
             
         except Exception as e:
             logger.error(f"Error initializing models: {e}")
             raise
     
-    def _generate_blip_caption(self, image):
+    def _configure_interrogator_from_store(self, config, model_store, clip_model_name, blip_source, load_kwargs):
+        """Hand the Interrogator locally stored models so it never resolves anything on the hub"""
+        import open_clip
+        
+        arch = clip_model_name.split('/', 1)[0]
+        with log_load_time("CLIP model"):
+            clip_model, _, clip_preprocess = open_clip.create_model_and_transforms(
+                arch,
+                pretrained=model_store.clip_checkpoint(clip_model_name),
+                precision='fp16' if self.device == 'cuda' else 'fp32',
+                device=self.device,
+                jit=False
+            )
+        config.clip_model = clip_model.eval()
+        config.clip_preprocess = clip_preprocess
+        config.cache_path = model_store.interrogator_cache_dir
+        config.download_cache = False
+        
+        if config.caption_model_name:
+            if self.device == "cuda":
+                # The Interrogator runs its caption model in fp16 on GPU
+                with log_load_time("Interrogator BLIP (fp16)"):
+                    config.caption_model = BlipForConditionalGeneration.from_pretrained(
+                        blip_source, torch_dtype=torch.float16, **load_kwargs
+                    ).to(self.device)
+            else:
+                # Same weights in fp32: share our BLIP instead of loading a second copy
+                config.caption_model = self.blip_model
+            config.caption_processor = self.processor
+    
+    @timed("blip_generate")
+    def _generate_blip_caption(self, image, generate_kwargs=BLIP_GENERATE_KWARGS):
         """Generate a clean caption using BLIP"""
         try:
+            if self.backend == "onnx":
+                return self.onnx_captioner.generate(image, **generate_kwargs).strip()
+            
             # Process image
             inputs = self.processor(images=image, return_tensors="pt").to(self.device)
             
             # Generate caption with improved parameters
-            outputs = self.blip_model.generate(
-                **inputs,
-                max_new_tokens=30,          # Shorter to avoid rambling
-                min_length=15,              # Ensure reasonable length
-                num_beams=7,                # More beams for better quality
-                length_penalty=1.5,         # Favor slightly longer sentences
-                temperature=0.7,            # Lower temperature for more focused output
-                repetition_penalty=1.2,     # Avoid repetitive phrases
-                no_repeat_ngram_size=2      # Prevent repeating word pairs
-            )
+            with autocast(self.precision):
+                outputs = self.blip_model.generate(**inputs, **generate_kwargs)
             
             # Decode caption
             caption = self.processor.decode(outputs[0], skip_special_tokens=True)
@@ -73,11 +172,33 @@ class ClipInterrogatorModel:
             logger.error(f"Error generating BLIP caption: {e}")
             return None
     
+    def _generate_blip_captions(self, images, generate_kwargs=BLIP_GENERATE_KWARGS):
+        """Generate captions for several images in one BLIP call (micro-batching)"""
+        if self.backend == "onnx" or len(images) == 1:
+            return [self._generate_blip_caption(image, generate_kwargs) for image in images]
+        
+        try:
+            with METRICS.timer("blip_generate_batch"):
+                inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+                with autocast(self.precision):
+                    outputs = self.blip_model.generate(**inputs, **generate_kwargs)
+            return [caption.strip() for caption in self.processor.batch_decode(outputs, skip_special_tokens=True)]
+        except Exception as e:
+            logger.error(f"Error generating batched BLIP captions: {e}")
+            return [None] * len(images)
+    
+    @timed("clip_interrogate")
     def _get_clip_details(self, image):
         """Get additional details from CLIP"""
         try:
             # Get medium and artist details with fast mode
-            clip_details = self.ci.interrogate_fast(image)
+            if self.backend == "onnx":
+                # Greedy caption like Interrogator.generate_caption, but through the ONNX decoder
+                caption = self.onnx_captioner.generate(image, max_new_tokens=self.ci.config.caption_max_length)
+                clip_details = self.ci.interrogate_fast(image, caption=caption)
+            else:
+                with autocast(self.precision):
+                    clip_details = self.ci.interrogate_fast(image)
             
             # Extract relevant keywords with improved filtering
             keywords = []
@@ -101,6 +222,7 @@ class ClipInterrogatorModel:
             logger.error(f"Error getting CLIP details: {e}")
             return []
     
+    @timed("description_clean")
     def _clean_description(self, description):
         """Clean and format the description"""
         if not description:
@@ -174,59 +296,110 @@ class ClipInterrogatorModel:
         
         return description
     
-    def generate_description(self, image_path, use_cache=True):
-        """Generate description from image with caching"""
+    def generate_description(self, image_path, use_cache=True, cheap=False):
+        """
+        Generate description from image with caching
+        
+        With cheap=True (retry after a timeout) the image is downscaled, BLIP decodes
+        greedily, CLIP details are skipped and the result is not cached.
+        """
         # Check cache
         cache_path = get_cache_path(image_path, prefix="desc_", cache_dir=self.cache_dir)
         if use_cache:
-            cached_data = load_from_cache(cache_path)
+            cached_data = load_from_cache(cache_path, image_path)
             if cached_data:
-                logger.info(f"Using cached description for {os.path.basename(image_path)}")
+                logger.debug("Using cached description for %s", os.path.basename(image_path))
                 return cached_data["description"]
         
         try:
             # Load and validate image
             try:
-                image = Image.open(image_path).convert('RGB')
+                with METRICS.timer("image_decode"):
+                    image = Image.open(open_image_source(image_path)).convert('RGB')
             except Exception as img_error:
                 logger.error(f"Error reading image {image_path}: {img_error}")
                 return None
             
-            logger.info(f"Generating description for {os.path.basename(image_path)}")
+            if cheap:
+                image.thumbnail((CHEAP_MAX_IMAGE_SIZE, CHEAP_MAX_IMAGE_SIZE))
             
-            # Generate main caption using BLIP
-            main_caption = self._generate_blip_caption(image)
-            if not main_caption:
-                return None
-            
-            # Get additional details from CLIP
-            clip_keywords = self._get_clip_details(image)
-            
-            # Combine and clean description
-            if clip_keywords:
-                # Use more natural language to incorporate keywords
-                keyword_str = ', '.join(clip_keywords)
-                if len(clip_keywords) == 1:
-                    full_description = f"{main_caption} It features {keyword_str}."
-                else:
-                    full_description = f"{main_caption} It features elements like {keyword_str}."
-            else:
-                full_description = main_caption
+            logger.debug("Generating description for %s", os.path.basename(image_path))
             
-            # Clean and validate final description
-            description = self._clean_description(full_description)
-            if not description or len(description.split()) < 5:
-                logger.warning(f"Generated description too short for {image_path}")
-                return None
-            
-            # Save to cache
-            save_to_cache({"description": description}, cache_path)
-            return description
+            # Generate main caption using BLIP
+            main_caption = self._generate_blip_caption(image, CHEAP_GENERATE_KWARGS if cheap else BLIP_GENERATE_KWARGS)
+            return self._compose_description(image_path, image, main_caption, cache_path, cheap=cheap)
             
         except Exception as e:
             logger.error(f"Error generating description: {e}")
             return None
     
+    def _compose_description(self, image_path, image, main_caption, cache_path, cheap=False):
+        """Add CLIP details to a BLIP caption, clean it and cache the result"""
+        if not main_caption:
+            return None
+        
+        # Get additional details from CLIP
+        clip_keywords = [] if cheap else self._get_clip_details(image)
+        
+        # Combine and clean description
+        if clip_keywords:
+            # Use more natural language to incorporate keywords
+            keyword_str = ', '.join(clip_keywords)
+            if len(clip_keywords) == 1:
+                full_description = f"{main_caption} It features {keyword_str}."
+            else:
+                full_description = f"{main_caption} It features elements like {keyword_str}."
+        else:
+            full_description = main_caption
+        
+        # Clean and validate final description
+        description = self._clean_description(full_description)
+        if not description or len(description.split()) < 5:
+            logger.warning(f"Generated description too short for {image_path}")
+            return None
+        
+        # Save to cache (degraded cheap results are not cached)
+        if not cheap:
+            save_to_cache({"description": description}, cache_path, image_path)
+        return description
+    
+    def generate_descriptions(self, image_paths, use_cache=True):
+        """
+        Generate descriptions for several images, captioning the cache misses in one BLIP call
+        
+        Returns:
+            List of descriptions (None where generation failed), in the order of image_paths
+        """
+        descriptions = [None] * len(image_paths)
+        pending = []
+        
+        for index, image_path in enumerate(image_paths):
+            cache_path = get_cache_path(image_path, prefix="desc_", cache_dir=self.cache_dir)
+            if use_cache:
+                cached_data = load_from_cache(cache_path, image_path)
+                if cached_data:
+                    descriptions[index] = cached_data["description"]
+                    continue
+            try:
+                with METRICS.timer("image_decode"):
+                    image = Image.open(open_image_source(image_path)).convert('RGB')
+            except Exception as img_error:
+                logger.error(f"Error reading image {image_path}: {img_error}")
+                continue
+            pending.append((index, image_path, image, cache_path))
+        
+        if not pending:
+            return descriptions
+        
+        logger.debug("Generating descriptions for %d images in one batch", len(pending))
+        captions = self._generate_blip_captions([image for _, _, image, _ in pending])
+        for (index, image_path, image, cache_path), caption in zip(pending, captions):
+            try:
+                descriptions[index] = self._compose_description(image_path, image, caption, cache_path)
+            except Exception as e:
+                logger.error(f"Error generating description: {e}")
+        return descriptions
+    
     def __del__(self):
         """Clean up resources"""
         try:
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+import multiprocessing
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Listener writing the queued records of this process (and its forked workers)
+_LISTENER = None
+
+class TqdmHandler(logging.StreamHandler):
+    """Console handler writing through tqdm.write, so records don't break the progress bars"""
+
+    def emit(self, record):
+        try:
+            from tqdm import tqdm
+            tqdm.write(self.format(record), file=self.stream)
+        except Exception:
+            self.handleError(record)
+
+def setup_logging(level=logging.INFO, log_file="tagging.log"):
+    """
+    Configure the root logger once for the entry point and its workers
+
+    Logging calls only enqueue the record; a QueueListener thread formats it and
+    writes it to the console and the log file. The queue is a multiprocessing
+    queue, so workers forked afterwards send their records to the same listener
+    instead of writing the file concurrently.
+
+    A spawned child re-imports the entry point; it leaves logging to its parent
+    (see ChildLogReceiver) instead of opening the log file a second time.
+
+    Args:
+        level: Root level (name or number)
+        log_file: Log file path, None for console only
+
+    Returns:
+        The QueueListener, None in a spawned child
+    """
+    global _LISTENER
+    if _LISTENER is not None:
+        return _LISTENER
+    # Spawn renames the child before re-importing the entry point (parent_process() is set only later)
+    if multiprocessing.current_process().name != "MainProcess":
+        return None
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [TqdmHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    try:
+        log_queue = multiprocessing.Queue(-1)
+    except (OSError, ImportError):
+        # No process-shared semaphores on this platform: workers keep the default handling
+        log_queue = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _LISTENER = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(stop_logging)
+    return _LISTENER
+
+class ChildLogReceiver:
+    """
+    Per-child log queue, for a child process that may be killed
+
+    A process killed while sending on the shared log queue would leave its write
+    lock held and block every other process's records. A child started with
+    log_to_queue(receiver.queue) writes only to its own queue instead; a thread
+    of this process hands the records to this process's handlers.
+    """
+
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, context=multiprocessing):
+        self.queue = context.Queue(-1)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="child-logs", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _handle(record):
+        logging.getLogger(record.name).handle(record)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                record = self.queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            self._handle(record)
+
+    def close(self):
+        """Forward the records still queued (call once the child has exited) and stop"""
+        self._stopped.set()
+        self._thread.join(timeout=5)
+        if self._thread.is_alive():
+            # Stuck on a record cut short by a killed child
+            return
+        while True:
+            try:
+                self._handle(self.queue.get_nowait())
+            except (queue.Empty, EOFError, OSError):
+                break
+
+def log_to_queue(log_queue, level=logging.INFO):
+    """In a child process: send every record to log_queue only (see ChildLogReceiver)"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+def stop_logging():
+    """Write the records still queued and stop the listener"""
+    global _LISTENER
+    listener, _LISTENER = _LISTENER, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import bisect
+import functools
+import threading
+import contextlib
+
+# Upper bounds (seconds) of the latency histogram buckets, the last one is +Inf
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Metrics:
+    """
+    Per-process stage timings, counters and cache hit rates
+
+    Snapshots are plain dicts, so worker processes can send theirs to the parent,
+    which folds them in with merge().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Context manager factory also marking timed stages elsewhere (the opt-in profiler)
+        self.stage_hook = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.cache = {}
+
+    def observe(self, stage, seconds):
+        """Record one execution of a stage"""
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {"count": 0, "total_sec": 0.0, "max_sec": 0.0,
+                                              "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            entry["count"] += 1
+            entry["total_sec"] += seconds
+            entry["max_sec"] = max(entry["max_sec"], seconds)
+            entry["buckets"][index] += 1
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as one execution of a stage"""
+        hook = self.stage_hook
+        start = time.perf_counter()
+        try:
+            if hook is None:
+                yield
+            else:
+                with hook(stage):
+                    yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        """Increment a counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def cache_access(self, kind, hit):
+        """Record a cache lookup (kind: 'desc', 'tags', ...)"""
+        with self._lock:
+            entry = self.cache.setdefault(kind, {"hits": 0, "misses": 0})
+            entry["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        """Copy of all metrics as a JSON-serializable dict"""
+        with self._lock:
+            return json.loads(json.dumps({"stages": self.stages, "counters": self.counters, "cache": self.cache}))
+
+    def drain(self):
+        """Snapshot and reset (used by workers reporting to a parent)"""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a snapshot from another process"""
+        if not snapshot:
+            return
+        with self._lock:
+            for stage, other in snapshot.get("stages", {}).items():
+                entry = self.stages.get(stage)
+                if entry is None:
+                    self.stages[stage] = dict(other, buckets=list(other["buckets"]))
+                    continue
+                entry["count"] += other["count"]
+                entry["total_sec"] += other["total_sec"]
+                entry["max_sec"] = max(entry["max_sec"], other["max_sec"])
+                entry["buckets"] = [a + b for a, b in zip(entry["buckets"], other["buckets"])]
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for kind, other in snapshot.get("cache", {}).items():
+                entry = self.cache.setdefault(kind, {"hits": 0, "misses": 0})
+                entry["hits"] += other["hits"]
+                entry["misses"] += other["misses"]
+
+    def report(self, **extra):
+        """
+        Run report with derived values (mean latency, approximate p50/p95, hit rates)
+
+        Args:
+            extra: Additional top-level fields (elapsed time, directory counts, ...)
+        """
+        snapshot = self.snapshot()
+        collisions = sorted(set(extra) & set(snapshot))
+        if collisions:
+            raise ValueError(f"Report fields collide with the metrics snapshot: {', '.join(collisions)}")
+        for entry in snapshot["stages"].values():
+            entry["mean_sec"] = entry["total_sec"] / entry["count"] if entry["count"] else 0.0
+            entry["p50_sec"] = _bucket_quantile(entry["buckets"], 0.5)
+            entry["p95_sec"] = _bucket_quantile(entry["buckets"], 0.95)
+            entry["buckets"] = dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], entry["buckets"]))
+        for entry in snapshot["cache"].values():
+            total = entry["hits"] + entry["misses"]
+            entry["hit_rate"] = entry["hits"] / total if total else 0.0
+        return dict(extra, **snapshot)
+
+    def to_prometheus(self, prefix="tagging"):
+        """Metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of pipeline stages",
+            f"# TYPE {prefix}_stage_seconds histogram"
+        ]
+        for stage, entry in sorted(snapshot["stages"].items()):
+            cumulative = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], entry["buckets"]):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {entry["total_sec"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+
+        lines.append(f"# TYPE {prefix}_cache_requests_total counter")
+        for kind, entry in sorted(snapshot["cache"].items()):
+            lines.append(f'{prefix}_cache_requests_total{{cache="{kind}",result="hit"}} {entry["hits"]}')
+            lines.append(f'{prefix}_cache_requests_total{{cache="{kind}",result="miss"}} {entry["misses"]}')
+        return "\n".join(lines) + "\n"
+
+def _bucket_quantile(buckets, quantile):
+    """Upper bound of the bucket holding the given quantile (None if it is the +Inf bucket)"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + (None,), buckets):
+        cumulative += count
+        if cumulative >= rank:
+            return bound
+    return None
+
+# Metrics of this process
+METRICS = Metrics()
+
+def enable_profiling(profile_options, role="main"):
+    """
+    Profile this process with script/profiling.py, using the metric stages as stage markers
+
+    Args:
+        profile_options: Dict from profiling.options() (output_dir, mode, interval)
+        role: "main" is stopped by the caller, other roles save when the worker process exits
+    """
+    from script import profiling
+    if role == "main":
+        profiling.start(profile_options["output_dir"], role=role, mode=profile_options["mode"],
+                        interval=profile_options["interval"])
+    else:
+        profiling.start_worker(profile_options, role=role)
+    METRICS.stage_hook = profiling.stage
+
+def timed(stage):
+    """Decorator recording each call of a function as one execution of a stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
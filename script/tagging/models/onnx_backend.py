@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger("onnx_backend")
+
+# File names of the exported graphs inside the ONNX directory
+VISION_ENCODER_FILE = "blip_vision_encoder.onnx"
+TEXT_DECODER_FILE = "blip_text_decoder.onnx"
+TEXT_DECODER_WITH_PAST_FILE = "blip_text_decoder_with_past.onnx"
+CLIP_IMAGE_ENCODER_FILE = "clip_image_encoder.onnx"
+GENERATION_CONFIG_FILE = "blip_generation.json"
+
+
+def create_session(model_path, intra_op_threads=None):
+    """Create an ONNX Runtime CPU session with the given intra-op thread count"""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = int(intra_op_threads) if intra_op_threads else 0  # 0 = ORT default
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+
+
+def _flatten_past(past_key_values):
+    """Convert a transformers cache into a flat list of self-attention key/value tensors"""
+    if hasattr(past_key_values, "to_legacy_cache"):
+        past_key_values = past_key_values.to_legacy_cache()
+    flat = []
+    for layer in past_key_values:
+        flat.extend(layer[:2])
+    return flat
+
+
+def export_onnx_models(model, output_dir, opset=17):
+    """
+    Export BLIP and CLIP graphs of a loaded torch ClipInterrogatorModel to ONNX
+
+    Args:
+        model: ClipInterrogatorModel loaded with the torch backend
+        output_dir: Directory to write the .onnx files to
+        opset: ONNX opset version
+
+    Returns:
+        Dict mapping graph name to exported file path
+    """
+    import torch
+    from PIL import Image
+
+    os.makedirs(output_dir, exist_ok=True)
+    blip_model = model.blip_model.to("cpu").eval()
+    text_config = blip_model.config.text_config
+    num_layers = text_config.num_hidden_layers
+
+    class VisionEncoder(torch.nn.Module):
+        def __init__(self, vision_model):
+            super().__init__()
+            self.vision_model = vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values)[0]
+
+    class TextDecoder(torch.nn.Module):
+        def __init__(self, text_decoder):
+            super().__init__()
+            self.text_decoder = text_decoder
+
+        def forward(self, input_ids, encoder_hidden_states, *past):
+            past_key_values = None
+            if past:
+                past_key_values = tuple((past[2 * i], past[2 * i + 1]) for i in range(num_layers))
+            outputs = self.text_decoder(
+                input_ids=input_ids,
+                encoder_hidden_states=encoder_hidden_states,
+                past_key_values=past_key_values,
+                use_cache=True,
+                return_dict=True
+            )
+            return (outputs.logits[:, -1, :], *_flatten_past(outputs.past_key_values))
+
+    class ClipImageEncoder(torch.nn.Module):
+        def __init__(self, clip_model):
+            super().__init__()
+            self.clip_model = clip_model
+
+        def forward(self, pixel_values):
+            features = self.clip_model.encode_image(pixel_values)
+            return features / features.norm(dim=-1, keepdim=True)
+
+    paths = {
+        "vision_encoder": os.path.join(output_dir, VISION_ENCODER_FILE),
+        "text_decoder": os.path.join(output_dir, TEXT_DECODER_FILE),
+        "text_decoder_with_past": os.path.join(output_dir, TEXT_DECODER_WITH_PAST_FILE),
+        "clip_image_encoder": os.path.join(output_dir, CLIP_IMAGE_ENCODER_FILE)
+    }
+    present_names = [f"present.{i}.{kind}" for i in range(num_layers) for kind in ("key", "value")]
+    past_names = [f"past.{i}.{kind}" for i in range(num_layers) for kind in ("key", "value")]
+    kv_axes = {0: "batch", 2: "past_sequence"}
+
+    blank = Image.new("RGB", (384, 384), "white")
+    pixel_values = model.processor(images=blank, return_tensors="pt")["pixel_values"]
+
+    with torch.no_grad():
+        # 1. BLIP vision encoder
+        logger.info(f"Exporting BLIP vision encoder to {paths['vision_encoder']}")
+        vision_encoder = VisionEncoder(blip_model.vision_model).eval()
+        image_embeds = vision_encoder(pixel_values)
+        torch.onnx.export(
+            vision_encoder, (pixel_values,), paths["vision_encoder"],
+            input_names=["pixel_values"],
+            output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=opset
+        )
+
+        # 2. BLIP text decoder, first step (no KV cache yet)
+        logger.info(f"Exporting BLIP text decoder to {paths['text_decoder']}")
+        text_decoder = TextDecoder(blip_model.text_decoder).eval()
+        input_ids = torch.tensor([[text_config.bos_token_id]], dtype=torch.long)
+        first_outputs = text_decoder(input_ids, image_embeds)
+        torch.onnx.export(
+            text_decoder, (input_ids, image_embeds), paths["text_decoder"],
+            input_names=["input_ids", "encoder_hidden_states"],
+            output_names=["logits"] + present_names,
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "encoder_hidden_states": {0: "batch"},
+                "logits": {0: "batch"},
+                **{name: {0: "batch", 2: "sequence"} for name in present_names}
+            },
+            opset_version=opset
+        )
+
+        # 3. BLIP text decoder, subsequent steps (consumes and extends the KV cache)
+        logger.info(f"Exporting BLIP text decoder with past to {paths['text_decoder_with_past']}")
+        past = tuple(first_outputs[1:])
+        torch.onnx.export(
+            text_decoder, (input_ids, image_embeds, *past), paths["text_decoder_with_past"],
+            input_names=["input_ids", "encoder_hidden_states"] + past_names,
+            output_names=["logits"] + present_names,
+            dynamic_axes={
+                "input_ids": {0: "batch"},
+                "encoder_hidden_states": {0: "batch"},
+                "logits": {0: "batch"},
+                **{name: kv_axes for name in past_names},
+                **{name: {0: "batch", 2: "total_sequence"} for name in present_names}
+            },
+            opset_version=opset
+        )
+
+        # 4. CLIP image encoder (normalized features, as used by the Interrogator)
+        logger.info(f"Exporting CLIP image encoder to {paths['clip_image_encoder']}")
+        clip_encoder = ClipImageEncoder(model.ci.clip_model.to("cpu").float()).eval()
+        clip_pixels = model.ci.clip_preprocess(blank).unsqueeze(0)
+        torch.onnx.export(
+            clip_encoder, (clip_pixels,), paths["clip_image_encoder"],
+            input_names=["pixel_values"],
+            output_names=["image_features"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_features": {0: "batch"}},
+            opset_version=opset
+        )
+
+    # Token ids needed to run generation without the torch model
+    generation_config = {
+        "bos_token_id": text_config.bos_token_id,
+        "eos_token_id": text_config.sep_token_id,
+        "pad_token_id": text_config.pad_token_id,
+        "num_layers": num_layers
+    }
+    with open(os.path.join(output_dir, GENERATION_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(generation_config, f, indent=2)
+
+    logger.info(f"ONNX export finished: {output_dir}")
+    return paths
+
+
+def _log_softmax(logits):
+    """Numerically stable log-softmax over the last axis"""
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    return logits - np.log(np.exp(logits).sum(axis=-1, keepdims=True))
+
+
+class _BeamHypotheses:
+    """Finished hypotheses of a beam search (same scoring rule as transformers)"""
+
+    def __init__(self, num_beams, length_penalty):
+        self.num_beams = num_beams
+        self.length_penalty = length_penalty
+        self.beams = []
+        self.worst_score = 1e9
+
+    def add(self, tokens, sum_logprobs):
+        score = sum_logprobs / (len(tokens) ** self.length_penalty)
+        if len(self.beams) < self.num_beams or score > self.worst_score:
+            self.beams.append((score, tokens))
+            if len(self.beams) > self.num_beams:
+                self.beams.sort(key=lambda x: x[0])
+                del self.beams[0]
+            self.worst_score = min(s for s, _ in self.beams)
+
+    def is_done(self, best_sum_logprobs, cur_len):
+        if len(self.beams) < self.num_beams:
+            return False
+        return self.worst_score >= best_sum_logprobs / (cur_len ** self.length_penalty)
+
+    def best(self):
+        return max(self.beams, key=lambda x: x[0])[1]
+
+
+class OnnxBlipCaptioner:
+    """BLIP caption generation (vision encoder + KV-cached text decoder) on ONNX Runtime"""
+
+    def __init__(self, onnx_dir, processor, intra_op_threads=None):
+        self.processor = processor
+
+        with open(os.path.join(onnx_dir, GENERATION_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            generation_config = json.load(f)
+        self.bos_token_id = generation_config["bos_token_id"]
+        self.eos_token_id = generation_config["eos_token_id"]
+        self.num_layers = generation_config["num_layers"]
+
+        self.vision_session = create_session(os.path.join(onnx_dir, VISION_ENCODER_FILE), intra_op_threads)
+        self.decoder_session = create_session(os.path.join(onnx_dir, TEXT_DECODER_FILE), intra_op_threads)
+        self.decoder_with_past_session = create_session(
+            os.path.join(onnx_dir, TEXT_DECODER_WITH_PAST_FILE), intra_op_threads
+        )
+        self.past_names = [f"past.{i}.{kind}" for i in range(self.num_layers) for kind in ("key", "value")]
+
+    def encode(self, image):
+        """Run the BLIP vision encoder on a PIL image"""
+        pixel_values = self.processor(images=image, return_tensors="np")["pixel_values"].astype(np.float32)
+        return self.vision_session.run(None, {"pixel_values": pixel_values})[0]
+
+    def _decode_step(self, input_ids, encoder_hidden_states, past):
+        if past is None:
+            outputs = self.decoder_session.run(None, {
+                "input_ids": input_ids,
+                "encoder_hidden_states": encoder_hidden_states
+            })
+        else:
+            feed = {"input_ids": input_ids[:, -1:], "encoder_hidden_states": encoder_hidden_states}
+            feed.update(zip(self.past_names, past))
+            outputs = self.decoder_with_past_session.run(None, feed)
+        return outputs[0], outputs[1:]
+
+    def _process_scores(self, scores, sequences, cur_len, min_length, repetition_penalty, no_repeat_ngram_size):
+        """Apply repetition penalty, n-gram blocking and minimum length like transformers does"""
+        if repetition_penalty != 1.0:
+            for beam, tokens in enumerate(sequences):
+                previous = np.unique(tokens)
+                values = scores[beam, previous]
+                scores[beam, previous] = np.where(values < 0, values * repetition_penalty, values / repetition_penalty)
+
+        if no_repeat_ngram_size and cur_len + 1 >= no_repeat_ngram_size:
+            n = no_repeat_ngram_size
+            for beam, tokens in enumerate(sequences):
+                tokens = tokens.tolist()
+                prefix = tuple(tokens[cur_len - n + 1:])
+                banned = [tokens[i + n - 1] for i in range(cur_len - n + 1) if tuple(tokens[i:i + n - 1]) == prefix]
+                scores[beam, banned] = -np.inf
+
+        if cur_len < min_length:
+            scores[:, self.eos_token_id] = -np.inf
+
+        return scores
+
+    def generate(self, image, num_beams=1, max_new_tokens=30, min_length=0, length_penalty=1.0,
+                 repetition_penalty=1.0, no_repeat_ngram_size=0, **unused):
+        """
+        Generate a caption with beam search (num_beams=1 gives greedy decoding)
+
+        Args:
+            image: PIL image
+            **unused: Sampling-only options such as temperature, ignored by beam search
+
+        Returns:
+            Decoded caption string
+        """
+        encoder_hidden_states = np.repeat(self.encode(image), num_beams, axis=0)
+
+        sequences = np.full((num_beams, 1), self.bos_token_id, dtype=np.int64)
+        beam_scores = np.full(num_beams, -1e9, dtype=np.float32)
+        beam_scores[0] = 0.0
+        hypotheses = _BeamHypotheses(num_beams, length_penalty)
+        max_length = 1 + max_new_tokens
+        past = None
+
+        while sequences.shape[1] < max_length:
+            cur_len = sequences.shape[1]
+            logits, past = self._decode_step(sequences, encoder_hidden_states, past)
+            scores = self._process_scores(
+                _log_softmax(logits.astype(np.float32)), sequences, cur_len,
+                min_length, repetition_penalty, no_repeat_ngram_size
+            )
+            scores = scores + beam_scores[:, None]
+
+            vocab_size = scores.shape[1]
+            flat = scores.reshape(-1)
+            top = np.argsort(-flat)[:2 * num_beams]
+
+            next_beams, next_tokens, next_scores = [], [], []
+            for rank, index in enumerate(top):
+                beam, token = divmod(int(index), vocab_size)
+                score = float(flat[index])
+                if token == self.eos_token_id:
+                    if rank < num_beams:
+                        hypotheses.add(sequences[beam].copy(), score)
+                else:
+                    next_beams.append(beam)
+                    next_tokens.append(token)
+                    next_scores.append(score)
+                if len(next_beams) == num_beams:
+                    break
+
+            if hypotheses.is_done(float(flat[top[0]]), cur_len) or not next_beams:
+                break
+
+            beam_index = np.array(next_beams)
+            sequences = np.concatenate([sequences[beam_index], np.array(next_tokens)[:, None]], axis=1)
+            beam_scores = np.array(next_scores, dtype=np.float32)
+            past = [tensor[beam_index] for tensor in past]
+        else:
+            # Reached max length: unfinished beams become hypotheses
+            for beam in range(num_beams):
+                hypotheses.add(sequences[beam], float(beam_scores[beam]))
+
+        tokens = hypotheses.best() if hypotheses.beams else sequences[0]
+        return self.processor.decode(tokens, skip_special_tokens=True)
+
+
+class OnnxClipImageEncoder:
+    """CLIP image features on ONNX Runtime, drop-in for Interrogator.image_to_features"""
+
+    def __init__(self, onnx_dir, preprocess, device="cpu", intra_op_threads=None):
+        self.preprocess = preprocess
+        self.device = device
+        self.session = create_session(os.path.join(onnx_dir, CLIP_IMAGE_ENCODER_FILE), intra_op_threads)
+
+    def image_to_features(self, image):
+        import torch
+
+        pixel_values = self.preprocess(image).unsqueeze(0).numpy().astype(np.float32)
+        features = self.session.run(None, {"pixel_values": pixel_values})[0]
+        return torch.from_numpy(features).to(self.device)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import contextlib
+import torch
+
+logger = logging.getLogger("precision")
+
+PRECISIONS = ("fp32", "int8", "bf16")
+
+def cpu_supports_bf16():
+    """Check whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)"""
+    try:
+        with open("/proc/cpuinfo", 'r', encoding='utf-8') as f:
+            flags = f.read()
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+    except OSError:
+        # No /proc/cpuinfo (Windows/macOS): fall back to the capability torch was built for
+        try:
+            return torch.backends.cpu.get_cpu_capability() == "AVX512"
+        except Exception:
+            return False
+
+def resolve_precision(precision, device):
+    """
+    Validate a precision mode for a device
+
+    Args:
+        precision: "fp32", "int8" or "bf16"
+        device: "cpu" or "cuda"
+
+    Returns:
+        The precision that will actually be used
+    """
+    precision = (precision or "fp32").lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+
+    if precision != "fp32" and device != "cpu":
+        logger.warning(f"Precision {precision} is only applied on CPU, using fp32 on {device}")
+        return "fp32"
+
+    if precision == "bf16" and not cpu_supports_bf16():
+        logger.warning("CPU has no native bfloat16 support, using fp32")
+        return "fp32"
+
+    return precision
+
+def quantize_linear(model):
+    """Apply dynamic int8 quantization to the Linear layers of a torch module"""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def autocast(precision):
+    """Context manager enabling bfloat16 CPU autocast for precision 'bf16', no-op otherwise"""
+    if precision == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import zipfile
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("sources")
+
+# Images can come from plain directories or straight from pack ZIPs. A file inside an
+# archive is addressed as "<archive.zip>!/<member name>", so it travels through the
+# pipeline (cache keys, worker queues, shard results) as an ordinary path string;
+# only listing and decoding need to know the difference.
+ARCHIVE_SEPARATOR = "!/"
+
+# auto: archives whose packs are not already extracted next to them; off: directories only; only: archives only
+ZIP_SOURCE_MODES = ("auto", "off", "only")
+
+# Open archives of this process, by path (never shared across fork: the file offset would be).
+# Evicted ones are closed by the garbage collector once no reader holds them any more.
+MAX_OPEN_ARCHIVES = 64
+_ARCHIVES = OrderedDict()
+_ARCHIVES_LOCK = threading.Lock()
+
+# Input root -> {target directory: archive path of its folder}, see theme_location
+_THEMES = {}
+
+def split_archive_path(path):
+    """
+    Split "<archive.zip>!/<member>" into its parts
+
+    Returns:
+        Tuple (archive path, member name), or (None, path) for a plain filesystem path
+    """
+    path = str(path)
+    archive, separator, member = path.partition(ARCHIVE_SEPARATOR)
+    if not separator or not archive.lower().endswith(".zip"):
+        return None, path
+    return archive, member
+
+def is_archive_path(path):
+    return split_archive_path(path)[0] is not None
+
+def archive_path(archive, member):
+    """Path string of a member of an archive"""
+    return f"{archive}{ARCHIVE_SEPARATOR}{member}"
+
+def _open_archive(archive):
+    """ZipFile of this process for an archive, reopened when the file changed"""
+    stat = os.stat(archive)
+    key = (os.getpid(), archive)
+    with _ARCHIVES_LOCK:
+        entry = _ARCHIVES.get(key)
+        if entry is None or entry[0] != (stat.st_size, stat.st_mtime_ns):
+            entry = ((stat.st_size, stat.st_mtime_ns), zipfile.ZipFile(archive, 'r'))
+            _ARCHIVES[key] = entry
+            while len(_ARCHIVES) > MAX_OPEN_ARCHIVES:
+                _ARCHIVES.popitem(last=False)
+        _ARCHIVES.move_to_end(key)
+        return entry[1]
+
+def open_image_source(image_path):
+    """
+    Something PIL.Image.open accepts for an image path
+
+    Returns:
+        The path itself for a plain file; an in-memory buffer of the member for an archive path
+    """
+    archive, member = split_archive_path(image_path)
+    if archive is None:
+        return image_path
+    return io.BytesIO(_open_archive(archive).read(member))
+
+def file_info(path):
+    """
+    Size and change markers of a source file
+
+    Returns:
+        Dict with size, mtime_ns and crc (CRC-32 from the central directory, archive members only),
+        or None if the file does not exist
+    """
+    archive, member = split_archive_path(path)
+    try:
+        if archive is None:
+            stat = os.stat(path)
+            return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "crc": None}
+        info = _open_archive(archive).getinfo(member)
+    except (OSError, KeyError):
+        return None
+    return {"size": info.file_size, "mtime_ns": 0, "crc": f"{info.CRC:08x}"}
+
+def _archive_png_dirs(archive):
+    """Member directories named png that hold .png files, as archive paths"""
+    png_dirs = set()
+    try:
+        names = _open_archive(archive).namelist()
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.warning(f"Skipping unreadable archive {archive}: {e}")
+        return []
+    for name in names:
+        directory, _, filename = name.rpartition("/")
+        if filename.endswith(".png") and directory.rpartition("/")[2] == "png":
+            png_dirs.add(archive_path(archive, directory))
+    return sorted(png_dirs)
+
+def find_archives(root_dir):
+    """ZIP files under root_dir (root_dir itself if it is a ZIP)"""
+    if os.path.isfile(root_dir):
+        return [str(root_dir)] if str(root_dir).lower().endswith(".zip") else []
+    archives = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        archives.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith(".zip"))
+    return archives
+
+def find_archive_png_dirs(root_dir, exclude_targets=()):
+    """
+    png directories inside the ZIP files under root_dir
+
+    Args:
+        root_dir: Directory to search (or a single ZIP)
+        exclude_targets: Target directory names already available as plain directories
+
+    Returns:
+        Archive paths of png directories
+    """
+    png_dirs = []
+    for archive in find_archives(root_dir):
+        png_dirs.extend(d for d in _archive_png_dirs(archive) if target_directory(d) not in exclude_targets)
+    return png_dirs
+
+def list_pngs(png_dir):
+    """Sorted paths of the PNG files directly inside a png directory"""
+    archive, member_dir = split_archive_path(png_dir)
+    if archive is None:
+        return sorted(os.path.join(png_dir, f) for f in os.listdir(png_dir) if f.endswith(".png"))
+    prefix = member_dir.rstrip("/") + "/"
+    return sorted(
+        archive_path(archive, name) for name in _open_archive(archive).namelist()
+        if name.startswith(prefix) and name.endswith(".png") and "/" not in name[len(prefix):]
+    )
+
+def target_directory(png_dir):
+    """
+    Output directory name of a png directory
+    Example: input/110790-speeches/png -> 110790-speeches
+             input/110790-speeches.zip!/110790-speeches/png -> 110790-speeches
+             input/110790-speeches.zip!/png -> 110790-speeches (as unzip_files_all.py extracts it)
+    """
+    archive, member_dir = split_archive_path(png_dir)
+    if archive is None:
+        return os.path.basename(os.path.dirname(os.path.normpath(png_dir)))
+    parent = member_dir.rstrip("/").rpartition("/")[0]
+    return parent.rpartition("/")[2] if parent else os.path.splitext(os.path.basename(archive))[0]
+
+def input_root(png_dir):
+    """
+    Directory to look a theme up from (see theme_location)
+    Example: input/110790-speeches/png -> input
+             input/110790-speeches.zip!/110790-speeches/png -> input
+    """
+    archive, _ = split_archive_path(png_dir)
+    if archive is None:
+        return os.path.dirname(os.path.dirname(os.path.normpath(png_dir)))
+    return os.path.dirname(archive)
+
+def theme_location(input_root_dir, target_dir):
+    """
+    Where the files of a theme are: "<root>/<target>" for an extracted pack, or the
+    archive path of its folder inside a ZIP under input_root_dir
+
+    Returns:
+        Directory or archive path string (the extracted directory path if neither exists)
+    """
+    directory = os.path.join(str(input_root_dir), target_dir)
+    if os.path.isdir(directory):
+        return directory
+    # Index of the archive themes under this root, rebuilt when a theme is not in it
+    themes = _THEMES.get(str(input_root_dir))
+    if themes is None or target_dir not in themes:
+        themes = {}
+        for png_dir in find_archive_png_dirs(input_root_dir):
+            archive, member_dir = split_archive_path(png_dir)
+            themes.setdefault(target_directory(png_dir), archive_path(archive, member_dir.rpartition("/")[0]))
+        _THEMES[str(input_root_dir)] = themes
+    return themes.get(target_dir, directory)
+
+def join(location, *parts):
+    """Join path parts to a directory or archive path"""
+    archive, member = split_archive_path(location)
+    if archive is None:
+        return os.path.join(location, *parts)
+    return archive_path(archive, "/".join([p for p in [member.rstrip("/")] + list(parts) if p]))
+
+def archive_members(location):
+    """
+    Files under an archive directory path
+
+    Returns:
+        Tuple (ZipFile, list of (relative name, ZipInfo))
+    """
+    archive, member_dir = split_archive_path(location)
+    zip_ref = _open_archive(archive)
+    prefix = member_dir.rstrip("/") + "/" if member_dir.strip("/") else ""
+    members = [(info.filename[len(prefix):], info) for info in zip_ref.infolist()
+               if info.filename.startswith(prefix) and not info.is_dir()]
+    return zip_ref, members
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger("model_store")
+
+MANIFEST_FILE = "manifest.json"
+
+def enable_offline_mode():
+    """Forbid any Hugging Face hub access (must run before transformers is imported)"""
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    os.environ["HF_DATASETS_OFFLINE"] = "1"
+
+class ModelStore:
+    """Local store of model weights as memory-mappable safetensors, filled once by prepare-models"""
+
+    def __init__(self, root_dir):
+        self.root_dir = str(root_dir)
+        self.blip_dir = os.path.join(self.root_dir, "blip")
+        self.interrogator_cache_dir = os.path.join(self.root_dir, "clip_interrogator")
+        self.word2vec_path = os.path.join(self.root_dir, "word2vec", "GoogleNews-vectors-negative300.kv")
+
+    @staticmethod
+    def _safe_name(model_name):
+        return model_name.replace("/", "--")
+
+    def sentence_transformer_dir(self, model_name):
+        """Directory of a saved SentenceTransformer model"""
+        return os.path.join(self.root_dir, "sentence_transformers", self._safe_name(model_name))
+
+    def clip_checkpoint(self, clip_model_name):
+        """Path of the open_clip weights for 'ARCH/pretrained_tag'"""
+        return os.path.join(self.root_dir, "clip", f"{self._safe_name(clip_model_name)}.safetensors")
+
+    def manifest(self):
+        """Read the store manifest, or None if the store has not been prepared"""
+        path = os.path.join(self.root_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def has_clip(self, clip_model_name):
+        manifest = self.manifest()
+        return bool(manifest) and clip_model_name in manifest.get("clip_models", [])
+
+    def has_sentence_transformer(self, model_name):
+        manifest = self.manifest()
+        return bool(manifest) and model_name in manifest.get("sentence_transformers", [])
+
+    def has_blip(self):
+        manifest = self.manifest()
+        return bool(manifest) and bool(manifest.get("blip_model"))
+
+    def has_word2vec(self):
+        manifest = self.manifest()
+        return bool(manifest) and bool(manifest.get("word2vec"))
+
+    def prepare(self, clip_model_name, keybert_model_name, word2vec_source=None):
+        """
+        Download the models once and save them as safetensors in the store
+
+        Args:
+            clip_model_name: CLIP model as 'ARCH/pretrained_tag' (e.g. ViT-L-14/laion2b_s32b_b82k)
+            keybert_model_name: SentenceTransformer model used by KeyBERT
+            word2vec_source: Optional word2vec binary converted to a memory-mappable KeyedVectors file
+
+        Returns:
+            The written manifest
+        """
+        import open_clip
+        from safetensors.torch import save_file
+        from transformers import BlipProcessor, BlipForConditionalGeneration
+        from sentence_transformers import SentenceTransformer
+        from clip_interrogator import Config, Interrogator
+        from models.clip_model import BLIP_MODEL_NAME
+
+        os.makedirs(self.root_dir, exist_ok=True)
+
+        # 1. BLIP (processor + weights)
+        logger.info(f"Saving BLIP {BLIP_MODEL_NAME} to {self.blip_dir}")
+        processor = BlipProcessor.from_pretrained(BLIP_MODEL_NAME)
+        processor.save_pretrained(self.blip_dir)
+        blip_model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_NAME)
+        blip_model.save_pretrained(self.blip_dir, safe_serialization=True)
+
+        # 2. SentenceTransformer for KeyBERT
+        st_dir = self.sentence_transformer_dir(keybert_model_name)
+        logger.info(f"Saving SentenceTransformer {keybert_model_name} to {st_dir}")
+        SentenceTransformer(keybert_model_name).save(st_dir, safe_serialization=True)
+
+        # 3. open_clip weights
+        checkpoint = self.clip_checkpoint(clip_model_name)
+        logger.info(f"Saving CLIP {clip_model_name} to {checkpoint}")
+        os.makedirs(os.path.dirname(checkpoint), exist_ok=True)
+        arch, pretrained = clip_model_name.split('/', 1)
+        clip_model, _, clip_preprocess = open_clip.create_model_and_transforms(arch, pretrained=pretrained, device="cpu")
+        save_file({k: v.contiguous() for k, v in clip_model.state_dict().items()}, checkpoint)
+
+        # 4. Interrogator label embeddings (downloaded or computed into the store cache)
+        logger.info(f"Preparing CLIP Interrogator label cache in {self.interrogator_cache_dir}")
+        config = Config()
+        config.clip_model_name = clip_model_name
+        config.clip_model = clip_model
+        config.clip_preprocess = clip_preprocess
+        config.caption_model = blip_model
+        config.caption_processor = processor
+        config.cache_path = self.interrogator_cache_dir
+        config.device = "cpu"
+        Interrogator(config)
+
+        # 5. word2vec (optional, native KeyedVectors format can be loaded with mmap='r')
+        has_word2vec = False
+        if word2vec_source and os.path.exists(word2vec_source):
+            from gensim.models import KeyedVectors
+            logger.info(f"Converting word2vec {word2vec_source} to {self.word2vec_path}")
+            os.makedirs(os.path.dirname(self.word2vec_path), exist_ok=True)
+            KeyedVectors.load_word2vec_format(word2vec_source, binary=True).save(self.word2vec_path)
+            has_word2vec = True
+        elif word2vec_source:
+            logger.warning(f"word2vec source not found, skipping: {word2vec_source}")
+
+        manifest = self.manifest() or {}
+        manifest["blip_model"] = BLIP_MODEL_NAME
+        manifest["clip_models"] = sorted(set(manifest.get("clip_models", [])) | {clip_model_name})
+        manifest["sentence_transformers"] = sorted(set(manifest.get("sentence_transformers", [])) | {keybert_model_name})
+        manifest["word2vec"] = has_word2vec or manifest.get("word2vec", False)
+        manifest["prepared_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        with open(os.path.join(self.root_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"Model store ready: {self.root_dir}")
+        return manifest
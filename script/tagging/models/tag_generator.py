@@ -15,30 +15,50 @@ import numpy as np
 from collections import defaultdict
 
 # Changed from relative to absolute import
-from models.utils import get_cache_path, save_to_cache, load_from_cache, setup_cache_dir
+from config import ModelConfig
+from models.utils import get_cache_path, save_to_cache, load_from_cache, setup_cache_dir, log_load_time
+from models.precision import resolve_precision, quantize_linear, autocast
+from models.metrics import timed
 
 logger = logging.getLogger("tag_generator")
 
+# NLTK packages and the resource paths used to check whether they are already installed
+NLTK_RESOURCES = {
+    'wordnet': 'corpora/wordnet',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'omw-1.4': 'corpora/omw-1.4'
+}
+
+def ensure_nltk_data():
+    """Download required NLTK data only if it is missing"""
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            logger.info(f"Downloading NLTK data: {package}")
+            nltk.download(package, quiet=True)
+
 class TagGenerator:
     """Generate tags from descriptions using KeyBERT with automatic synonym expansion"""
     
-    def __init__(self, model_name="distilbert-base-nli-mean-tokens", device=None, cache_dir="data/cache"):
+    def __init__(self, model_name="distilbert-base-nli-mean-tokens", device=None, cache_dir="data/cache", precision="fp32",
+                 model_store=None):
         self.cache_dir = setup_cache_dir(cache_dir)
         self.model_name = model_name
+        self.precision = resolve_precision(precision, device or "cpu")
         
         # Initialize NLP components
         try:
-            # Download required NLTK data
-            nltk.download('wordnet', quiet=True)
-            nltk.download('averaged_perceptron_tagger', quiet=True)
-            nltk.download('omw-1.4', quiet=True)
+            # Download required NLTK data (no-op once installed)
+            ensure_nltk_data()
             
-            # Load pre-trained word vectors (will download if not present)
+            # Load pre-trained word vectors (memory-mapped from the model store when prepared)
             try:
-                self.word_vectors = KeyedVectors.load_word2vec_format(
-                    'models/GoogleNews-vectors-negative300.bin.gz', 
-                    binary=True
-                )
+                with log_load_time("word2vec"):
+                    if model_store is not None and model_store.has_word2vec():
+                        self.word_vectors = KeyedVectors.load(model_store.word2vec_path, mmap='r')
+                    else:
+                        self.word_vectors = KeyedVectors.load_word2vec_format(ModelConfig.WORD2VEC_PATH, binary=True)
             except Exception as e:
                 logger.warning(f"Could not load pre-trained word vectors: {e}")
                 self.word_vectors = None
@@ -51,12 +71,19 @@ class TagGenerator:
         
         # Initialize KeyBERT
         try:
-            # Load the sentence transformer model
-            logger.info(f"Loading SentenceTransformer model {model_name}...")
-            model = SentenceTransformer(model_name)
+            # Load the sentence transformer model (from the local model store when prepared)
+            model_source = model_name
+            if model_store is not None and model_store.has_sentence_transformer(model_name):
+                model_source = model_store.sentence_transformer_dir(model_name)
+            logger.info(f"Loading SentenceTransformer model {model_source}...")
+            with log_load_time(f"SentenceTransformer {model_name}"):
+                model = SentenceTransformer(model_source)
             
             if device == "cuda":
                 model = model.to("cuda")
+            elif self.precision == "int8":
+                logger.info("Applying dynamic int8 quantization to SentenceTransformer")
+                model = quantize_linear(model)
             
             self.kw_model = KeyBERT(model=model)
             logger.info(f"KeyBERT initialized successfully with model {model_name}")
@@ -68,6 +95,12 @@ class TagGenerator:
             logger.error(f"Error initializing KeyBERT: {e}")
             raise
 
+    @timed("keybert")
+    def _extract_keywords(self, text, **kwargs):
+        """Run KeyBERT keyword extraction under the configured precision"""
+        with autocast(self.precision):
+            return self.kw_model.extract_keywords(text, **kwargs)
+
     def _load_stopwords(self):
         """Load list of common stopwords"""
         # Common English stopwords plus domain-specific terms
@@ -108,6 +141,7 @@ class TagGenerator:
             'x', 'px', 'pixel', 'pixels', 'resolution'
         ]
     
+    @timed("wordnet")
     def _get_wordnet_synonyms(self, word):
         """Get synonyms and related words from WordNet"""
         related_words = set()
@@ -136,6 +170,7 @@ class TagGenerator:
         
         return list(related_words)
 
+    @timed("word2vec")
     def _get_similar_words(self, word, threshold=0.5):
         """Get similar words using word vectors"""
         similar_words = []
@@ -273,14 +308,14 @@ class TagGenerator:
             cache_path = get_cache_path(image_path, prefix="tags_", cache_dir=self.cache_dir)
             
             # Check cache
-            cached_data = load_from_cache(cache_path)
+            cached_data = load_from_cache(cache_path, image_path)
             if cached_data:
-                logger.info(f"Using cached tags for {os.path.basename(image_path)}")
+                logger.debug("Using cached tags for %s", os.path.basename(image_path))
                 return cached_data["tags"]
         
         # If no cache or not using cache, generate new tags
         try:
-            logger.info(f"Generating tags for {'image ' + os.path.basename(image_path) if image_path else 'description'}")
+            logger.debug("Generating tags for %s", "image " + os.path.basename(image_path) if image_path else "description")
             
             # Configure CountVectorizer for KeyBERT
             vectorizer = CountVectorizer(
@@ -295,7 +330,7 @@ class TagGenerator:
             # Extract keywords with diversity (MMR)
             try:
                 # First pass: get single words with high diversity
-                keywords_single = self.kw_model.extract_keywords(
+                keywords_single = self._extract_keywords(
                     description,
                     keyphrase_ngram_range=(1, 1),    # Single words only
                     stop_words=self.stopwords,
@@ -306,7 +341,7 @@ class TagGenerator:
                 )
                 
                 # Second pass: get phrases with lower diversity
-                keywords_phrases = self.kw_model.extract_keywords(
+                keywords_phrases = self._extract_keywords(
                     description,
                     keyphrase_ngram_range=(2, 2),    # Two-word phrases only
                     stop_words=self.stopwords,
@@ -323,7 +358,7 @@ class TagGenerator:
                     title_parts = title.split('-')
                     if len(title_parts) > 1:
                         title_text = ' '.join(title_parts[1:])  # Skip the number prefix
-                        title_keywords = self.kw_model.extract_keywords(
+                        title_keywords = self._extract_keywords(
                             title_text,
                             keyphrase_ngram_range=(1, 2),
                             stop_words=self.stopwords,
@@ -390,7 +425,7 @@ class TagGenerator:
                 
                 # Save to cache if image_path is provided
                 if cache_path:
-                    save_to_cache({"tags": final_tags}, cache_path)
+                    save_to_cache({"tags": final_tags}, cache_path, image_path)
                 
                 return final_tags
                 
@@ -4,20 +4,17 @@
 import os
 import re
 import json
+import time
+import zlib
 import hashlib
+import contextlib
 from pathlib import Path
-from PIL import Image
 import logging
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("tagging.log")
-    ]
-)
+from models.metrics import METRICS, timed
+from models.sources import open_image_source, file_info, find_archive_png_dirs, target_directory
+
+# Logging is configured once by the entry point (runserver.py)
 logger = logging.getLogger("tag_utils")
 
 def setup_cache_dir(cache_dir="data/cache"):
@@ -30,8 +27,50 @@ def get_cache_path(image_path, prefix="desc_", cache_dir="data/cache"):
     image_hash = hashlib.md5(str(image_path).encode()).hexdigest()
     return os.path.join(cache_dir, f"{prefix}{image_hash}.json")
 
-def save_to_cache(data, cache_path):
-    """Save data to cache file"""
+def _file_crc(path, chunk_size=1 << 20):
+    """CRC-32 of a file's content, formatted like the CRC of an archive member"""
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return f"{crc:08x}"
+
+def source_fingerprint(image_path):
+    """
+    Size, mtime and CRC-32 of a source image, stored with its cache entries
+
+    Members of a pack ZIP take the CRC-32 of the central directory.
+
+    Returns:
+        Dict with size, mtime_ns and crc, or None if the image does not exist
+    """
+    info = file_info(image_path)
+    if info is None:
+        return None
+    return {"size": info["size"], "mtime_ns": info["mtime_ns"], "crc": info["crc"] or _file_crc(image_path)}
+
+def _source_unchanged(source, image_path):
+    """False if the image's content differs from the fingerprint of a cache entry"""
+    info = file_info(image_path)
+    if info is None:
+        return True
+    if info["size"] != source.get("size"):
+        return False
+    if info["crc"] is not None:
+        return info["crc"] == source.get("crc")
+    # Same size and mtime: assume unchanged without reading the file
+    return info["mtime_ns"] == source.get("mtime_ns") or _file_crc(image_path) == source.get("crc")
+
+@timed("cache_put")
+def save_to_cache(data, cache_path, image_path=None):
+    """
+    Save data to cache file
+
+    With image_path, the source fingerprint is stored too so that the entry is
+    ignored once the image's content changes (see load_from_cache)
+    """
+    if image_path is not None:
+        data = dict(data, source=source_fingerprint(image_path))
     try:
         with open(cache_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
@@ -40,17 +79,34 @@ def save_to_cache(data, cache_path):
         logger.error(f"Error saving to cache: {e}")
         return False
 
-def load_from_cache(cache_path):
-    """Read data from cache file"""
-    if not os.path.exists(cache_path):
-        return None
-    
-    try:
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error reading from cache: {e}")
-        return None
+def load_from_cache(cache_path, image_path=None):
+    """
+    Read data from cache file
+
+    With image_path, an entry written for different content of that image is a
+    miss (cache keys are image paths, so an edited image keeps its key)
+    """
+    # Cache kind from the file prefix ("desc_", "tags_") for hit rates
+    kind = os.path.basename(cache_path).split('_', 1)[0]
+    with METRICS.timer("cache_get"):
+        if not os.path.exists(cache_path):
+            METRICS.cache_access(kind, False)
+            return None
+        
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Entries written before fingerprints were stored have no source and stay valid
+            if image_path is not None and data.get("source") and not _source_unchanged(data["source"], image_path):
+                logger.debug(f"Cache entry outdated, image changed: {image_path}")
+                METRICS.cache_access(kind, False)
+                return None
+            METRICS.cache_access(kind, True)
+            return data
+        except Exception as e:
+            logger.error(f"Error reading from cache: {e}")
+            METRICS.cache_access(kind, False)
+            return None
 
 def clean_filename(filename):
     """Create svg filename from png filename"""
@@ -73,19 +129,64 @@ def extract_title(filename):
 
 def load_image(image_path):
     """Read image file from path"""
+    from PIL import Image
+    
     try:
-        img = Image.open(image_path).convert('RGB')
+        img = Image.open(open_image_source(image_path)).convert('RGB')
         return img
     except Exception as e:
         logger.error(f"Error reading image {image_path}: {e}")
         return None
 
-def find_png_dirs(root_dir):
-    """Find all png directories in the directory structure"""
+@contextlib.contextmanager
+def log_load_time(name):
+    """Log how long loading a model took"""
+    start_time = time.time()
+    yield
+    logger.info(f"Loaded {name} in {time.time() - start_time:.1f}s")
+
+def check_cuda():
+    """Check whether CUDA is usable (imports torch, so only call when models are needed)"""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            logger.info(f"CUDA available - GPU: {torch.cuda.get_device_name(0)}")
+            return True
+        logger.warning("CUDA not available - using CPU")
+    except Exception as e:
+        logger.warning(f"Error checking CUDA: {e}")
+    return False
+
+def set_torch_threads(num_threads):
+    """Limit the torch intra-op threads of this process (no-op without torch, e.g. benchmark stub models)"""
+    try:
+        import torch
+    except ImportError:
+        logger.debug("torch not installed, thread count not applied")
+        return
+    torch.set_num_threads(int(num_threads))
+
+def find_png_dirs(root_dir, zip_sources="off"):
+    """
+    Find all png directories in the directory structure
+    
+    Args:
+        root_dir: Root directory (or a single pack ZIP)
+        zip_sources: Also read png directories inside pack ZIPs: "off", "auto" (packs not
+                     already extracted under root_dir) or "only" (ZIPs only, see models.sources)
+    
+    Returns:
+        Directory paths, and archive paths ("<pack>.zip!/<folder>/png") of png directories in ZIPs
+    """
     png_dirs = []
     
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        if os.path.basename(dirpath) == "png" and any(f.endswith('.png') for f in filenames):
-            png_dirs.append(dirpath)
+    if zip_sources != "only":
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            if os.path.basename(dirpath) == "png" and any(f.endswith('.png') for f in filenames):
+                png_dirs.append(dirpath)
+    
+    if zip_sources != "off":
+        extracted = {target_directory(png_dir) for png_dir in png_dirs}
+        png_dirs.extend(find_archive_png_dirs(root_dir, exclude_targets=extracted))
     
     return png_dirs 
\ No newline at end of file
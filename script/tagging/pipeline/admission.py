@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+
+logger = logging.getLogger("admission")
+
+# Queue for warm-up reports, set in each pool worker by init_memory_reporting
+_report_queue = None
+
+def init_memory_reporting(report_queue):
+    """ProcessPoolExecutor initializer: remember where to send warm-up reports"""
+    global _report_queue
+    _report_queue = report_queue
+
+def process_tree_memory(pid=None):
+    """
+    Memory owned by a process and its children (e.g. a supervised worker), in bytes
+
+    Uses the unique set size, so weights shared with the parent are not counted per worker.
+    """
+    import psutil
+
+    process = psutil.Process(pid or os.getpid())
+    total = process.memory_full_info().uss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_full_info().uss
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+def report_warm(task_id):
+    """Called in a worker once its models are loaded"""
+    if _report_queue is not None and task_id is not None:
+        _report_queue.put((task_id, process_tree_memory()))
+
+class MemoryAdmissionController:
+    """
+    Decide how many directory tasks may run at once given available memory
+
+    Workers are admitted one at a time: a new task is only started once every
+    admitted task has loaded its models (reported warm) and the measured
+    per-worker footprint still fits in available memory with a safety margin.
+    Admission pauses while system memory use is above the pressure threshold.
+    """
+
+    def __init__(self, max_workers, safety_margin=0.15, pressure_percent=90.0):
+        self.max_workers = max_workers
+        self.safety_margin = safety_margin
+        self.pressure_percent = pressure_percent
+        self.per_worker_bytes = None
+        self.warming = set()
+        self._paused = False
+
+    def on_warm(self, task_id, worker_bytes):
+        """Record the footprint of a worker that finished loading its models"""
+        self.warming.discard(task_id)
+        if self.per_worker_bytes is None or worker_bytes > self.per_worker_bytes:
+            self.per_worker_bytes = worker_bytes
+            logger.info(f"Per-worker memory after warm-up: {worker_bytes / 2**20:.0f} MB")
+
+    def on_admitted(self, task_id):
+        self.warming.add(task_id)
+
+    def on_finished(self, task_id):
+        # Tasks served from cache never load models, so never report warm
+        self.warming.discard(task_id)
+
+    def can_admit(self, running):
+        """Whether one more task may start now"""
+        if running == 0:
+            return True
+        if running >= self.max_workers or self.warming or self.per_worker_bytes is None:
+            return False
+
+        import psutil
+        memory = psutil.virtual_memory()
+        if memory.percent >= self.pressure_percent:
+            if not self._paused:
+                logger.warning(f"Memory pressure ({memory.percent:.0f}% used), pausing new workers at {running}")
+                self._paused = True
+            return False
+        if self._paused:
+            logger.info(f"Memory pressure relieved ({memory.percent:.0f}% used), resuming admissions")
+            self._paused = False
+
+        return memory.available * (1 - self.safety_margin) >= self.per_worker_bytes
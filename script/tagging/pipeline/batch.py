@@ -4,33 +4,177 @@
 import os
 import time
 import logging
+import queue
 import multiprocessing
-from pathlib import Path
+from collections import deque
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Changed from relative to absolute import
-from pipeline.processor import ImageProcessor
-from models.utils import find_png_dirs
+from pipeline.processor import load_cached_metadata
+from pipeline.supervisor import SupervisedProcessor
+from pipeline.admission import MemoryAdmissionController, init_memory_reporting, report_warm
+from pipeline.sharding import ShardCoordinator
+from pipeline.shared import fork_context, load_shared_processor, get_shared_processor, release_shared_processor
+from pipeline.tuner import profile_mismatches
+from models.utils import find_png_dirs, check_cuda
+from models.sources import list_pngs, target_directory
+from models.metrics import METRICS, enable_profiling
 
 logger = logging.getLogger("batch")
 
+def _init_pool_worker(report_queue, profile_options=None):
+    """Pool initializer: start from empty metrics, enable memory reporting and optionally profiling"""
+    METRICS.reset()
+    init_memory_reporting(report_queue)
+    if profile_options:
+        enable_profiling(profile_options, role="worker")
+
+class _DirectoryQueue:
+    """Work source of a local run (same interface as ShardCoordinator)"""
+    
+    def __init__(self, png_dirs):
+        self.pending = deque(png_dirs)
+    
+    def next_directory(self):
+        return self.pending.popleft() if self.pending else None
+    
+    def is_exhausted(self):
+        return not self.pending
+    
+    def complete(self, png_dir, metadata_list, failures=None, error=None):
+        pass
+    
+    def close(self):
+        pass
+
 class BatchProcessor:
     """Process batches of PNG directories"""
     
-    def __init__(self, use_gpu=True, batch_size=32, workers=None, cache_dir="data/cache"):
+    # Seconds between admission checks while directories are being processed
+    ADMISSION_POLL_INTERVAL = 2.0
+    
+    def __init__(self, use_gpu=True, batch_size=32, workers=None, cache_dir="data/cache", model_options=None,
+                 image_timeout=None, tuning_profile=None, memory_margin=0.15, memory_pressure_percent=90.0,
+                 share_weights=True, shard_options=None, profile_options=None, zip_sources="off",
+                 shared_memory_weights=False):
         self.use_gpu = use_gpu
         self.batch_size = batch_size
         self.cache_dir = cache_dir
         
+        # Per-image time budget in seconds (None/0 = no supervision, run models in-process)
+        self.image_timeout = image_timeout or None
+        
+        # Host profile from 'runserver.py tune' (workers, torch_threads), used on CPU when workers is auto
+        self.tuning_profile = tuning_profile
+        
+        # Memory admission control for parallel CPU workers
+        self.memory_margin = memory_margin
+        self.memory_pressure_percent = memory_pressure_percent
+        self._task_id = None
+        
+        # Parallel CPU workers fork after the parent loaded the models, sharing one copy of the weights
+        self.share_weights = share_weights
+        # Opt-in: also move the shared weights to /dev/shm
+        self.shared_memory_weights = shared_memory_weights
+        
+        # Sharded multi-host run: dict(shard_dir, host_id, lease_ttl, heartbeat) or None
+        self.shard_options = shard_options
+        
+        # Per-worker profiling from runserver.py --profile: dict(output_dir, mode, interval) or None
+        self.profile_options = profile_options
+        
+        # Read PNGs straight from pack ZIPs under the input directory: "off", "auto" or "only" (see models.sources)
+        self.zip_sources = zip_sources
+        
+        # Images that failed within their time budget, by target directory (filled by process_batch)
+        self.failures = {}
+        
+        # Extra keyword arguments for ImageProcessor (backend, onnx_dir, intra_op_threads, ...)
+        self.model_options = model_options or {}
+        
+        # Worker count and CUDA availability are resolved lazily in _resolve_execution,
+        # so that runs served entirely from cache never import torch
+        self.requested_workers = workers
+        self.workers = max(1, int(workers)) if workers is not None else None
+        self._execution_resolved = False
+        
+        logger.info(f"Initialized BatchProcessor: use_gpu={use_gpu}, batch_size={batch_size}, workers={workers or 'auto'}")
+    
+    def _resolve_execution(self):
+        """Probe CUDA and pick the number of workers, once models are actually needed"""
+        if self._execution_resolved:
+            return
+        self._execution_resolved = True
+        
+        self.use_gpu = self.use_gpu and check_cuda()
+        
         # Default number of workers is logical CPU count minus 1 (keep 1 core for system)
         # GPU uses only 1 worker since it can't parallelize GPU processing
-        if workers is None:
-            self.workers = 1 if use_gpu else max(1, multiprocessing.cpu_count() - 1)
+        if self.requested_workers is None:
+            if self.use_gpu:
+                self.workers = 1
+            elif self.tuning_profile and self._tuning_profile_applies():
+                self.workers = max(1, int(self.tuning_profile["workers"]))
+                self.model_options.setdefault("torch_threads", self.tuning_profile.get("torch_threads"))
+                logger.info(f"Applying tuning profile: {self.tuning_profile}")
+            else:
+                self.workers = max(1, multiprocessing.cpu_count() - 1)
+        
+        # Split the cores between workers instead of letting each use all of them
+        if not self.use_gpu:
+            if not self.model_options.get("torch_threads"):
+                self.model_options["torch_threads"] = max(1, multiprocessing.cpu_count() // self.workers)
+            if self.model_options.get("backend") == "onnx" and not self.model_options.get("intra_op_threads"):
+                self.model_options["intra_op_threads"] = self.model_options["torch_threads"]
+        
+        logger.info(f"Resolved execution: use_gpu={self.use_gpu}, workers={self.workers}, "
+                    f"torch_threads={self.model_options.get('torch_threads')}")
+    
+    def _tuning_profile_applies(self):
+        """Whether the profile was tuned for this run's backend, precision and core count"""
+        mismatches = profile_mismatches(
+            self.tuning_profile,
+            backend=self.model_options.get("backend", "torch"),
+            precision=self.model_options.get("precision", "fp32")
+        )
+        if mismatches:
+            logger.warning(f"Ignoring tuning profile tuned for other settings ({', '.join(mismatches)}), "
+                           f"run 'runserver.py tune' again")
+        return not mismatches
+    
+    def _create_processor(self):
+        """Load the models for this process (in a supervised child process if a time budget is set)"""
+        self._resolve_execution()
+        processor_kwargs = dict(use_gpu=self.use_gpu, cache_dir=self.cache_dir, **self.model_options)
+        if self.image_timeout:
+            processor = SupervisedProcessor(processor_kwargs, time_budget=self.image_timeout,
+                                            profile_options=self.profile_options)
+            processor.start()
         else:
-            self.workers = max(1, int(workers))
+            processor = get_shared_processor(self.model_options.get("torch_threads"))
+            if processor is None:
+                from pipeline.processor import ImageProcessor
+                processor = ImageProcessor(**processor_kwargs)
         
-        logger.info(f"Initialized BatchProcessor: use_gpu={use_gpu}, batch_size={batch_size}, workers={self.workers}")
+        # Let the parent measure this worker's footprint for admission control
+        report_warm(self._task_id)
+        return processor
+    
+    def _load_cached_directory(self, png_dir):
+        """
+        Build results for a directory entirely from cache
+        
+        Returns:
+            List of metadata, or None if any image is not cached
+        """
+        results = []
+        for png_file in list_pngs(png_dir):
+            metadata = load_cached_metadata(str(png_file), self.cache_dir)
+            if metadata is None:
+                return None
+            results.append(metadata)
+        return results
     
     def process_directory(self, png_dir):
         """
@@ -42,27 +186,64 @@ class BatchProcessor:
         Returns:
             List of processed metadata
         """
-        # Find all PNG files in the directory
-        png_files = sorted([f for f in Path(png_dir).glob("*.png")])
-        
-        if not png_files:
-            logger.warning(f"No PNG files found in {png_dir}")
-            return []
-        
-        logger.info(f"Found {len(png_files)} PNG files in {png_dir}")
-        
-        # Initialize processor
-        processor = ImageProcessor(use_gpu=self.use_gpu, cache_dir=self.cache_dir)
+        results, _ = self._process_directory(png_dir)
+        return results
+    
+    def _process_directory(self, png_dir, task_id=None):
+        """
+        Process all PNG images in a directory
         
-        results = []
+        Args:
+            png_dir: Path to directory containing PNG files
+            task_id: Id used to report warm-up to the admission controller (parallel mode)
         
-        # Process each image
-        for png_file in tqdm(png_files, desc=f"Processing {os.path.basename(png_dir)}"):
-            metadata = processor.process_image(str(png_file), use_cache=True)
-            if metadata:
-                results.append(metadata)
+        Returns:
+            Tuple (list of processed metadata, list of images that failed their time budget)
+        """
+        self._task_id = task_id
         
-        return results
+        with METRICS.timer("directory"):
+            # Find all PNG files in the directory
+            png_files = list_pngs(png_dir)
+            
+            if not png_files:
+                logger.warning(f"No PNG files found in {png_dir}")
+                return [], []
+            
+            start_time = time.time()
+            
+            # Models are only loaded on the first cache miss
+            processor = None
+            
+            results = []
+            cached = 0
+            
+            # Process each image (per-image records are DEBUG, the directory gets one INFO summary)
+            try:
+                for png_file in tqdm(png_files, desc=f"Processing {os.path.basename(png_dir)}"):
+                    metadata = load_cached_metadata(str(png_file), self.cache_dir)
+                    if metadata is None:
+                        if processor is None:
+                            processor = self._create_processor()
+                        metadata = processor.process_image(str(png_file), use_cache=True)
+                    else:
+                        cached += 1
+                    if metadata:
+                        results.append(metadata)
+            finally:
+                if isinstance(processor, SupervisedProcessor):
+                    processor.close()
+            
+            failures = processor.failures if isinstance(processor, SupervisedProcessor) else []
+            logger.info(f"Directory {self._get_target_directory(png_dir)}: {len(results)}/{len(png_files)} images "
+                        f"({cached} from cache, {len(png_files) - len(results)} failed, "
+                        f"{len(failures)} over time budget) in {time.time() - start_time:.1f}s")
+            return results, failures
+    
+    def _run_directory_task(self, png_dir, task_id):
+        """Pool task: process a directory and hand this worker's metrics back to the parent"""
+        metadata_list, failures = self._process_directory(png_dir, task_id)
+        return metadata_list, failures, METRICS.drain()
     
     def process_batch(self, input_dir):
         """
@@ -75,7 +256,7 @@ class BatchProcessor:
             Dict with target directory as key and metadata list as value
         """
         # Find all PNG directories
-        png_dirs = find_png_dirs(input_dir)
+        png_dirs = find_png_dirs(input_dir, zip_sources=self.zip_sources)
         
         if not png_dirs:
             logger.error(f"No PNG directories found in {input_dir}")
@@ -86,41 +267,168 @@ class BatchProcessor:
         # Store results
         results = {}
         
-        # If processing with only 1 worker (GPU/single-threaded CPU)
-        if self.workers == 1:
-            for png_dir in png_dirs:
-                # Process this directory
-                target_dir = self._get_target_directory(png_dir)
-                logger.info(f"Processing directory: {target_dir}")
-                
-                # Process and save results
-                metadata_list = self.process_directory(png_dir)
-                results[target_dir] = metadata_list
+        # Directories fully served from cache need neither models nor workers.
+        # Sharded runs skip this: every directory must be claimed so that exactly one host reports it
+        pending_dirs = []
+        for png_dir in png_dirs:
+            cached = None if self.shard_options else self._load_cached_directory(png_dir)
+            if cached is None:
+                pending_dirs.append(png_dir)
+            else:
+                results[self._get_target_directory(png_dir)] = cached
+        
+        logger.info(f"{len(png_dirs) - len(pending_dirs)} directories served from cache, {len(pending_dirs)} to process")
+        if not pending_dirs:
+            return results
+        
+        png_dirs = pending_dirs
+        self._resolve_execution()
+        
+        if self.shard_options:
+            source = ShardCoordinator(
+                self.shard_options["shard_dir"],
+                png_dirs,
+                self._get_target_directory,
+                host_id=self.shard_options.get("host_id"),
+                ttl=self.shard_options.get("lease_ttl", 300),
+                heartbeat=self.shard_options.get("heartbeat", 60)
+            )
+            logger.info(f"Sharded run as host {source.host_id} in {source.shard_dir}")
         else:
-            # Parallel processing on multiple CPUs
-            with ProcessPoolExecutor(max_workers=self.workers) as executor:
-                # Create mapping from future -> dir to track
-                future_to_dir = {
-                    executor.submit(self.process_directory, png_dir): self._get_target_directory(png_dir)
-                    for png_dir in png_dirs
-                }
-                
-                # Track progress
-                for future in tqdm(as_completed(future_to_dir), total=len(png_dirs), desc="Processing directories"):
-                    target_dir = future_to_dir[future]
-                    try:
-                        metadata_list = future.result()
-                        results[target_dir] = metadata_list
-                    except Exception as e:
-                        logger.error(f"Error processing directory {target_dir}: {e}")
+            source = _DirectoryQueue(png_dirs)
+        
+        try:
+            # If processing with only 1 worker (GPU/single-threaded CPU)
+            if self.workers == 1:
+                self._process_serial(source, results)
+            else:
+                # Parallel processing on multiple CPUs, admitting workers as memory allows
+                self._process_parallel(source, len(png_dirs), results)
+        finally:
+            source.close()
         
         return results
     
+    def _wait_for_other_hosts(self, source):
+        """Whether to keep polling a sharded run whose remaining directories are held by other hosts"""
+        if source.is_exhausted():
+            return False
+        # Everything left is leased elsewhere: wait for it to finish or for a lease to go stale
+        time.sleep(self.ADMISSION_POLL_INTERVAL)
+        return True
+    
+    def _record_result(self, source, png_dir, metadata_list, failures, results):
+        """Store the result of a directory locally and in the work source"""
+        METRICS.count("directories_processed")
+        target_dir = self._get_target_directory(png_dir)
+        results[target_dir] = metadata_list
+        if failures:
+            self.failures[target_dir] = failures
+        source.complete(png_dir, metadata_list, failures)
+    
+    def _process_serial(self, source, results):
+        """Process directories one after the other in this process"""
+        while True:
+            png_dir = source.next_directory()
+            if png_dir is None:
+                if self._wait_for_other_hosts(source):
+                    continue
+                break
+            
+            # Process this directory
+            logger.info(f"Processing directory: {self._get_target_directory(png_dir)}")
+            
+            # Process and save results (a failing directory does not stop the others)
+            try:
+                metadata_list, failures = self._process_directory(png_dir)
+            except Exception as e:
+                logger.error(f"Error processing directory {self._get_target_directory(png_dir)}: {e}")
+                source.complete(png_dir, [], error=str(e))
+                continue
+            self._record_result(source, png_dir, metadata_list, failures, results)
+    
+    def _process_parallel(self, source, total, results):
+        """
+        Process directories in a process pool with memory-aware admission control
+        
+        Args:
+            source: Work source handing out directories (_DirectoryQueue or ShardCoordinator)
+            total: Number of directories, for the progress bar
+            results: Dict to fill with target directory -> metadata list
+        """
+        controller = MemoryAdmissionController(
+            self.workers,
+            safety_margin=self.memory_margin,
+            pressure_percent=self.memory_pressure_percent
+        )
+        running = {}
+        task_id = 0
+        
+        # Load the models before the pool forks its workers so they all map the same weights
+        mp_context = None
+        if self._can_share_weights():
+            processor_kwargs = dict(use_gpu=False, cache_dir=self.cache_dir, **self.model_options)
+            if load_shared_processor(processor_kwargs, shared_memory=self.shared_memory_weights) is not None:
+                mp_context = fork_context()
+        report_queue = (mp_context or multiprocessing).Queue()
+        
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context,
+                                     initializer=_init_pool_worker,
+                                     initargs=(report_queue, self.profile_options)) as executor:
+                with tqdm(total=total, desc="Processing directories") as progress:
+                    while True:
+                        # Collect warm-up reports from workers
+                        while True:
+                            try:
+                                controller.on_warm(*report_queue.get_nowait())
+                            except queue.Empty:
+                                break
+                        
+                        # Admit new directories while memory allows
+                        while controller.can_admit(len(running)):
+                            png_dir = source.next_directory()
+                            if png_dir is None:
+                                break
+                            task_id += 1
+                            future = executor.submit(self._run_directory_task, png_dir, task_id)
+                            running[future] = (task_id, png_dir)
+                            controller.on_admitted(task_id)
+                        
+                        if not running:
+                            if self._wait_for_other_hosts(source):
+                                continue
+                            break
+                        
+                        done, _ = wait(running, timeout=self.ADMISSION_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            task_id_done, png_dir = running.pop(future)
+                            controller.on_finished(task_id_done)
+                            progress.update(1)
+                            try:
+                                metadata_list, failures, metrics = future.result()
+                                METRICS.merge(metrics)
+                            except Exception as e:
+                                logger.error(f"Error processing directory {self._get_target_directory(png_dir)}: {e}")
+                                source.complete(png_dir, [], error=str(e))
+                                continue
+                            self._record_result(source, png_dir, metadata_list, failures, results)
+        finally:
+            release_shared_processor()
+    
+    def _can_share_weights(self):
+        """Whether parallel workers can inherit the parent's models (torch on CPU, fork available)"""
+        return (
+            self.share_weights
+            and not self.use_gpu
+            and self.model_options.get("backend", "torch") == "torch"
+            and fork_context() is not None
+        )
+    
     def _get_target_directory(self, png_dir):
         """
         Get target directory name from PNG path
         Example: input/110790-speeches/png -> 110790-speeches
+                 input/110790-speeches.zip!/110790-speeches/png -> 110790-speeches
         """
-        # Get parent directory of PNG directory
-        parent_dir = Path(png_dir).parent
-        return os.path.basename(parent_dir) 
\ No newline at end of file
+        return target_directory(png_dir) 
\ No newline at end of file
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+
+from pipeline.materialize import file_digest
+
+logger = logging.getLogger("catalog")
+
+FORMATS = ("parquet", "jsonl")
+
+def catalog_format(path):
+    """Format implied by the catalog file extension"""
+    return "parquet" if str(path).lower().endswith((".parquet", ".pq")) else "jsonl"
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("theme", pa.string()),
+        ("filename", pa.string()),
+        ("title", pa.string()),
+        ("keywords", pa.list_(pa.string())),
+        ("description", pa.string()),
+        ("content_hash", pa.string()),
+        ("embedding", pa.list_(pa.float32()))
+    ])
+
+class CatalogWriter:
+    """
+    Run-level catalog of every exported image, appended one theme at a time
+
+    Parquet gets one row group per theme (readable with column pruning once the
+    writer is closed); JSONL gets one line per image, flushed after each theme so
+    the file is usable while the run is still going.
+    """
+
+    def __init__(self, path, fmt=None):
+        """
+        Args:
+            path: Catalog file (.parquet or .jsonl)
+            fmt: "parquet" or "jsonl" (default: from the extension)
+        """
+        self.path = Path(path)
+        self.format = fmt or catalog_format(path)
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown catalog format: {self.format} (expected one of {', '.join(FORMATS)})")
+        self.rows_written = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.format == "parquet":
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet catalog requires pyarrow (pip install pyarrow), or use a .jsonl catalog")
+            # The footer is only written on close: keep the partial file aside until then
+            self._tmp_path = self.path.with_name(self.path.name + ".partial")
+            self._writer = pq.ParquetWriter(str(self._tmp_path), _parquet_schema(), compression="zstd")
+        else:
+            self._tmp_path = None
+            self._writer = open(self.path, "w", encoding="utf-8")
+
+        logger.info(f"Writing {self.format} catalog: {self.path}")
+
+    def add_directory(self, theme, metadata_list, svg_dir=None):
+        """
+        Append the images of one theme
+
+        Args:
+            theme: Theme directory name (e.g. "110790-speeches")
+            metadata_list: Metadata rows of the theme (an optional "embedding" key holds the CLIP embedding)
+            svg_dir: Directory of the theme's SVG files, hashed into content_hash when present
+        """
+        rows = []
+        for metadata in metadata_list:
+            svg_path = os.path.join(svg_dir, metadata["filename"]) if svg_dir else None
+            keywords = metadata.get("keywords") or ""
+            rows.append({
+                "theme": theme,
+                "filename": metadata["filename"],
+                "title": metadata.get("title"),
+                "keywords": [k for k in keywords.split(",") if k] if isinstance(keywords, str) else list(keywords),
+                "description": metadata.get("description"),
+                "content_hash": file_digest(svg_path) if svg_path and os.path.isfile(svg_path) else None,
+                "embedding": metadata.get("embedding")
+            })
+        if not rows:
+            return
+
+        with self._lock:
+            if self.format == "parquet":
+                import pyarrow as pa
+                self._writer.write_table(pa.Table.from_pylist(rows, schema=_parquet_schema()))
+            else:
+                for row in rows:
+                    self._writer.write(json.dumps(row, ensure_ascii=False) + "\n")
+                self._writer.flush()
+            self.rows_written += len(rows)
+
+    def close(self):
+        """Finish the file (Parquet footer) and move it into place"""
+        with self._lock:
+            if self._writer is None:
+                return
+            self._writer.close()
+            self._writer = None
+            if self._tmp_path is not None:
+                os.replace(self._tmp_path, self.path)
+        logger.info(f"Catalog written: {self.path} ({self.rows_written} images)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,23 +2,122 @@
 # -*- coding: utf-8 -*-
 
 import os
-import shutil
+import csv
+import json
 import logging
-import pandas as pd
+import filecmp
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from models.metrics import METRICS
+from models.sources import theme_location, join, file_info, is_archive_path, archive_members
+from pipeline.materialize import TreeMaterializer, file_digest
 
 logger = logging.getLogger("export")
 
+# Columns of metadata.csv, in order
+METADATA_COLUMNS = ["filename", "title", "keywords", "Artist", "description"]
+
+# rewrite: metadata.csv always holds the rows just generated
+# update: rows whose source image is unchanged since the last export are kept as they are in the existing file
+CSV_MODES = ("rewrite", "update")
+
+# Per-theme source hashes of the last export, under the output base directory (outside the theme folders)
+STATE_DIR = ".export_state"
+
+def _csv_value(value):
+    """Cell text as pandas writes it (None/NaN as an empty field)"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return value
+
+def write_metadata_csv(csv_path, metadata_list):
+    """
+    Stream metadata rows to a CSV file
+    
+    The dialect is the one DataFrame.to_csv(index=False, quoting=1, quotechar='"',
+    escapechar='\\') passes to the csv module, so the bytes are identical to the
+    former pandas export, without building a DataFrame.
+    
+    Args:
+        csv_path: Output path
+        metadata_list: Iterable of metadata dicts (extra keys are ignored)
+        
+    Returns:
+        Number of rows written
+    """
+    count = 0
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator=os.linesep, delimiter=',', quoting=csv.QUOTE_ALL,
+                            quotechar='"', escapechar='\\', doublequote=True)
+        writer.writerow(METADATA_COLUMNS)
+        for metadata in metadata_list:
+            writer.writerow([_csv_value(metadata.get(column)) for column in METADATA_COLUMNS])
+            count += 1
+    return count
+
+def read_metadata_csv(csv_path):
+    """
+    Read a metadata.csv written by write_metadata_csv
+    
+    Args:
+        csv_path: CSV path
+        
+    Returns:
+        List of row dicts keyed by METADATA_COLUMNS, or None if the file is missing or has other columns
+    """
+    try:
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter=',', quotechar='"', escapechar='\\', doublequote=True)
+            header = next(reader, None)
+            if header != METADATA_COLUMNS:
+                return None
+            return [dict(zip(METADATA_COLUMNS, row)) for row in reader]
+    except FileNotFoundError:
+        return None
+
+def replace_if_changed(tmp_path, path):
+    """
+    Move tmp_path over path unless both already hold the same bytes
+    
+    Keeping an identical file in place preserves its mtime, so sync tools
+    watching the output do not upload it again.
+    
+    Returns:
+        True if path was replaced
+    """
+    if os.path.isfile(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.unlink(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
 class MetadataExporter:
     """Export metadata to CSV and manage output directories"""
     
-    def __init__(self, output_base_dir="E:/WORK/canva/output"):
+    def __init__(self, output_base_dir="E:/WORK/canva/output", asset_mode="auto", workers=8, catalog=None,
+                 csv_mode="rewrite"):
         self.output_base_dir = Path(output_base_dir)
         
+        # rewrite: regenerate every row; update: keep rows whose source image did not change
+        if csv_mode not in CSV_MODES:
+            raise ValueError(f"Unknown csv mode: {csv_mode} (expected one of {', '.join(CSV_MODES)})")
+        self.csv_mode = csv_mode
+        
+        # Optional run-level catalog (pipeline.catalog.CatalogWriter), appended as each directory is exported
+        self.catalog = catalog
+        
+        # Directories exported concurrently by export_batch_results (I/O bound, so threads)
+        self.workers = max(1, int(workers))
+        
+        # How asset folders are materialized: auto (reflink, else hardlink, else copy), reflink, hardlink, copy
+        self.materializer = TreeMaterializer(asset_mode)
+        
         # Create base output directory if it doesn't exist
         os.makedirs(output_base_dir, exist_ok=True)
         
-        logger.info(f"MetadataExporter initialized with output_dir: {output_base_dir}")
+        logger.info(f"MetadataExporter initialized with output_dir: {output_base_dir}, asset_mode: {asset_mode}, "
+                    f"csv_mode: {csv_mode}")
     
     def export_metadata(self, target_dir, metadata_list, input_root_dir):
         """
@@ -27,7 +126,7 @@ class MetadataExporter:
         Args:
             target_dir: Target directory name (e.g., "110790-speeches")
             metadata_list: List of metadata for images
-            input_root_dir: Input root directory to locate svg directory
+            input_root_dir: Input root directory to locate svg directory (extracted packs or pack ZIPs)
             
         Returns:
             Bool indicating success
@@ -44,25 +143,36 @@ class MetadataExporter:
         csv_path = output_dir / "metadata.csv"
         
         try:
-            # Create DataFrame from metadata
-            df = pd.DataFrame(metadata_list)
-            
-            # Ensure columns are in required order
-            column_order = ["filename", "title", "keywords", "Artist", "description"]
-            df = df[column_order]
+            # Extracted theme directory, or the theme's folder inside a pack ZIP
+            theme = theme_location(input_root_dir, target_dir)
             
-            # Write to CSV with proper quoting
-            df.to_csv(csv_path, 
-                     index=False,
-                     encoding='utf-8',
-                     quoting=1,  # Quote all non-numeric fields
-                     quotechar='"',
-                     escapechar='\\')
+            with METRICS.timer("csv_write"):
+                previous = self._load_state(target_dir)
+                state = self._source_state(theme, metadata_list, previous)
+                rows = metadata_list
+                if self.csv_mode == "update":
+                    rows = self._merge_rows(target_dir, csv_path, metadata_list, previous, state)
+                
+                # Write next to the target and rename, so readers never see a partial file
+                tmp_path = output_dir / f".metadata.csv.tmp-{os.getpid()}"
+                try:
+                    write_metadata_csv(tmp_path, rows)
+                    written = replace_if_changed(tmp_path, csv_path)
+                finally:
+                    if tmp_path.exists():
+                        tmp_path.unlink()
+                self._save_state(target_dir, state)
             
-            logger.info(f"Metadata exported successfully: {csv_path}")
+            METRICS.count("csv_written" if written else "csv_unchanged")
+            logger.debug(f"Metadata {'exported' if written else 'unchanged'}: {csv_path}")
             
             # Copy SVG and PNG directories if needed
-            self._copy_asset_folders(target_dir, input_root_dir)
+            self._copy_asset_folders(target_dir, theme)
+            
+            # Catalog hashes come from the synced output copy, which exists for archive sources too
+            if self.catalog is not None:
+                with METRICS.timer("catalog_write"):
+                    self.catalog.add_directory(target_dir, rows, output_dir / "svg")
             
             return True
             
@@ -70,6 +180,89 @@ class MetadataExporter:
             logger.error(f"Error exporting metadata for {target_dir}: {e}")
             return False
     
+    def _state_path(self, target_dir):
+        return self.output_base_dir / STATE_DIR / f"{target_dir}.json"
+    
+    def _load_state(self, target_dir):
+        """Source hashes recorded by the last export of target_dir ({} if none)"""
+        try:
+            with open(self._state_path(target_dir), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def _source_state(self, theme, metadata_list, previous):
+        """
+        Content hash of the source image of every row
+        
+        The source is the png the row was generated from (the svg when there is
+        no png). Hashes of the last export are reused while size and mtime match;
+        members of a pack ZIP use the CRC-32 from its central directory.
+        
+        Args:
+            theme: Theme directory or archive path (see models.sources.theme_location)
+        
+        Returns:
+            Dict of filename -> {"size", "mtime_ns", "hash"}
+        """
+        state = {}
+        for metadata in metadata_list:
+            filename = metadata["filename"]
+            source = join(theme, "png", os.path.splitext(filename)[0] + ".png")
+            info = file_info(source)
+            if info is None:
+                source = join(theme, "svg", filename)
+                info = file_info(source)
+            if info is None:
+                continue
+            if info["crc"] is not None:
+                entry = {"size": info["size"], "mtime_ns": info["mtime_ns"], "hash": f"crc32:{info['crc']}"}
+            else:
+                entry = previous.get(filename)
+                if not (entry and entry["size"] == info["size"] and entry["mtime_ns"] == info["mtime_ns"]):
+                    entry = {"size": info["size"], "mtime_ns": info["mtime_ns"], "hash": file_digest(source)}
+            state[filename] = entry
+        return state
+    
+    def _merge_rows(self, target_dir, csv_path, metadata_list, previous, state):
+        """
+        Rows of the updated metadata.csv: existing rows of unchanged sources, new rows for the rest
+        
+        Files that are no longer in metadata_list are dropped.
+        """
+        existing = read_metadata_csv(csv_path)
+        if existing is None:
+            return metadata_list
+        existing = {row["filename"]: row for row in existing}
+        
+        rows = []
+        kept = 0
+        for metadata in metadata_list:
+            filename = metadata["filename"]
+            old_row = existing.pop(filename, None)
+            old_hash = previous.get(filename, {}).get("hash")
+            if old_row is not None and old_hash is not None and old_hash == state.get(filename, {}).get("hash"):
+                rows.append(old_row)
+                kept += 1
+            else:
+                rows.append(metadata)
+        
+        changed = len(rows) - kept
+        METRICS.count("csv_rows_kept", kept)
+        METRICS.count("csv_rows_changed", changed)
+        METRICS.count("csv_rows_removed", len(existing))
+        logger.debug(f"{target_dir}: {kept} rows kept, {changed} added/changed, {len(existing)} removed")
+        return rows
+    
+    def _save_state(self, target_dir, state):
+        """Record the source hashes of this export (atomically, skipped when nothing changed)"""
+        state_path = self._state_path(target_dir)
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = state_path.with_name(f"{state_path.name}.tmp-{os.getpid()}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, sort_keys=True)
+        replace_if_changed(tmp_path, state_path)
+    
     def export_batch_results(self, batch_results, input_root_dir):
         """
         Export batch results
@@ -81,26 +274,70 @@ class MetadataExporter:
         Returns:
             Number of successfully processed directories
         """
-        success_count = 0
-        
-        for target_dir, metadata_list in batch_results.items():
-            if self.export_metadata(target_dir, metadata_list, input_root_dir):
-                success_count += 1
+        if self.workers == 1 or len(batch_results) < 2:
+            success_count = sum(
+                self.export_metadata(target_dir, metadata_list, input_root_dir)
+                for target_dir, metadata_list in batch_results.items()
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export") as executor:
+                success_count = sum(executor.map(
+                    lambda item: self.export_metadata(item[0], item[1], input_root_dir),
+                    batch_results.items()
+                ))
         
         logger.info(f"Successfully exported {success_count}/{len(batch_results)} directories")
         return success_count
     
-    def _copy_asset_folders(self, target_dir, input_root_dir):
+    def export_failure_report(self, failures, filename="failed_images.json"):
         """
-        Copy svg and png directories if needed
+        Write the sidecar report of images that could not be processed
         
         Args:
-            target_dir: Target directory name
-            input_root_dir: Input root directory
+            failures: Dict with directory name as key and list of failure records as value
+            filename: Report file name inside the output base directory
+            
+        Returns:
+            Path to the report
         """
-        # Theme directory in input
-        input_theme_dir = Path(input_root_dir) / target_dir
+        report_path = self.output_base_dir / filename
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(failures, f, ensure_ascii=False, indent=2)
         
+        total = sum(len(items) for items in failures.values())
+        logger.warning(f"{total} images failed and were skipped, see {report_path}")
+        return report_path
+    
+    def export_run_report(self, report, filename="run_report.json"):
+        """
+        Write the machine-readable run report (stage timings, counters, cache hit rates)
+        
+        Args:
+            report: Report dict, see models.metrics.Metrics.report
+            filename: Report file name inside the output base directory
+            
+        Returns:
+            Path to the report
+        """
+        report_path = self.output_base_dir / filename
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        
+        logger.info(f"Run report written: {report_path}")
+        return report_path
+    
+    def _copy_asset_folders(self, target_dir, theme):
+        """
+        Sync svg and png directories if needed
+        
+        Files are linked (reflink/hardlink) or copied only when they changed since
+        the last export, and files removed from the input are removed from the output.
+        A theme read from a pack ZIP has its members extracted instead.
+        
+        Args:
+            target_dir: Target directory name
+            theme: Theme directory or archive path in input (see models.sources.theme_location)
+        """
         # Destination
         output_theme_dir = self.output_base_dir / target_dir
         
@@ -108,15 +345,23 @@ class MetadataExporter:
         asset_folders = ["svg"]  # Only copy svg, png not needed as we have metadata
         
         for folder in asset_folders:
-            src_dir = input_theme_dir / folder
+            src_dir = join(theme, folder)
             dst_dir = output_theme_dir / folder
             
-            if src_dir.exists() and src_dir.is_dir():
-                if dst_dir.exists():
-                    logger.info(f"Removing old destination directory: {dst_dir}")
-                    shutil.rmtree(dst_dir)
-                
-                logger.info(f"Copying {folder} directory from {src_dir} to {dst_dir}")
-                shutil.copytree(src_dir, dst_dir)
+            if is_archive_path(src_dir):
+                zip_ref, members = archive_members(src_dir)
+                if not members:
+                    logger.warning(f"Source directory not found: {src_dir}")
+                    continue
+                with METRICS.timer("svg_copy"):
+                    stats = self.materializer.sync_archive(zip_ref, members, dst_dir)
+            elif os.path.isdir(src_dir):
+                with METRICS.timer("svg_copy"):
+                    stats = self.materializer.sync_tree(src_dir, dst_dir)
             else:
-                logger.warning(f"Source directory not found: {src_dir}") 
\ No newline at end of file
+                logger.warning(f"Source directory not found: {src_dir}")
+                continue
+            for key, value in stats.items():
+                if value:
+                    METRICS.count(f"assets_{key}", value)
+            logger.debug(f"Synced {folder} directory {src_dir} -> {dst_dir}: {stats}")
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import errno
+import shutil
+import time
+import zlib
+import hashlib
+import logging
+
+logger = logging.getLogger("materialize")
+
+# auto: reflink (copy-on-write), else hardlink, else copy
+MODES = ("auto", "reflink", "hardlink", "copy")
+
+# Linux ioctl cloning a whole file (btrfs, XFS with reflink=1, bcachefs, overlayfs on those)
+FICLONE = 0x40049409
+
+# Errors meaning "this filesystem/pair of directories can't do that", as opposed to real I/O errors
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EMLINK,
+                errno.ENOSYS, errno.EACCES}
+
+def _reflink(src, dst):
+    """Clone src into a new file dst sharing its extents"""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflink needs fcntl")
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    shutil.copystat(src, dst)
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+def _copy(src, dst):
+    shutil.copy2(src, dst)
+
+_METHODS = {"reflink": _reflink, "hardlink": _hardlink, "copy": _copy}
+
+def file_crc32(path, chunk_size=1 << 20):
+    """CRC-32 of a file's content, as stored in ZIP central directories"""
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def file_digest(path, chunk_size=1 << 20):
+    """blake2b of a file's content"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TreeMaterializer:
+    """
+    Mirror directory trees with links instead of copies, rewriting only changed files
+
+    A destination file is left alone when it is the same inode as the source, or
+    has the same size and mtime; when only the mtime differs, the contents are
+    hashed and an identical file just gets its mtime updated. Methods the
+    filesystem refuses (cross-device hardlink, no reflink support) are
+    remembered per (source device, destination device) and skipped afterwards.
+    """
+
+    def __init__(self, mode="auto"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown asset mode: {mode} (expected one of {', '.join(MODES)})")
+        self.mode = mode
+        self._unsupported = set()
+
+    def _methods(self):
+        if self.mode == "auto":
+            return ["reflink", "hardlink", "copy"]
+        return [self.mode, "copy"] if self.mode != "copy" else ["copy"]
+
+    def _is_unchanged(self, src, dst, src_stat):
+        try:
+            dst_stat = os.stat(dst)
+        except FileNotFoundError:
+            return False
+        if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+            return True
+        if src_stat.st_size != dst_stat.st_size:
+            return False
+        if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+            return True
+        if file_digest(src) == file_digest(dst):
+            # Same content: align the mtime so the next sync takes the fast path
+            os.utime(dst, ns=(dst_stat.st_atime_ns, src_stat.st_mtime_ns))
+            return True
+        return False
+
+    def materialize_file(self, src, dst, src_stat=None):
+        """
+        Create or replace dst with the contents of src (atomically, through a temporary name)
+
+        Returns:
+            Method used: "reflink", "hardlink" or "copy"
+        """
+        src_stat = src_stat or os.stat(src)
+        devices = (src_stat.st_dev, os.stat(os.path.dirname(dst)).st_dev)
+        tmp_path = f"{dst}.tmp-{os.getpid()}"
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+        for method in self._methods():
+            if (method, devices) in self._unsupported:
+                continue
+            try:
+                _METHODS[method](src, tmp_path)
+            except OSError as e:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                if method == "copy" or e.errno not in _UNSUPPORTED:
+                    raise
+                logger.debug("%s not available for %s -> %s: %s", method, src, dst, e)
+                self._unsupported.add((method, devices))
+                continue
+            os.replace(tmp_path, dst)
+            return method
+        raise OSError(f"Could not materialize {src}")
+
+    def sync_tree(self, src_dir, dst_dir):
+        """
+        Make dst_dir an exact mirror of src_dir
+
+        Args:
+            src_dir: Source directory
+            dst_dir: Destination directory (created if needed)
+
+        Returns:
+            Dict of counts: reflink, hardlink, copy (files written), unchanged, removed
+        """
+        stats = {"reflink": 0, "hardlink": 0, "copy": 0, "unchanged": 0, "removed": 0}
+        src_dir, dst_dir = os.fspath(src_dir), os.fspath(dst_dir)
+
+        for root, dirs, files in os.walk(src_dir):
+            relative = os.path.relpath(root, src_dir)
+            target_root = dst_dir if relative == "." else os.path.join(dst_dir, relative)
+
+            # A file in the way of a directory (or the reverse) is replaced below
+            if os.path.isfile(target_root) or os.path.islink(target_root):
+                os.unlink(target_root)
+            os.makedirs(target_root, exist_ok=True)
+
+            for name in files:
+                src = os.path.join(root, name)
+                dst = os.path.join(target_root, name)
+                src_stat = os.stat(src)
+                if os.path.isdir(dst) and not os.path.islink(dst):
+                    shutil.rmtree(dst)
+                elif self._is_unchanged(src, dst, src_stat):
+                    stats["unchanged"] += 1
+                    continue
+                stats[self.materialize_file(src, dst, src_stat)] += 1
+
+            # Remove what no longer exists in the source
+            wanted = set(dirs) | set(files)
+            for name in os.listdir(target_root):
+                if name in wanted:
+                    continue
+                path = os.path.join(target_root, name)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    stats["removed"] += sum(len(f) for _, _, f in os.walk(path))
+                    shutil.rmtree(path)
+                else:
+                    stats["removed"] += 1
+                    os.unlink(path)
+
+        return stats
+
+    def _extract_member(self, zip_ref, info, dst, mtime_ns):
+        """Write an archive member to dst (atomically, through a temporary name) with the member's date"""
+        tmp_path = f"{dst}.tmp-{os.getpid()}"
+        try:
+            with zip_ref.open(info) as src_file, open(tmp_path, "wb") as dst_file:
+                shutil.copyfileobj(src_file, dst_file, 1 << 20)
+            os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+            os.replace(tmp_path, dst)
+        finally:
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)
+
+    def sync_archive(self, zip_ref, members, dst_dir):
+        """
+        Make dst_dir an exact mirror of files inside an archive
+
+        Members are decompressed only when the destination file is missing or
+        changed: same size and an mtime equal to the member date means
+        unchanged; otherwise the file's CRC-32 is compared with the one in the
+        central directory, and an identical file just gets its mtime updated.
+
+        Args:
+            zip_ref: Open zipfile.ZipFile
+            members: List of (name relative to dst_dir, ZipInfo), files only
+            dst_dir: Destination directory (created if needed)
+
+        Returns:
+            Dict of counts: extract (files written), unchanged, removed
+        """
+        stats = {"extract": 0, "unchanged": 0, "removed": 0}
+        dst_dir = os.fspath(dst_dir)
+        wanted = {dst_dir}
+
+        for name, info in members:
+            parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+            if not parts:
+                continue
+            dst = os.path.join(dst_dir, *parts)
+            parent = os.path.dirname(dst)
+            while parent not in wanted:
+                wanted.add(parent)
+                parent = os.path.dirname(parent)
+            wanted.add(dst)
+
+            # A file in the way of a directory (or the reverse) is replaced
+            for ancestor in [os.path.join(dst_dir, *parts[:i]) for i in range(1, len(parts))]:
+                if os.path.isfile(ancestor) or os.path.islink(ancestor):
+                    os.unlink(ancestor)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if os.path.isdir(dst) and not os.path.islink(dst):
+                shutil.rmtree(dst)
+
+            mtime_ns = int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+            try:
+                dst_stat = os.stat(dst)
+            except FileNotFoundError:
+                dst_stat = None
+            if dst_stat is not None and dst_stat.st_size == info.file_size:
+                if dst_stat.st_mtime_ns == mtime_ns:
+                    stats["unchanged"] += 1
+                    continue
+                if file_crc32(dst) == info.CRC:
+                    os.utime(dst, ns=(dst_stat.st_atime_ns, mtime_ns))
+                    stats["unchanged"] += 1
+                    continue
+            self._extract_member(zip_ref, info, dst, mtime_ns)
+            stats["extract"] += 1
+
+        # Remove what no longer exists in the archive
+        os.makedirs(dst_dir, exist_ok=True)
+        for root, dirs, files in os.walk(dst_dir, topdown=False):
+            for name in files:
+                path = os.path.join(root, name)
+                if path not in wanted:
+                    stats["removed"] += 1
+                    os.unlink(path)
+            for name in dirs:
+                path = os.path.join(root, name)
+                if path not in wanted:
+                    if os.path.islink(path):
+                        os.unlink(path)
+                    else:
+                        shutil.rmtree(path)
+
+        return stats
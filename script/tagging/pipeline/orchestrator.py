@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import time
+import heapq
+import shutil
+import logging
+import zipfile
+import threading
+import contextlib
+import multiprocessing
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from models.utils import find_png_dirs
+from models.sources import list_pngs, target_directory, input_root
+from models.metrics import METRICS
+from pipeline.processor import tag_images
+from pipeline.watch import extract_archive
+
+logger = logging.getLogger("orchestrator")
+
+class Pack:
+    """One pack ZIP going through the stages, with what each stage left for the next ones"""
+
+    def __init__(self, index, zip_path):
+        self.index = index
+        self.zip_path = Path(zip_path)
+        self.name = self.zip_path.stem
+        # Extracted pack directory, and whether this run (re)extracted it
+        self.pack_dir = None
+        self.extracted = False
+        # png directory -> metadata list, from the tag stage
+        self.tagged = {}
+        # Stage name -> "done", "failed" or "skipped" (an upstream stage failed)
+        self.status = {}
+        # Stages queued or running for this pack
+        self.queued = set()
+        self.admitted_at = None
+        self.finished_at = None
+
+class Stage:
+    """
+    A step of the per-pack DAG, run for at most `workers` packs at a time
+
+    Thread stages call func(pack) in this process. Process stages call
+    args(pack) here and run the picklable result (function, *arguments) in a
+    worker process; args may return None when there is nothing to do. Either
+    way the function returns the number of items (files, images, rows) it handled.
+    """
+
+    def __init__(self, name, func=None, workers=1, after=(), processes=False, args=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.after = tuple(after)
+        self.processes = processes
+        self.args = args
+        self.running = 0
+        self.packs = 0
+        self.failed = 0
+        self.items = 0
+        self.busy_sec = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, started, ended, items=None):
+        """Account one finished task (items=None when it failed)"""
+        self.first_start = started if self.first_start is None else min(self.first_start, started)
+        self.last_end = ended if self.last_end is None else max(self.last_end, ended)
+        self.busy_sec += ended - started
+        if items is None:
+            self.failed += 1
+            return
+        self.packs += 1
+        self.items += items
+        METRICS.observe(f"pipeline_{self.name}", ended - started)
+        METRICS.count(f"pipeline_{self.name}_items", items)
+
+    def throughput(self):
+        """Packs and items per second over the time this stage was active, and how busy its workers were"""
+        wall = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        return {
+            "workers": self.workers,
+            "packs": self.packs,
+            "failed": self.failed,
+            "items": self.items,
+            "busy_sec": self.busy_sec,
+            "active_sec": wall,
+            "packs_per_sec": self.packs / wall if wall else 0.0,
+            "items_per_sec": self.items / wall if wall else 0.0,
+            "utilization": self.busy_sec / (wall * self.workers) if wall else 0.0,
+        }
+
+class PackPipeline:
+    """
+    Run every pack through a DAG of stages, each with its own bounded concurrency
+
+    A pack moves to a stage as soon as the stages it depends on are done for
+    that pack, so the first packs are finished while later ones are still
+    being extracted. At most max_in_flight packs are between admission and
+    their last stage, which bounds the disk and memory used ahead of the
+    slowest stage; within a stage the oldest pack goes first. A failed stage
+    skips the stages that depend on it for that pack only.
+    """
+
+    def __init__(self, stages, max_in_flight=8):
+        names = set()
+        for stage in stages:
+            missing = [name for name in stage.after if name not in names]
+            if missing:
+                raise ValueError(f"Stage {stage.name} runs after unknown or later stage(s): {', '.join(missing)}")
+            names.add(stage.name)
+        self.stages = list(stages)
+        self.max_in_flight = max(1, int(max_in_flight))
+
+    def _schedule(self, pack, ready):
+        """Mark stages downstream of a failure as skipped and queue the stages whose dependencies are done"""
+        for stage in self.stages:
+            if stage.name in pack.status or stage.name in pack.queued:
+                continue
+            states = [pack.status.get(name) for name in stage.after]
+            if any(state in ("failed", "skipped") for state in states):
+                pack.status[stage.name] = "skipped"
+            elif all(state == "done" for state in states):
+                pack.queued.add(stage.name)
+                heapq.heappush(ready[stage.name], (pack.index, pack))
+
+    def _finish(self, pack, start, finished):
+        pack.finished_at = time.perf_counter()
+        failed = [name for name, state in pack.status.items() if state == "failed"]
+        logger.info(f"Pack {pack.name} {'failed at ' + ', '.join(failed) if failed else 'finished'} "
+                    f"({finished} done) in {pack.finished_at - pack.admitted_at:.1f}s, "
+                    f"{pack.finished_at - start:.1f}s after start")
+
+    def run(self, zip_files):
+        """
+        Process pack ZIPs through all stages
+
+        Args:
+            zip_files: Paths of the pack ZIPs, in processing order
+
+        Returns:
+            Summary dict: packs, packs_failed, elapsed_sec, first_pack_sec and per-stage throughput
+        """
+        packs = [Pack(index, zip_path) for index, zip_path in enumerate(zip_files)]
+        waiting = deque(packs)
+        ready = {stage.name: [] for stage in self.stages}
+        running = {}
+        executors = {}
+        for stage in self.stages:
+            if stage.processes:
+                # spawn: forking while tag threads run inference could copy held locks into the child
+                executors[stage.name] = ProcessPoolExecutor(max_workers=stage.workers,
+                                                            mp_context=multiprocessing.get_context("spawn"))
+            else:
+                executors[stage.name] = ThreadPoolExecutor(max_workers=stage.workers,
+                                                           thread_name_prefix=f"pipeline-{stage.name}")
+
+        start = time.perf_counter()
+        in_flight = 0
+        finished = []
+        touched = []
+        try:
+            while waiting or in_flight:
+                while waiting and in_flight < self.max_in_flight:
+                    pack = waiting.popleft()
+                    pack.admitted_at = time.perf_counter()
+                    in_flight += 1
+                    self._schedule(pack, ready)
+                    touched.append(pack)
+
+                for stage in self.stages:
+                    while ready[stage.name] and stage.running < stage.workers:
+                        _, pack = heapq.heappop(ready[stage.name])
+                        started = time.perf_counter()
+                        if stage.processes:
+                            call = stage.args(pack)
+                            if call is None:
+                                # Nothing to do for this pack: done without a task
+                                stage.packs += 1
+                                pack.status[stage.name] = "done"
+                                pack.queued.discard(stage.name)
+                                self._schedule(pack, ready)
+                                touched.append(pack)
+                                continue
+                            future = executors[stage.name].submit(*call)
+                        else:
+                            future = executors[stage.name].submit(stage.func, pack)
+                        stage.running += 1
+                        running[future] = (stage, pack, started)
+
+                # Packs with every stage done, failed or skipped
+                for pack in touched:
+                    if pack.finished_at is None and len(pack.status) == len(self.stages):
+                        finished.append(pack)
+                        in_flight -= 1
+                        self._finish(pack, start, len(finished))
+                touched.clear()
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, pack, started = running.pop(future)
+                    stage.running -= 1
+                    pack.queued.discard(stage.name)
+                    try:
+                        items = future.result()
+                        stage.record(started, time.perf_counter(), items or 0)
+                        pack.status[stage.name] = "done"
+                    except Exception as e:
+                        stage.record(started, time.perf_counter())
+                        pack.status[stage.name] = "failed"
+                        logger.error(f"Stage {stage.name} failed for {pack.name}: {e}")
+                    self._schedule(pack, ready)
+                    touched.append(pack)
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.perf_counter() - start
+        completed = [p for p in finished if all(state == "done" for state in p.status.values())]
+        return {
+            "packs": len(packs),
+            "packs_failed": len(packs) - len(completed),
+            "elapsed_sec": elapsed,
+            "first_pack_sec": min(p.finished_at for p in completed) - start if completed else None,
+            "stages": {stage.name: stage.throughput() for stage in self.stages},
+        }
+
+# Palette manager of a colorize worker process, by palettes file
+_PALETTE_MANAGERS = {}
+
+def colorize_pack(svg_dir, output_dir, palettes_file=None):
+    """
+    Recolor every svg file of a pack (runs in a colorize worker process)
+
+    Args:
+        svg_dir: svg directory of the extracted pack
+        output_dir: Directory receiving the recolored files, same layout (cleared first)
+        palettes_file: Merged palettes JSON (default: the colorizer's merged_colors.json)
+
+    Returns:
+        Number of files written
+    """
+    from script.svg_painter.colorizer import ColorPaletteManager, load_color_palettes, process_svg_file
+
+    manager = _PALETTE_MANAGERS.get(palettes_file)
+    if manager is None:
+        palettes = load_color_palettes(palettes_file) if palettes_file else load_color_palettes()
+        manager = _PALETTE_MANAGERS[palettes_file] = ColorPaletteManager(palettes)
+
+    # Files removed from a re-extracted pack must not survive from the previous run
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    written = 0
+    # The colorizer prints a line per file; keep the pipeline log readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for dirpath, _, filenames in os.walk(svg_dir):
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(".svg"):
+                    continue
+                svg_path = os.path.join(dirpath, filename)
+                output_path = os.path.join(output_dir, os.path.relpath(svg_path, svg_dir))
+                if process_svg_file(svg_path, manager, output_path=output_path):
+                    written += 1
+    return written
+
+class PackStages:
+    """
+    The extract, colorize, tag and export stages of a pack
+
+    extract -> colorize
+            -> tag -> export
+
+    Extraction follows the unzip scripts' manifest (script/unzip/manifest.py):
+    an archive unchanged since it was last extracted is not extracted again,
+    and its colorized svg files are kept. Tagging is served from the cache
+    first; each tag worker thread loads its own models on its first cache miss.
+    """
+
+    def __init__(self, extract_dir, colorized_dir, exporter, processor_factory, cache_dir="data/cache",
+                 batch_size=8, palettes_file=None, force=False, overwrite=False):
+        from script.unzip.manifest import Manifest
+
+        self.extract_dir = Path(extract_dir)
+        self.colorized_dir = Path(colorized_dir) if colorized_dir else None
+        self.exporter = exporter
+        self.processor_factory = processor_factory
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.palettes_file = palettes_file
+        self.force = force
+        self.overwrite = overwrite
+
+        self.extract_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = Manifest(self.extract_dir)
+        self._manifest_lock = threading.Lock()
+        self._local = threading.local()
+
+    def extract(self, pack):
+        """Extract the archive into extract_dir/<pack> unless it is up to date"""
+        from script.unzip.manifest import archive_fingerprint
+
+        pack.pack_dir = self.extract_dir / pack.name
+        with self._manifest_lock:
+            action = self.manifest.plan(pack.zip_path, overwrite=self.overwrite, force=self.force)
+        if action != "extract":
+            logger.debug(f"{pack.zip_path.name}: {action}, using {pack.pack_dir}")
+            return 0
+
+        extract_archive(pack.zip_path, self.extract_dir)
+        with zipfile.ZipFile(pack.zip_path, 'r') as zip_ref:
+            infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+        with self._manifest_lock:
+            self.manifest.record(pack.zip_path, {
+                "status": "extracted",
+                "fingerprint": archive_fingerprint(pack.zip_path, infos),
+                "files": len(infos),
+                "bytes": sum(info.file_size for info in infos),
+            })
+        pack.extracted = True
+        return len(infos)
+
+    def colorize_args(self, pack):
+        """Call of colorize_pack for a worker process, or None when there is nothing to recolor"""
+        svg_dir = pack.pack_dir / "svg"
+        output_dir = self.colorized_dir / pack.name / "svg"
+        if not svg_dir.is_dir():
+            return None
+        if not pack.extracted and output_dir.is_dir() and not self.force:
+            return None
+        return colorize_pack, str(svg_dir), str(output_dir), self.palettes_file
+
+    def _processor(self):
+        processor = getattr(self._local, "processor", None)
+        if processor is None:
+            processor = self._local.processor = self.processor_factory()
+        return processor
+
+    def tag(self, pack):
+        """Tag the PNGs of every png directory of the pack"""
+        images = 0
+        for png_dir in find_png_dirs(str(pack.pack_dir)):
+            png_files = list_pngs(png_dir)
+            results, misses = tag_images(png_files, self._processor, self.cache_dir, self.batch_size)
+            pack.tagged[png_dir] = results
+            images += len(png_files)
+            logger.debug(f"Tagged {target_directory(png_dir)}: {len(results)}/{len(png_files)} images ({misses} new)")
+        return images
+
+    def export(self, pack):
+        """Export metadata.csv (and the svg folder) of every tagged directory"""
+        rows = 0
+        for png_dir, results in pack.tagged.items():
+            if not results:
+                continue
+            if not self.exporter.export_metadata(target_directory(png_dir), results, input_root(png_dir)):
+                raise RuntimeError(f"Export of {target_directory(png_dir)} failed")
+            rows += len(results)
+        return rows
+
+    def stages(self, extract_workers=2, colorize_workers=1, tag_workers=1, export_workers=2):
+        """Stage list for PackPipeline (without colorize when colorized_dir is None)"""
+        stages = [Stage("extract", self.extract, workers=extract_workers)]
+        if self.colorized_dir is not None:
+            stages.append(Stage("colorize", workers=colorize_workers, after=("extract",), processes=True,
+                                args=self.colorize_args))
+        stages.append(Stage("tag", self.tag, workers=tag_workers, after=("extract",)))
+        stages.append(Stage("export", self.export, workers=export_workers, after=("tag",)))
+        return stages
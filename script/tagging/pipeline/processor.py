@@ -6,73 +6,181 @@ import logging
 from pathlib import Path
 
 # Changed from relative to absolute import
-from models.clip_model import ClipInterrogatorModel
-from models.tag_generator import TagGenerator
-from models.utils import clean_filename, extract_title
+from models.utils import clean_filename, extract_title, get_cache_path, load_from_cache, set_torch_threads
+from models.store import ModelStore, enable_offline_mode
+from models.metrics import METRICS
 
 logger = logging.getLogger("processor")
 
+def build_metadata(filename, description, tags):
+    """Create the metadata.csv row for an image"""
+    return {
+        "filename": clean_filename(filename),     # Convert .png to .svg
+        "title": extract_title(filename),         # Remove index number and extension
+        "keywords": ",".join(tags),               # Join tags with commas
+        "Artist": "",                             # Leave empty
+        "description": description                # Detailed description
+    }
+
+def load_cached_metadata(image_path, cache_dir="data/cache"):
+    """
+    Build metadata from cached description and tags without loading any model
+    
+    Returns:
+        Metadata dict, or None if either cache entry is missing
+    """
+    cached_description = load_from_cache(get_cache_path(image_path, prefix="desc_", cache_dir=cache_dir), image_path)
+    cached_tags = load_from_cache(get_cache_path(image_path, prefix="tags_", cache_dir=cache_dir), image_path)
+    if not cached_description or cached_tags is None:
+        return None
+    return build_metadata(os.path.basename(image_path), cached_description["description"], cached_tags["tags"])
+
+def tag_images(image_paths, get_processor, cache_dir="data/cache", batch_size=8):
+    """
+    Metadata of images, served from cache when possible
+    
+    Args:
+        image_paths: Image paths
+        get_processor: Function returning an ImageProcessor, called only on the first cache miss
+        cache_dir: Cache directory
+        batch_size: Cache misses processed per process_images call
+    
+    Returns:
+        Tuple (metadata list sorted by filename, number of images that were not cached)
+    """
+    results = []
+    misses = []
+    for image_path in image_paths:
+        metadata = load_cached_metadata(image_path, cache_dir)
+        if metadata is None:
+            misses.append(image_path)
+        else:
+            results.append(metadata)
+    
+    if misses:
+        processor = get_processor()
+        for start in range(0, len(misses), batch_size):
+            chunk = misses[start:start + batch_size]
+            results.extend(m for m in processor.process_images(chunk) if m)
+    
+    results.sort(key=lambda m: m["filename"])
+    return results, len(misses)
+
 class ImageProcessor:
     """Process individual images to generate metadata"""
     
-    def __init__(self, use_gpu=True, cache_dir="data/cache"):
+    def __init__(self, use_gpu=True, cache_dir="data/cache", backend="torch", onnx_dir=None, intra_op_threads=None,
+                 precision="fp32", model_store_dir=None, torch_threads=None):
+        # Weights load strictly offline once prepare-models has filled the store
+        model_store = ModelStore(model_store_dir) if model_store_dir else None
+        if model_store is not None and model_store.manifest():
+            enable_offline_mode()
+        
+        # Imported here so that discovery and cache-only runs never load torch
+        from models.clip_model import ClipInterrogatorModel
+        from models.tag_generator import TagGenerator
+        
+        # Intra-op threads of this process (avoid N workers x all cores oversubscription)
+        if torch_threads:
+            set_torch_threads(torch_threads)
+        
         # Determine device
         device = "cuda" if use_gpu else "cpu"
         
         # Initialize models
-        self.clip_model = ClipInterrogatorModel(device=device, cache_dir=cache_dir)
-        self.tag_generator = TagGenerator(device=device, cache_dir=cache_dir)
+        self.clip_model = ClipInterrogatorModel(
+            device=device,
+            cache_dir=cache_dir,
+            backend=backend,
+            onnx_dir=onnx_dir,
+            intra_op_threads=intra_op_threads,
+            precision=precision,
+            model_store=model_store
+        )
+        self.tag_generator = TagGenerator(
+            device=device,
+            cache_dir=cache_dir,
+            precision=precision,
+            model_store=model_store
+        )
         
         logger.info(f"ImageProcessor initialized with device={device}")
     
-    def process_image(self, image_path, use_cache=True):
+    def process_image(self, image_path, use_cache=True, cheap=False):
         """
         Process an image to generate metadata
         
         Args:
             image_path: Path to the PNG image file
             use_cache: Whether to use cache
+            cheap: Use cheap decoding settings (retry of an image that exceeded its time budget)
             
         Returns:
             Dict containing image metadata or None if error
         """
         try:
-            logger.info(f"Processing image: {image_path}")
-            
-            # Get filename
-            filename = os.path.basename(image_path)
+            logger.debug("Processing image: %s", image_path)
             
             # 1. Generate description from image
-            description = self.clip_model.generate_description(image_path, use_cache=use_cache)
-            
-            if not description:
-                logger.error(f"Could not generate description for {filename}")
-                return None
-            
-            # 2. Generate tags from description
-            tags = self.tag_generator.generate_tags(
-                description, 
-                image_path=image_path,
-                num_tags=25,
-                use_cache=use_cache
-            )
-            
-            if not tags:
-                logger.warning(f"Could not generate tags for {filename}")
-                tags = []
-            
-            # 3. Create metadata
-            metadata = {
-                "filename": clean_filename(filename),     # Convert .png to .svg
-                "title": extract_title(filename),         # Remove index number and extension
-                "keywords": ",".join(tags),               # Join tags with commas
-                "Artist": "",                             # Leave empty
-                "description": description                # Detailed description
-            }
-            
-            logger.info(f"Finished processing image: {filename}")
-            return metadata
+            description = self.clip_model.generate_description(image_path, use_cache=use_cache, cheap=cheap)
+            return self._build_image_metadata(image_path, description, use_cache=use_cache and not cheap)
             
         except Exception as e:
             logger.error(f"Error processing image {image_path}: {e}")
-            return None 
\ No newline at end of file
+            METRICS.count("images_failed")
+            return None
+    
+    def process_images(self, image_paths, use_cache=True):
+        """
+        Process several images, captioning them in a single batched BLIP call
+        
+        Args:
+            image_paths: Paths to PNG image files
+            use_cache: Whether to use cache
+            
+        Returns:
+            List of metadata dicts (None where an image failed), in the order of image_paths
+        """
+        try:
+            descriptions = self.clip_model.generate_descriptions(image_paths, use_cache=use_cache)
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(image_paths)} images: {e}")
+            METRICS.count("images_failed", len(image_paths))
+            return [None] * len(image_paths)
+        
+        results = []
+        for image_path, description in zip(image_paths, descriptions):
+            try:
+                results.append(self._build_image_metadata(image_path, description, use_cache=use_cache))
+            except Exception as e:
+                logger.error(f"Error processing image {image_path}: {e}")
+                METRICS.count("images_failed")
+                results.append(None)
+        return results
+    
+    def _build_image_metadata(self, image_path, description, use_cache=True):
+        """Generate tags for a description and build the metadata row"""
+        filename = os.path.basename(image_path)
+        if not description:
+            logger.error(f"Could not generate description for {filename}")
+            METRICS.count("images_failed")
+            return None
+        
+        # 2. Generate tags from description
+        tags = self.tag_generator.generate_tags(
+            description, 
+            image_path=image_path,
+            num_tags=25,
+            use_cache=use_cache    # Tags of a degraded (cheap) description are not cached
+        )
+        
+        if not tags:
+            logger.warning(f"Could not generate tags for {filename}")
+            tags = []
+        
+        # 3. Create metadata
+        metadata = build_metadata(filename, description, tags)
+        
+        METRICS.count("images_tagged")
+        logger.debug("Finished processing image: %s", filename)
+        return metadata 
\ No newline at end of file
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import queue
+import uuid
+import logging
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from models.metrics import METRICS
+from models.sources import file_info, list_pngs, split_archive_path
+
+logger = logging.getLogger("service")
+
+class TaggingService:
+    """
+    Keep an ImageProcessor warm and serve tagging requests
+
+    Single-image requests are queued and micro-batched: the batcher waits at most
+    max_batch_delay seconds after the first request for others to arrive, then
+    captions up to max_batch_size images in one model call. Directory jobs feed
+    their images through the same queue in chunks, so single-image requests are
+    never stuck behind a whole directory. Only the last max_finished_jobs
+    finished jobs are kept for polling.
+    """
+
+    def __init__(self, processor_kwargs, max_batch_size=8, max_batch_delay=0.05, max_finished_jobs=100):
+        self.processor_kwargs = processor_kwargs
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.max_finished_jobs = max_finished_jobs
+
+        self.processor = None
+        self.requests = queue.Queue()
+        self.jobs = {}
+        self.finished_jobs = deque()
+        self.job_queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Load the models and start the batcher and job threads"""
+        from pipeline.processor import ImageProcessor
+
+        start_time = time.time()
+        self.processor = ImageProcessor(**self.processor_kwargs)
+        logger.info(f"Models warm after {time.time() - start_time:.1f}s")
+
+        for target, name in ((self._batch_loop, "batcher"), (self._job_loop, "jobs")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop accepting work and let the threads exit"""
+        self._stopped.set()
+        self.requests.put(None)
+        self.job_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=10)
+
+    def submit_image(self, image_path, use_cache=True):
+        """
+        Queue an image for the next micro-batch
+
+        Returns:
+            Future resolved with the metadata dict (None if the image failed)
+        """
+        future = Future()
+        self.requests.put((str(image_path), use_cache, future))
+        return future
+
+    def tag_image(self, image_path, use_cache=True, timeout=None):
+        """Tag a single image and wait for the result"""
+        return self.submit_image(image_path, use_cache).result(timeout=timeout)
+
+    def _next_batch(self):
+        """Block for a first request, then collect more until the batch is full or the deadline passes"""
+        first = self.requests.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_batch_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _batch_loop(self):
+        """Batcher thread: run each micro-batch through the models"""
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if batch is None:
+                break
+
+            # Requests with and without cache are batched separately
+            for use_cache in (True, False):
+                group = [(path, future) for path, cached, future in batch if cached == use_cache]
+                if not group:
+                    continue
+                try:
+                    results = self.processor.process_images([path for path, _ in group], use_cache=use_cache)
+                except Exception as e:
+                    logger.error(f"Error processing batch of {len(group)} images: {e}")
+                    results = [None] * len(group)
+                for (_, future), metadata in zip(group, results):
+                    future.set_result(metadata)
+
+            logger.debug(f"Processed micro-batch of {len(batch)} images")
+
+    def submit_directory(self, png_dir, use_cache=True):
+        """
+        Queue a directory job
+
+        Returns:
+            Job id, to be polled with job_status
+        """
+        png_files = list_pngs(png_dir)
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "directory": str(png_dir),
+                "status": "queued",
+                "total": len(png_files),
+                "processed": 0,
+                "results": [],
+                "failures": [],
+                "error": None,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "finished_at": None
+            }
+        self.job_queue.put((job_id, png_files, use_cache))
+        return job_id
+
+    def job_status(self, job_id):
+        """Snapshot of a job, or None if the id is unknown"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def _job_loop(self):
+        """Job thread: run directory jobs one at a time through the batcher"""
+        while not self._stopped.is_set():
+            item = self.job_queue.get()
+            if item is None:
+                break
+            job_id, png_files, use_cache = item
+            with self._lock:
+                job = self.jobs[job_id]
+                job["status"] = "running"
+
+            status, error = "done", None
+            try:
+                for start in range(0, len(png_files), self.max_batch_size):
+                    chunk = png_files[start:start + self.max_batch_size]
+                    futures = [self.submit_image(path, use_cache) for path in chunk]
+                    for path, future in zip(chunk, futures):
+                        metadata = future.result()
+                        with self._lock:
+                            job["processed"] += 1
+                            if metadata:
+                                job["results"].append(metadata)
+                            else:
+                                job["failures"].append(os.path.basename(path))
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                status, error = "failed", str(e)
+            self._finish_job(job_id, status, error)
+
+    def _finish_job(self, job_id, status, error=None):
+        """Mark a job finished and forget the oldest finished jobs beyond max_finished_jobs"""
+        with self._lock:
+            job = self.jobs[job_id]
+            job["status"] = status
+            job["error"] = error
+            job["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            self.finished_jobs.append(job_id)
+            while len(self.finished_jobs) > self.max_finished_jobs:
+                self.jobs.pop(self.finished_jobs.popleft(), None)
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the tagging service
+
+    GET  /health          -> {"status": "ok"}
+    GET  /metrics         -> stage timings, counters and cache hits (Prometheus text format)
+    POST /tag             {"image": path, "use_cache": true} -> metadata
+    POST /jobs            {"directory": path, "use_cache": true} -> {"job_id": ...}
+    GET  /jobs/<job_id>   -> job status, progress and results
+    """
+
+    service = None          # TaggingService, set by create_server
+    request_timeout = None  # Seconds to wait for a single-image result
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "pending_requests": self.service.requests.qsize()})
+        elif self.path == "/metrics":
+            body = METRICS.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path.startswith("/jobs/"):
+            job = self.service.job_status(self.path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "Unknown job"})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": "Invalid JSON body"})
+            return
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "JSON body must be an object"})
+            return
+        # Path fields reach file_info / os.path unchecked, so anything but a string is refused here
+        field = {"/tag": "image", "/jobs": "directory"}.get(self.path)
+        if field is not None and not isinstance(payload.get(field), str):
+            self._send_json(400, {"error": f"'{field}' must be a path string"})
+            return
+        use_cache = bool(payload.get("use_cache", True))
+
+        if self.path == "/tag":
+            image_path = payload.get("image")
+            # A file, or a member of a pack ZIP ("<pack>.zip!/<member>")
+            if not image_path or file_info(image_path) is None:
+                self._send_json(400, {"error": f"Image not found: {image_path}"})
+                return
+            try:
+                metadata = self.service.tag_image(image_path, use_cache=use_cache, timeout=self.request_timeout)
+            except FutureTimeoutError:
+                self._send_json(504, {"error": f"Timed out tagging image: {image_path}"})
+                return
+            if metadata is None:
+                self._send_json(422, {"error": f"Could not tag image: {image_path}"})
+            else:
+                self._send_json(200, metadata)
+
+        elif self.path == "/jobs":
+            directory = payload.get("directory")
+            archive, _ = split_archive_path(directory or "")
+            if not directory or not os.path.isdir(directory) and not (archive and os.path.isfile(archive)):
+                self._send_json(400, {"error": f"Directory not found: {directory}"})
+                return
+            self._send_json(202, {"job_id": self.service.submit_directory(directory, use_cache=use_cache)})
+
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix domain socket (one thread per connection)"""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("unix", 0)
+
+def create_server(service, host="127.0.0.1", port=8765, socket_path=None, request_timeout=None):
+    """
+    Create the HTTP server of a started TaggingService
+
+    Args:
+        service: TaggingService with warm models
+        host, port: TCP address (ignored when socket_path is set)
+        socket_path: Serve on a Unix domain socket instead of TCP
+        request_timeout: Seconds to wait for a single-image result
+
+    Returns:
+        A socketserver instance, run with serve_forever()
+    """
+    handler = type("BoundServiceRequestHandler", (ServiceRequestHandler,), {
+        "service": service,
+        "request_timeout": request_timeout
+    })
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import socket
+import logging
+import hashlib
+import threading
+from pathlib import Path
+
+from models.sources import target_directory, input_root
+
+logger = logging.getLogger("sharding")
+
+def _write_json_atomic(path, data):
+    """Write JSON through a temporary file and rename, so readers never see a partial file"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+def default_host_id():
+    """Host name plus pid, so several processes on one machine are distinct hosts"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class ShardCoordinator:
+    """
+    Claim png directories through lease files on a shared filesystem
+
+    Layout of the shard directory:
+        leases/<key>.lease          owner of a directory being processed (mtime = last heartbeat)
+        done/<key>                  directory finished, by whom
+        results/<host>/<key>.json   metadata and failures written by the host that processed it
+
+    A lease is created with O_CREAT | O_EXCL, so only one host can hold it. The
+    owner renews it every `heartbeat` seconds; a lease not renewed for `ttl`
+    seconds is stale and is taken over by renaming it away (only one host wins
+    the rename) before creating a new one. The renamed file is checked again,
+    and put back if another host renewed or replaced the lease in the meantime.
+    """
+
+    def __init__(self, shard_dir, png_dirs, target_of, host_id=None, ttl=300, heartbeat=60):
+        self.shard_dir = Path(shard_dir)
+        self.host_id = host_id or default_host_id()
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.target_of = target_of
+
+        self.lease_dir = self.shard_dir / "leases"
+        self.done_dir = self.shard_dir / "done"
+        self.results_dir = self.shard_dir / "results" / self.host_id
+        for directory in (self.lease_dir, self.done_dir, self.results_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self.remaining = list(png_dirs)
+        self.held = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    @staticmethod
+    def _key(png_dir):
+        """File-safe key of a png directory: pack name plus a short hash of the full path"""
+        pack = target_directory(png_dir)
+        digest = hashlib.md5(str(Path(png_dir).resolve()).encode()).hexdigest()[:8]
+        return f"{pack}-{digest}"
+
+    def _lease_path(self, key):
+        return self.lease_dir / f"{key}.lease"
+
+    def _is_done(self, key):
+        return (self.done_dir / key).exists()
+
+    def _create_lease(self, key):
+        """Atomically create a lease file, False if another host holds it"""
+        try:
+            fd = os.open(self._lease_path(key), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"owner": self.host_id, "acquired_at": time.time()}, f)
+        return True
+
+    @staticmethod
+    def _read_lease(path):
+        """(owner, age in seconds) of a lease file; raises FileNotFoundError if it is gone"""
+        age = time.time() - os.stat(path).st_mtime
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                owner = json.load(f).get("owner")
+        except ValueError:
+            owner = None
+        return owner, age
+
+    def _take_over_stale(self, key):
+        """Remove a lease whose owner stopped renewing it; True if this host removed it"""
+        lease_path = self._lease_path(key)
+        try:
+            owner, age = self._read_lease(lease_path)
+        except FileNotFoundError:
+            return True
+        if age < self.ttl:
+            return False
+
+        # Rename is atomic: when several hosts race for a stale lease only one succeeds
+        stale_path = self.lease_dir / f"{key}.stale.{self.host_id}"
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return False
+
+        # Between the stat and the rename another host may have taken the lease over and
+        # created a fresh one, or its owner renewed it: then that live lease was renamed, put it back
+        renamed_owner, renamed_age = self._read_lease(stale_path)
+        if renamed_owner != owner or renamed_age < self.ttl:
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                logger.error(f"Could not restore live lease {key} of {renamed_owner}, a new lease replaced it")
+            os.remove(stale_path)
+            return False
+
+        os.remove(stale_path)
+        logger.warning(f"Took over stale lease {key} of {owner} (no heartbeat for {age:.0f}s)")
+        return True
+
+    def try_acquire(self, png_dir):
+        """Claim a directory, False if it is done or held by a live host"""
+        key = self._key(png_dir)
+        if self._is_done(key):
+            return False
+        if not self._create_lease(key):
+            if not self._take_over_stale(key) or not self._create_lease(key):
+                return False
+        # The directory may have been finished between the check and the lease
+        if self._is_done(key):
+            self._lease_path(key).unlink(missing_ok=True)
+            return False
+        with self._lock:
+            self.held[key] = png_dir
+        return True
+
+    def _owns(self, key):
+        try:
+            with open(self._lease_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f).get("owner") == self.host_id
+        except (OSError, ValueError):
+            return False
+
+    def _heartbeat_loop(self):
+        """Renew the leases held by this host"""
+        while not self._stopped.wait(self.heartbeat):
+            with self._lock:
+                keys = list(self.held)
+            for key in keys:
+                if self._owns(key):
+                    try:
+                        os.utime(self._lease_path(key))
+                    except FileNotFoundError:
+                        logger.error(f"Lease {key} vanished while renewing it")
+                else:
+                    logger.error(f"Lost lease {key} to another host (heartbeat too slow for ttl={self.ttl}s)")
+
+    def next_directory(self):
+        """
+        Claim the next available directory
+
+        Returns:
+            A png directory, or None if every remaining one is done or held by another host
+        """
+        for png_dir in list(self.remaining):
+            key = self._key(png_dir)
+            if self._is_done(key):
+                self.remaining.remove(png_dir)
+                continue
+            if self.try_acquire(png_dir):
+                self.remaining.remove(png_dir)
+                return png_dir
+        return None
+
+    def is_exhausted(self):
+        """True once every directory not held by this host is done"""
+        self.remaining = [d for d in self.remaining if not self._is_done(self._key(d))]
+        return not self.remaining
+
+    def complete(self, png_dir, metadata_list, failures=None, error=None):
+        """Write this host's result for a directory, mark it done and release the lease"""
+        key = self._key(png_dir)
+        _write_json_atomic(self.results_dir / f"{key}.json", {
+            "png_dir": str(png_dir),
+            "input_root": input_root(png_dir),
+            "target_dir": self.target_of(png_dir),
+            "host": self.host_id,
+            "metadata": metadata_list or [],
+            "failures": failures or [],
+            "error": error
+        })
+        _write_json_atomic(self.done_dir / key, {"host": self.host_id, "finished_at": time.time()})
+        self.release(key)
+
+    def release(self, key):
+        with self._lock:
+            self.held.pop(key, None)
+        if self._owns(key):
+            self._lease_path(key).unlink(missing_ok=True)
+
+    def close(self):
+        """Stop heartbeats and give back leases of unfinished directories"""
+        self._stopped.set()
+        self._heartbeat_thread.join(timeout=5)
+        for key in list(self.held):
+            self.release(key)
+
+def load_shard_results(shard_dir):
+    """
+    Collect the results written by all hosts
+
+    Returns:
+        List of result dicts (one per directory; if a directory was processed twice after
+        a lease takeover, the most recent result wins)
+    """
+    by_dir = {}
+    for path in sorted(Path(shard_dir, "results").glob("*/*.json")):
+        with open(path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        result["_mtime"] = path.stat().st_mtime
+        previous = by_dir.get(result["png_dir"])
+        if previous is None or result["_mtime"] > previous["_mtime"]:
+            by_dir[result["png_dir"]] = result
+    return [by_dir[key] for key in sorted(by_dir)]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import multiprocessing
+
+logger = logging.getLogger("shared")
+
+# Processor loaded by the parent before forking the workers, inherited by every child
+_shared_processor = None
+
+def fork_context():
+    """The 'fork' multiprocessing context, or None where fork is unavailable (Windows/macOS spawn)"""
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+def _find_modules(obj, depth=5, seen=None):
+    """Collect the torch modules reachable from an object's attributes"""
+    import torch
+
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return []
+    seen.add(id(obj))
+
+    if isinstance(obj, torch.nn.Module):
+        return [obj]
+    if depth == 0 or not hasattr(obj, "__dict__"):
+        return []
+
+    modules = []
+    for value in vars(obj).values():
+        modules.extend(_find_modules(value, depth - 1, seen))
+    return modules
+
+def freeze_for_sharing(obj, shared_memory=False):
+    """
+    Make the weights of every torch module held by obj read-only for forked workers
+
+    Parameters stop requiring gradients, so inference never writes to them and the
+    forked workers keep sharing the parent's pages copy-on-write. shared_memory=True
+    also moves the tensors to /dev/shm, which fails where it is small (64 MB in Docker).
+
+    Returns:
+        Number of bytes of weights
+    """
+    total = 0
+    for module in _find_modules(obj):
+        module.eval()
+        for parameter in module.parameters():
+            parameter.requires_grad_(False)
+        if shared_memory:
+            module.share_memory()
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+def load_shared_processor(processor_kwargs, shared_memory=False):
+    """
+    Load an ImageProcessor in the parent process for forked workers to inherit
+
+    Must run before the worker pool is created, and without running inference in
+    the parent (the intra-op thread pool does not survive a fork).
+
+    Args:
+        processor_kwargs: ImageProcessor arguments
+        shared_memory: Also move the weights to /dev/shm (see freeze_for_sharing)
+
+    Returns:
+        The shared ImageProcessor, or None if it could not be prepared (workers then load their own)
+    """
+    global _shared_processor
+    from pipeline.processor import ImageProcessor
+
+    # Worker thread counts are applied after the fork, keep the parent's loading single-threaded
+    kwargs = dict(processor_kwargs, torch_threads=1)
+    try:
+        processor = ImageProcessor(**kwargs)
+        weight_bytes = freeze_for_sharing(processor, shared_memory=shared_memory)
+    except Exception as e:
+        logger.warning(f"Could not prepare shared models, each worker loads its own: {e}")
+        return None
+    _shared_processor = processor
+    location = "in shared memory" if shared_memory else "shared copy-on-write"
+    logger.info(f"Loaded shared models in parent: {weight_bytes / 2**20:.0f} MB of weights {location}")
+    return _shared_processor
+
+def get_shared_processor(torch_threads=None):
+    """
+    Processor inherited from the parent, or None if models were not preloaded
+
+    Args:
+        torch_threads: Intra-op threads to use in this worker
+    """
+    if _shared_processor is not None and torch_threads:
+        from models.utils import set_torch_threads
+        set_torch_threads(torch_threads)
+    return _shared_processor
+
+def release_shared_processor():
+    """Drop the parent's reference once the workers are done"""
+    global _shared_processor
+    _shared_processor = None
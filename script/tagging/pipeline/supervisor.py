@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import queue
+import logging
+import multiprocessing
+
+from models.logs import ChildLogReceiver, log_to_queue
+from models.metrics import METRICS, enable_profiling
+from pipeline.shared import fork_context, get_shared_processor
+
+logger = logging.getLogger("supervisor")
+
+def _worker_main(requests, results, processor_kwargs, profile_options=None, log_queue=None, log_level=logging.INFO):
+    """Child process: load the models once, then process images until told to stop"""
+    # This worker can be killed: keep it off the log queue shared with the other processes
+    if log_queue is not None:
+        log_to_queue(log_queue, log_level)
+    # Metrics inherited through fork belong to the parent
+    METRICS.reset()
+    if profile_options:
+        enable_profiling(profile_options, role="supervised")
+    try:
+        # Reuse the models inherited from a parent that preloaded them (see pipeline.shared)
+        processor = get_shared_processor(processor_kwargs.get("torch_threads"))
+        if processor is None:
+            from pipeline.processor import ImageProcessor
+            processor = ImageProcessor(**processor_kwargs)
+    except Exception as e:
+        results.put(("error", str(e)))
+        return
+
+    results.put(("ready", None))
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        sequence, image_path, use_cache, cheap = request
+        metadata = processor.process_image(image_path, use_cache=use_cache, cheap=cheap)
+        results.put((sequence, metadata, METRICS.drain()))
+
+class SupervisedProcessor:
+    """
+    Run an ImageProcessor in a child process and enforce a time budget per image
+
+    An image that exceeds the budget gets its worker killed and restarted, then is
+    retried once with cheap decoding settings. If that also fails it is recorded
+    in self.failures and skipped, so the rest of the directory keeps going.
+    """
+
+    # Interval for checking whether the worker died while waiting for a result
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, processor_kwargs, time_budget, load_timeout=None, profile_options=None):
+        self.processor_kwargs = processor_kwargs
+        self.time_budget = time_budget
+        self.load_timeout = load_timeout
+        self.profile_options = profile_options
+        self.failures = []
+
+        self.process = None
+        self.requests = None
+        self.results = None
+        self.logs = None
+        self._sequence = 0
+
+    def _start(self):
+        """Start a worker and wait until its models are loaded (not counted in the budget)"""
+        # Fork when the models are preloaded so the worker inherits them instead of reloading.
+        # On GPU the parent has already initialized CUDA (check_cuda), which a forked child cannot use
+        if self.processor_kwargs.get("use_gpu"):
+            context = multiprocessing.get_context("spawn")
+        else:
+            context = fork_context() if get_shared_processor() is not None else None
+            context = context or multiprocessing
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.logs = ChildLogReceiver(context)
+        self.process = context.Process(
+            target=_worker_main,
+            args=(self.requests, self.results, self.processor_kwargs, self.profile_options,
+                  self.logs.queue, logging.getLogger().getEffectiveLevel()),
+            daemon=True
+        )
+        self.process.start()
+
+        status, message = self.results.get(timeout=self.load_timeout)
+        if status != "ready":
+            self._stop()
+            raise RuntimeError(f"Supervised worker failed to load models: {message}")
+        logger.info(f"Supervised worker ready (pid={self.process.pid})")
+
+    def _stop(self, kill=False):
+        """Stop the worker, killing it if it is stuck in inference"""
+        if self.process is None:
+            return
+        if kill:
+            self.process.kill()
+        else:
+            self.requests.put(None)
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.process = None
+        self.logs.close()
+        self.logs = None
+
+    def _wait_result(self, sequence):
+        """
+        Wait for the result of a request within the time budget
+
+        Returns:
+            (status, metadata) where status is "ok", "timeout" or "crashed"
+        """
+        deadline = time.monotonic() + self.time_budget
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return "timeout", None
+            try:
+                result_sequence, metadata, metrics = self.results.get(timeout=min(self.POLL_INTERVAL, remaining))
+            except queue.Empty:
+                if not self.process.is_alive():
+                    return "crashed", None
+                continue
+            METRICS.merge(metrics)
+            if result_sequence == sequence:
+                return "ok", metadata
+
+    def start(self):
+        """Start the worker now instead of on the first image"""
+        if self.process is None or not self.process.is_alive():
+            self._start()
+
+    def process_image(self, image_path, use_cache=True):
+        """
+        Process an image in the supervised worker
+
+        Returns:
+            Dict containing image metadata, or None if it failed or exceeded the budget twice
+        """
+        status = None
+        for cheap in (False, True):
+            if self.process is None or not self.process.is_alive():
+                self._start()
+
+            self._sequence += 1
+            self.requests.put((self._sequence, image_path, use_cache, cheap))
+            status, metadata = self._wait_result(self._sequence)
+
+            if status == "ok":
+                if cheap:
+                    logger.warning(f"Processed {os.path.basename(image_path)} with cheap decoding settings")
+                return metadata
+
+            METRICS.count(f"worker_{status}")
+            logger.warning(
+                f"Worker {status} on {os.path.basename(image_path)} "
+                f"(budget {self.time_budget}s, cheap={cheap}), restarting worker"
+            )
+            self._stop(kill=True)
+
+        self.failures.append({
+            "image": image_path,
+            "reason": status,
+            "time_budget_sec": self.time_budget
+        })
+        return None
+
+    def close(self):
+        """Stop the worker process"""
+        self._stop()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import socket
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("tuner")
+
+# Models loaded once per calibration worker process
+_worker_processor = None
+
+def _init_worker(processor_kwargs):
+    """Load the models in a calibration worker"""
+    global _worker_processor
+    from pipeline.processor import ImageProcessor
+    _worker_processor = ImageProcessor(**processor_kwargs)
+
+def _run_shard(image_paths):
+    """Process a shard of images, return (count, processing seconds, resident memory in bytes)"""
+    import psutil
+
+    start_time = time.time()
+    for image_path in image_paths:
+        _worker_processor.process_image(image_path, use_cache=False)
+    elapsed = time.time() - start_time
+    return len(image_paths), elapsed, psutil.Process().memory_info().rss
+
+def candidate_configs(cpu_count=None, max_workers=None):
+    """
+    Worker/thread combinations to try, without oversubscribing the CPU
+
+    Returns:
+        List of (workers, torch_threads) with workers * torch_threads <= cpu_count
+    """
+    cpu_count = cpu_count or multiprocessing.cpu_count()
+    max_workers = max_workers or max(1, cpu_count - 1)
+
+    values = []
+    n = 1
+    while n <= cpu_count:
+        values.append(n)
+        n *= 2
+    if cpu_count not in values:
+        values.append(cpu_count)
+
+    return [
+        (workers, threads)
+        for workers in values if workers <= max_workers
+        for threads in values if workers * threads <= cpu_count
+    ]
+
+def measure_config(image_paths, workers, torch_threads, processor_kwargs):
+    """
+    Measure steady-state throughput of one configuration (model loading is excluded)
+
+    Returns:
+        Dict with images_per_sec and peak_rss_mb (sum over workers)
+    """
+    kwargs = dict(processor_kwargs, torch_threads=torch_threads)
+    if kwargs.get("backend") == "onnx":
+        kwargs["intra_op_threads"] = torch_threads
+    shards = [image_paths[i::workers] for i in range(workers)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(kwargs,)) as executor:
+        results = list(executor.map(_run_shard, shards))
+
+    count = sum(r[0] for r in results)
+    elapsed = max(r[1] for r in results)
+    return {
+        "workers": workers,
+        "torch_threads": torch_threads,
+        "images_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_mb": sum(r[2] for r in results) / 2**20
+    }
+
+def calibrate(image_paths, processor_kwargs, configs=None, memory_limit_mb=None):
+    """
+    Sweep worker count and torch threads on sample images
+
+    Args:
+        image_paths: Sample PNG files (processed without cache)
+        processor_kwargs: Keyword arguments for ImageProcessor (a temporary cache_dir is used)
+        configs: List of (workers, torch_threads), default candidate_configs()
+        memory_limit_mb: Skip configurations whose estimated memory exceeds this
+
+    Returns:
+        (best result dict, list of all results)
+    """
+    configs = configs or candidate_configs()
+    results = []
+    per_worker_mb = None
+
+    with tempfile.TemporaryDirectory() as temp_cache:
+        kwargs = dict(processor_kwargs, cache_dir=temp_cache)
+        for workers, threads in configs:
+            if memory_limit_mb and per_worker_mb and per_worker_mb * workers > memory_limit_mb:
+                logger.info(f"Skipping workers={workers}: ~{per_worker_mb * workers:.0f} MB exceeds {memory_limit_mb:.0f} MB")
+                continue
+
+            logger.info(f"Calibrating workers={workers}, torch_threads={threads}...")
+            result = measure_config(image_paths, workers, threads, kwargs)
+            per_worker_mb = max(per_worker_mb or 0, result["peak_rss_mb"] / workers)
+            logger.info(f"  {result['images_per_sec']:.2f} img/s, peak RSS {result['peak_rss_mb']:.0f} MB")
+            results.append(result)
+
+    if not results:
+        raise RuntimeError("No configuration could be calibrated")
+    best = max(results, key=lambda r: r["images_per_sec"])
+    return best, results
+
+def load_profile(profile_path, host=None):
+    """Read the tuned profile of a host, or None if there is none"""
+    if not profile_path or not os.path.exists(profile_path):
+        return None
+    try:
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(host or socket.gethostname())
+    except Exception as e:
+        logger.warning(f"Could not read tuning profile {profile_path}: {e}")
+        return None
+
+def profile_mismatches(profile, backend="torch", precision="fp32"):
+    """
+    Settings of a run that differ from those a profile was tuned with
+
+    Returns:
+        List of "name: tuned -> current" strings, empty when the profile applies
+    """
+    current = {"backend": backend, "precision": precision, "cpu_count": multiprocessing.cpu_count()}
+    return [
+        f"{name}: {profile[name]} -> {value}"
+        for name, value in current.items()
+        if profile.get(name) is not None and profile[name] != value
+    ]
+
+def save_profile(profile_path, profile, host=None):
+    """Store the tuned profile of a host (profiles of other hosts are kept)"""
+    profiles = {}
+    if os.path.exists(profile_path):
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+
+    profiles[host or socket.gethostname()] = dict(
+        profile,
+        cpu_count=multiprocessing.cpu_count(),
+        tuned_at=time.strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(profile_path)), exist_ok=True)
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import queue
+import shutil
+import zipfile
+import logging
+import threading
+from pathlib import Path
+
+from models.utils import find_png_dirs
+from models.sources import list_pngs, target_directory, input_root
+from pipeline.processor import tag_images
+
+logger = logging.getLogger("watch")
+
+def extract_archive(zip_path, output_dir):
+    """
+    Extract a pack ZIP to output_dir/<zip name>, like unzip_files_all.py
+
+    A single top-level folder named after the archive is collapsed so the pack
+    always lands at output_dir/<zip name>/{png,svg,...}.
+
+    Returns:
+        Path of the extracted pack directory
+    """
+    zip_path = Path(zip_path)
+    output_dir = Path(output_dir)
+    extract_dir = output_dir / zip_path.stem
+    temp_dir = output_dir / f"_temp_{zip_path.stem}"
+
+    if temp_dir.exists():
+        shutil.rmtree(temp_dir)
+    temp_dir.mkdir(parents=True)
+
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(temp_dir)
+
+        contents = list(temp_dir.iterdir())
+        source = contents[0] if len(contents) == 1 and contents[0].is_dir() and contents[0].name == zip_path.stem else temp_dir
+        if extract_dir.exists():
+            shutil.rmtree(extract_dir)
+        shutil.move(str(source), str(extract_dir))
+    finally:
+        if temp_dir.exists():
+            shutil.rmtree(temp_dir)
+
+    logger.info(f"Extracted {zip_path.name} to {extract_dir}")
+    return extract_dir
+
+class _EventHandler:
+    """watchdog handler forwarding created/modified/moved paths to the watcher"""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def dispatch(self, event):
+        path = getattr(event, "dest_path", None) or event.src_path
+        self.watcher.notify(path)
+
+class FolderWatcher:
+    """
+    Watch a folder for new pack ZIPs or png directories and tag them with warm models
+
+    Events come from inotify (through watchdog) when available, otherwise from
+    periodic polling. A candidate is only queued once it has been quiet for
+    `debounce` seconds and its size stopped changing, so half-copied archives are
+    never opened. Ready items go through a bounded queue to a single worker that
+    extracts the archive (or reads it in place), tags only that pack's PNGs and exports its metadata.csv.
+    """
+
+    def __init__(self, watch_dir, extract_dir, exporter, processor_factory, cache_dir="data/cache",
+                 debounce=2.0, poll_interval=5.0, queue_size=16, batch_size=8, use_inotify=True):
+        self.watch_dir = Path(watch_dir).resolve()
+        # None: tag new ZIPs in place, without extracting them (see models.sources)
+        self.extract_dir = Path(extract_dir).resolve() if extract_dir else None
+        self.exporter = exporter
+        self.processor_factory = processor_factory
+        self.cache_dir = cache_dir
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.use_inotify = use_inotify
+
+        self.ready = queue.Queue(maxsize=queue_size)
+        self.processor = None
+        self.processed = 0
+
+        # path -> (last event time, last seen size)
+        self._pending = {}
+        # path -> mtime when it was queued, so each pack is processed once per change
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _candidate(self, path):
+        """Map an event path to the pack it belongs to (a ZIP or a <pack>/png directory), or None"""
+        path = Path(path)
+        if path.suffix.lower() == ".zip" and path.parent == self.watch_dir:
+            return path
+        if self.extract_dir and (self.extract_dir in path.parents or path == self.extract_dir):
+            # Our own extraction output is processed directly after extracting
+            return None
+        try:
+            relative = path.relative_to(self.watch_dir)
+        except ValueError:
+            return None
+        if len(relative.parts) >= 2 and relative.parts[1] == "png":
+            return self.watch_dir / relative.parts[0] / "png"
+        return None
+
+    @staticmethod
+    def _size(path):
+        """Total size of a file or of the files in a directory"""
+        if path.is_file():
+            return path.stat().st_size
+        return sum(f.stat().st_size for f in path.glob("*.png"))
+
+    def notify(self, path):
+        """Record activity on a path (restarts its debounce timer)"""
+        candidate = self._candidate(path)
+        if candidate is None:
+            return
+        with self._lock:
+            _, size = self._pending.get(candidate, (None, None))
+            self._pending[candidate] = (time.monotonic(), size)
+
+    def scan(self):
+        """Polling fallback: look for ZIPs and png directories whose mtime changed"""
+        paths = list(self.watch_dir.glob("*.zip")) + [p for p in self.watch_dir.glob("*/png") if p.is_dir()]
+        for path in paths:
+            with self._lock:
+                if path in self._pending:
+                    # Already debouncing, growth is detected through its size
+                    continue
+            if self._seen.get(path) != path.stat().st_mtime:
+                self.notify(path)
+
+    def mark_existing(self):
+        """Treat everything already in the folder as processed (only new arrivals are tagged)"""
+        for path in list(self.watch_dir.glob("*.zip")) + list(self.watch_dir.glob("*/png")):
+            self._seen[path] = path.stat().st_mtime
+
+    def _promote_ready(self):
+        """Queue candidates that were quiet for the debounce period and stopped growing"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._pending.items())
+
+        for path, (last_event, last_size) in items:
+            if now - last_event < self.debounce:
+                continue
+            try:
+                size = self._size(path)
+                mtime = path.stat().st_mtime
+            except OSError:
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+
+            with self._lock:
+                if size != last_size:
+                    # Still growing: wait another debounce period
+                    self._pending[path] = (now, size)
+                    continue
+                self._pending.pop(path, None)
+
+            if self._seen.get(path) == mtime:
+                continue
+            self._seen[path] = mtime
+            logger.info(f"Queued {path} ({self.ready.qsize() + 1}/{self.ready.maxsize})")
+            # Blocks when the worker is behind (bounded queue = backpressure)
+            self.ready.put(path)
+
+    def _get_processor(self):
+        if self.processor is None:
+            self.processor = self.processor_factory()
+        return self.processor
+
+    def _process_png_dir(self, png_dir, input_root_dir):
+        """Tag the PNGs of one pack and export its metadata.csv"""
+        png_files = list_pngs(png_dir)
+        if not png_files:
+            return
+
+        results, misses = tag_images(png_files, self._get_processor, self.cache_dir, self.batch_size)
+        target_dir = target_directory(png_dir)
+        self.exporter.export_metadata(target_dir, results, input_root_dir)
+        logger.info(f"Tagged {target_dir}: {len(results)}/{len(png_files)} images ({misses} new)")
+
+    def process(self, path):
+        """Handle one ready item: extract if it is an archive, then tag and export"""
+        start_time = time.time()
+        if path.suffix.lower() == ".zip" and self.extract_dir is None:
+            for png_dir in find_png_dirs(str(path), zip_sources="only"):
+                self._process_png_dir(png_dir, str(path))
+        elif path.suffix.lower() == ".zip":
+            pack_dir = extract_archive(path, self.extract_dir)
+            for png_dir in find_png_dirs(str(pack_dir)):
+                self._process_png_dir(png_dir, input_root(png_dir))
+        else:
+            self._process_png_dir(path, path.parent.parent)
+        self.processed += 1
+        logger.info(f"Finished {path} in {time.time() - start_time:.1f}s")
+
+    def _worker_loop(self):
+        while not self._stopped.is_set():
+            try:
+                path = self.ready.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self.process(path)
+            except Exception as e:
+                logger.error(f"Error processing {path}: {e}")
+
+    def _start_observer(self):
+        """Start an inotify (watchdog) observer, or return None to fall back to polling"""
+        if not self.use_inotify:
+            return None
+        try:
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.info("watchdog is not installed, falling back to polling")
+            return None
+
+        observer = Observer()
+        observer.schedule(_EventHandler(self), str(self.watch_dir), recursive=True)
+        observer.start()
+        return observer
+
+    def run(self, process_existing=False):
+        """Watch until interrupted"""
+        if self.extract_dir:
+            self.extract_dir.mkdir(parents=True, exist_ok=True)
+        if not process_existing:
+            self.mark_existing()
+
+        worker = threading.Thread(target=self._worker_loop, name="watch-worker", daemon=True)
+        worker.start()
+        observer = self._start_observer()
+        logger.info(f"Watching {self.watch_dir} ({'inotify' if observer else 'polling'}, debounce {self.debounce}s)")
+
+        last_scan = 0.0
+        try:
+            while not self._stopped.is_set():
+                # Polling also runs with inotify, at a low rate, to catch missed events
+                interval = self.poll_interval if observer is None else self.poll_interval * 12
+                if time.monotonic() - last_scan >= interval:
+                    self.scan()
+                    last_scan = time.monotonic()
+                self._promote_ready()
+                time.sleep(min(0.5, self.debounce))
+        except KeyboardInterrupt:
+            logger.info("Stopping watcher")
+        finally:
+            self._stopped.set()
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            worker.join(timeout=10)
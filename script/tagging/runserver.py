@@ -6,39 +6,27 @@ import sys
 import time
 import logging
 import argparse
-import torch
 from pathlib import Path
 
 # Thêm đường dẫn gốc của dự án vào sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-# Thiết lập logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("tagging.log", encoding='utf-8')
-    ]
-)
+# Thiết lập logging bất đồng bộ (ghi file/console trong một thread riêng, dùng chung cho các worker)
+from config import LoggingConfig
+from models.logs import setup_logging
+setup_logging(level=LoggingConfig.LEVEL, log_file=LoggingConfig.LOG_FILE)
 logger = logging.getLogger("main")
 
-# Kiểm tra GPU
-cuda_available = False
-try:
-    cuda_available = torch.cuda.is_available()
-    if cuda_available:
-        logger.info(f"CUDA available - GPU: {torch.cuda.get_device_name(0)}")
-    else:
-        logger.warning("CUDA not available - using CPU")
-except Exception as e:
-    logger.warning(f"Error checking CUDA: {e}")
-
-# Import các module
+# Import các module (nhẹ: torch, transformers, gensim, keybert chỉ được import khi cần tải model;
+# GPU được kiểm tra trong BatchProcessor ngay trước khi tải model)
 from pipeline.batch import BatchProcessor
 from pipeline.export import MetadataExporter
-from config import PathConfig, ModelConfig, ExecutionConfig
+from pipeline.catalog import CatalogWriter
+from pipeline.tuner import load_profile
+from config import PROJECT_ROOT, PathConfig, ModelConfig, ExecutionConfig, ShardConfig, ProfileConfig
+from commands import COMMANDS, run_command
+from models.metrics import METRICS, enable_profiling
 
 def parse_args():
     """Parse command line arguments"""
@@ -49,7 +37,7 @@ def parse_args():
         type=str, 
         nargs='?',  # Làm tham số tùy chọn 
         default=PathConfig.DEFAULT_INPUT_DIR,
-        help=f"Input directory containing icon folders (default: {PathConfig.DEFAULT_INPUT_DIR})"
+        help=f"Input directory containing icon folders or pack ZIPs, or a single pack ZIP (default: {PathConfig.DEFAULT_INPUT_DIR})"
     )
     
     parser.add_argument(
@@ -80,6 +68,40 @@ def parse_args():
         help="Number of parallel workers (default: auto-detect)"
     )
     
+    parser.add_argument(
+        "--torch_threads", 
+        type=int,
+        default=ExecutionConfig.TORCH_THREADS,
+        help="torch intra-op threads per worker (default: CPU count / workers, or the tuning profile)"
+    )
+    
+    parser.add_argument(
+        "--ignore_profile", 
+        action="store_true",
+        help=f"Don't apply the host profile from 'runserver.py tune' ({PathConfig.TUNING_PROFILE})"
+    )
+    
+    parser.add_argument(
+        "--no_share_weights", 
+        action="store_true",
+        help="Load private model copies in each CPU worker instead of sharing the parent's weights"
+    )
+    
+    parser.add_argument(
+        "--shard_dir", 
+        type=str,
+        default=ShardConfig.SHARD_DIR,
+        help="Shared directory for a multi-host run: hosts claim directories through lease files and "
+             "write their own results, merged with 'runserver.py merge-shards' (default: local run)"
+    )
+    
+    parser.add_argument(
+        "--host_id", 
+        type=str,
+        default=None,
+        help="Name of this host in a sharded run (default: hostname-pid)"
+    )
+    
     parser.add_argument(
         "--cache_dir", 
         type=str,
@@ -94,10 +116,141 @@ def parse_args():
         help=f"Number of tags to generate (default: {ModelConfig.NUM_TAGS})"
     )
     
+    parser.add_argument(
+        "--backend", 
+        type=str,
+        choices=["torch", "onnx"],
+        default=ModelConfig.BACKEND,
+        help=f"Inference backend for BLIP/CLIP, onnx runs on CPU only (default: {ModelConfig.BACKEND})"
+    )
+    
+    parser.add_argument(
+        "--onnx_dir", 
+        type=str,
+        default=ModelConfig.ONNX_DIR,
+        help=f"Directory with graphs from 'runserver.py export-onnx' (default: {ModelConfig.ONNX_DIR})"
+    )
+    
+    parser.add_argument(
+        "--intra_op_threads", 
+        type=int,
+        default=ExecutionConfig.INTRA_OP_THREADS,
+        help="ONNX Runtime intra-op threads per worker (default: runtime default)"
+    )
+    
+    parser.add_argument(
+        "--image_timeout", 
+        type=float,
+        default=ExecutionConfig.IMAGE_TIMEOUT,
+        help=f"Per-image time budget in seconds, 0 disables supervision (default: {ExecutionConfig.IMAGE_TIMEOUT})"
+    )
+    
+    parser.add_argument(
+        "--model_store", 
+        type=str,
+        default=PathConfig.MODEL_STORE_DIR,
+        help=f"Local model store from 'runserver.py prepare-models', used offline when present (default: {PathConfig.MODEL_STORE_DIR})"
+    )
+    
+    parser.add_argument(
+        "--precision", 
+        type=str,
+        choices=["fp32", "int8", "bf16"],
+        default=ModelConfig.PRECISION,
+        help=f"CPU inference precision: int8 dynamic quantization or bf16 autocast (default: {ModelConfig.PRECISION})"
+    )
+    
+    parser.add_argument(
+        "--asset_mode", 
+        type=str,
+        choices=["auto", "reflink", "hardlink", "copy"],
+        default=ExecutionConfig.ASSET_MODE,
+        help=f"How svg folders are written to the output: auto tries reflink, then hardlink, then copy; "
+             f"unchanged files are never rewritten (default: {ExecutionConfig.ASSET_MODE})"
+    )
+    
+    parser.add_argument(
+        "--catalog", 
+        type=str,
+        default=PathConfig.CATALOG_PATH,
+        help="Also write a run-level catalog of all images, .parquet (one row group per theme, needs pyarrow) "
+             "or .jsonl, e.g. output/catalog.parquet (default: none)"
+    )
+    
+    parser.add_argument(
+        "--export_workers", 
+        type=int,
+        default=ExecutionConfig.EXPORT_WORKERS,
+        help=f"Directories exported concurrently (default: {ExecutionConfig.EXPORT_WORKERS})"
+    )
+    
+    parser.add_argument(
+        "--zip_sources", 
+        type=str,
+        choices=["auto", "off", "only"],
+        default=ExecutionConfig.ZIP_SOURCES,
+        help=f"Read PNGs straight from pack ZIPs in the input: auto for packs not already extracted there, "
+             f"off for extracted directories only, only for ZIPs only (default: {ExecutionConfig.ZIP_SOURCES})"
+    )
+    
+    parser.add_argument(
+        "--csv_mode", 
+        type=str,
+        choices=["rewrite", "update"],
+        default=ExecutionConfig.CSV_MODE,
+        help=f"metadata.csv export: rewrite regenerates every row, update keeps the existing rows of images "
+             f"whose content did not change; an identical file is never rewritten (default: {ExecutionConfig.CSV_MODE})"
+    )
+    
+    parser.add_argument(
+        "--profile", 
+        type=str,
+        nargs='?',
+        const=ProfileConfig.PROFILE_DIR,
+        default=None,
+        help=f"Profile the run and its workers, writing collapsed stacks for flamegraph tools "
+             f"to a new subdirectory of this directory (default: {ProfileConfig.PROFILE_DIR})"
+    )
+    
+    parser.add_argument(
+        "--profile_mode", 
+        type=str,
+        choices=["sample", "cprofile"],
+        default=ProfileConfig.MODE,
+        help=f"Stack sampling or deterministic cProfile (default: {ProfileConfig.MODE})"
+    )
+    
     return parser.parse_args()
 
+def start_profiling(args):
+    """Bật profiling cho tiến trình chính, trả về cấu hình để truyền cho các worker"""
+    # script/profiling.py nằm ở thư mục gốc của dự án
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.append(str(PROJECT_ROOT))
+    from script import profiling
+    
+    profile_options = profiling.options(profiling.run_directory(args.profile), args.profile_mode,
+                                        ProfileConfig.INTERVAL)
+    enable_profiling(profile_options)
+    logger.info(f"Profiling ({args.profile_mode}) to {profile_options['output_dir']}")
+    return profile_options
+
+def finish_profiling(profile_options):
+    """Dừng profiling và gộp profile của tất cả các tiến trình"""
+    from script import profiling
+    
+    METRICS.stage_hook = None
+    profiling.stop()
+    merged = profiling.merge_profiles(profile_options["output_dir"])
+    if merged:
+        logger.info(f"Merged profile (collapsed stacks): {merged}")
+
 def main():
     """Entrypoint chính của ứng dụng"""
+    # Lệnh phụ (vd: export-onnx) được chuyển cho module tương ứng
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        return run_command(sys.argv[1], sys.argv[2:])
+    
     # Parse arguments
     args = parse_args()
     
@@ -105,48 +258,106 @@ def main():
     logger.info("=== CLIP Interrogator - Icon Metadata Generator ===")
     logger.info(f"Input directory: {args.input_dir}")
     logger.info(f"Output directory: {args.output_dir}")
-    logger.info(f"Use GPU: {args.gpu and cuda_available}")
+    logger.info(f"Use GPU (if available): {args.gpu and args.backend == 'torch'}")
     logger.info(f"Batch size: {args.batch_size}")
     logger.info(f"Cache: {args.cache_dir}")
     logger.info(f"Number of tags: {args.num_tags}")
+    logger.info(f"Backend: {args.backend}")
+    logger.info(f"Precision: {args.precision}")
     
-    # Kiểm tra thư mục đầu vào
-    if not os.path.isdir(args.input_dir):
+    # Kiểm tra thư mục đầu vào (hoặc một file ZIP duy nhất)
+    if not os.path.isdir(args.input_dir) and not (args.zip_sources != "off" and args.input_dir.lower().endswith(".zip")
+                                                  and os.path.isfile(args.input_dir)):
         logger.error(f"Input directory does not exist: {args.input_dir}")
         return 1
     
+    os.makedirs(args.cache_dir, exist_ok=True)
+    
+    # Backend onnx chỉ chạy trên CPU
+    use_gpu = args.gpu and args.backend == "torch"
+    
+    # Profiling chỉ được bật khi có --profile (không tốn gì khi tắt)
+    profile_options = start_profiling(args) if args.profile else None
+    
     # Bắt đầu xử lý
     start_time = time.time()
     
     try:
         # Khởi tạo batch processor
         batch_processor = BatchProcessor(
-            use_gpu=args.gpu and cuda_available,
+            use_gpu=use_gpu,
             batch_size=args.batch_size,
             workers=args.workers,
-            cache_dir=args.cache_dir
+            cache_dir=args.cache_dir,
+            model_options={
+                "backend": args.backend,
+                "onnx_dir": args.onnx_dir,
+                "intra_op_threads": args.intra_op_threads,
+                "precision": args.precision,
+                "model_store_dir": args.model_store,
+                "torch_threads": args.torch_threads
+            },
+            image_timeout=args.image_timeout,
+            tuning_profile=None if args.ignore_profile else load_profile(PathConfig.TUNING_PROFILE),
+            memory_margin=ExecutionConfig.MEMORY_SAFETY_MARGIN,
+            memory_pressure_percent=ExecutionConfig.MEMORY_PRESSURE_PERCENT,
+            share_weights=ExecutionConfig.SHARE_WEIGHTS and not args.no_share_weights,
+            shared_memory_weights=ExecutionConfig.SHARE_WEIGHTS_SHM,
+            zip_sources=args.zip_sources,
+            shard_options={
+                "shard_dir": args.shard_dir,
+                "host_id": args.host_id,
+                "lease_ttl": ShardConfig.LEASE_TTL,
+                "heartbeat": ShardConfig.HEARTBEAT
+            } if args.shard_dir else None,
+            profile_options=profile_options
         )
         
         # Xử lý hàng loạt
         logger.info("Starting batch processing...")
         batch_results = batch_processor.process_batch(args.input_dir)
         
+        # Chạy phân tán: mỗi máy chỉ ghi kết quả của mình, xuất file cuối cùng bằng merge-shards
+        if args.shard_dir:
+            logger.info(f"Shard finished: {len(batch_results)} directories processed by this host. "
+                        f"Run 'runserver.py merge-shards {args.shard_dir}' once all hosts are done")
+            return 0
+        
         if not batch_results:
             logger.error("No results were generated!")
             return 1
         
-        # Khởi tạo exporter
-        exporter = MetadataExporter(output_base_dir=args.output_dir)
+        # Khởi tạo exporter (và catalog của cả lần chạy nếu có --catalog)
+        catalog = CatalogWriter(args.catalog) if args.catalog else None
+        exporter = MetadataExporter(output_base_dir=args.output_dir, asset_mode=args.asset_mode,
+                                    workers=args.export_workers, catalog=catalog, csv_mode=args.csv_mode)
         
         # Xuất kết quả
         logger.info("Starting export process...")
-        success_count = exporter.export_batch_results(batch_results, args.input_dir)
+        try:
+            success_count = exporter.export_batch_results(batch_results, args.input_dir)
+        finally:
+            if catalog is not None:
+                catalog.close()
+        
+        # Báo cáo các ảnh vượt quá thời gian cho phép
+        if batch_processor.failures:
+            exporter.export_failure_report(batch_processor.failures)
         
         # Tính thời gian
         elapsed_time = time.time() - start_time
         hours, remainder = divmod(elapsed_time, 3600)
         minutes, seconds = divmod(remainder, 60)
         
+        # Báo cáo JSON: thời gian từng bước, bộ đếm, tỷ lệ cache hit
+        exporter.export_run_report(METRICS.report(
+            elapsed_sec=elapsed_time,
+            directories=len(batch_results),
+            directories_exported=success_count,
+            images=sum(len(items) for items in batch_results.values()),
+            images_failed_budget=sum(len(items) for items in batch_processor.failures.values())
+        ))
+        
         logger.info(f"Completed! Processed {success_count} directories")
         logger.info(f"Total time: {int(hours)}h {int(minutes)}m {int(seconds)}s")
         
@@ -155,6 +366,10 @@ def main():
     except Exception as e:
         logger.error(f"Unhandled error: {e}", exc_info=True)
         return 1
+    
+    finally:
+        if profile_options:
+            finish_profiling(profile_options)
 
 if __name__ == "__main__":
     sys.exit(main())
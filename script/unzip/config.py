@@ -23,14 +23,23 @@ class PathConfig:
         'CANVA_ALL_OUTPUT_DIR', 
         os.path.join(os.environ.get('CANVA_ZIP_INPUT_DIR', str(PROJECT_ROOT / "sample")), "unziped_all")
     )
+    
+    # Base directory of --profile output
+    PROFILE_DIR = os.environ.get('CANVA_PROFILE_DIR', str(PROJECT_ROOT / "profiles"))
 
 # Execution configuration
 class ExecutionConfig:
     # Default mode - keep SVG only or keep all
-    DEFAULT_MODE = os.environ.get('CANVA_UNZIP_MODE', "all")  # "svg_only" or "all"
+    DEFAULT_MODE = os.environ.get('CANVA_UNZIP_MODE', "all")  # "svg_only", "all" or "both" (main.py)
     
-    # Whether to overwrite existing directories
+    # Whether to overwrite existing directories that are not in the manifest (unchanged archives are never re-extracted)
     OVERWRITE_EXISTING = os.environ.get('CANVA_UNZIP_OVERWRITE', "True").lower() in ('true', '1', 'yes')
+    
+    # Archives extracted concurrently (0 = automatic: one per core for deflated archives, IO_WORKERS for stored ones)
+    WORKERS = int(os.environ.get('CANVA_UNZIP_WORKERS', "0"))
+    
+    # Concurrent archives when extraction is disk bound (mostly stored members)
+    IO_WORKERS = int(os.environ.get('CANVA_UNZIP_IO_WORKERS', "4"))
 
 # Print configuration information when module is imported
 if __name__ == "__main__":
@@ -39,4 +48,5 @@ if __name__ == "__main__":
     print(f"SVG output directory: {PathConfig.DEFAULT_SVG_OUTPUT_DIR}")
     print(f"ALL output directory: {PathConfig.DEFAULT_ALL_OUTPUT_DIR}")
     print(f"Default mode: {ExecutionConfig.DEFAULT_MODE}")
-    print(f"Overwrite existing directories: {ExecutionConfig.OVERWRITE_EXISTING}") 
\ No newline at end of file
+    print(f"Overwrite existing directories: {ExecutionConfig.OVERWRITE_EXISTING}")
+    print(f"Workers: {ExecutionConfig.WORKERS or 'auto'} (disk bound: {ExecutionConfig.IO_WORKERS})") 
\ No newline at end of file
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import zipfile
+import shutil
+import sys
+from pathlib import Path
+
+# Import configuration
+try:
+    from config import PROJECT_ROOT, PathConfig, ExecutionConfig
+except ImportError:
+    print("Error: Could not import configuration file. Ensure config.py exists.")
+    sys.exit(1)
+
+# Shared opt-in profiler (script/profiling.py)
+sys.path.append(str(PROJECT_ROOT))
+from script import profiling
+from parallel import process_archives
+from members import member_parts, find_svg_prefix, top_level_strip, member_counts, write_member, link_or_copy
+from manifest import Manifest, archive_fingerprint
+
+# "both" writes the 'all' and 'svg_only' trees in a single pass over each archive
+MODES = ("all", "svg_only", "both")
+
+def output_dirs(input_dir, input_path, mode):
+    """
+    Output tree of each requested mode.
+
+    Args:
+        input_dir (str): Input directory as given (the defaults apply to the default input)
+        input_path (Path): Resolved input directory
+        mode (str): "all", "svg_only" or "both"
+
+    Returns:
+        dict: "all" and/or "svg_only" -> output directory
+    """
+    default_input = input_dir == PathConfig.DEFAULT_INPUT_DIR
+    dirs = {}
+    if mode in ("all", "both"):
+        dirs["all"] = Path(PathConfig.DEFAULT_ALL_OUTPUT_DIR) if default_input else input_path / "unziped_all"
+    if mode in ("svg_only", "both"):
+        dirs["svg_only"] = Path(PathConfig.DEFAULT_SVG_OUTPUT_DIR) if default_input else input_path / "unziped_svg_only"
+    return dirs
+
+
+def unzip(input_dir=None, mode=None, workers=None, profile_dir=None, profile_mode="sample", force=False):
+    """
+    Extract the ZIP files of a directory into the 'all' tree, the 'svg_only' tree, or both.
+
+    Args:
+        input_dir (str): Path to directory containing ZIP files
+        mode (str): "all", "svg_only" or "both" (default: ExecutionConfig.DEFAULT_MODE)
+        workers (int): Archives extracted concurrently (default: ExecutionConfig.WORKERS, 0 = automatic)
+        profile_dir (str): Profile run directory, to profile the worker processes too
+        profile_mode (str): Profiling mode of the worker processes
+        force (bool): Extract every archive, even those whose packs are up to date
+    """
+    # Use default values if not provided
+    if input_dir is None:
+        input_dir = PathConfig.DEFAULT_INPUT_DIR
+    if mode is None:
+        mode = ExecutionConfig.DEFAULT_MODE
+    if workers is None:
+        workers = ExecutionConfig.WORKERS
+
+    # Convert to absolute path
+    input_path = Path(input_dir).resolve()
+
+    # Check if directory exists
+    if not input_path.is_dir():
+        print(f"Error: '{input_dir}' is not a valid directory")
+        return False
+
+    # Create output directories
+    dirs = output_dirs(input_dir, input_path, mode)
+    for output_dir in dirs.values():
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Input directory: {input_path}")
+    for tree, output_dir in dirs.items():
+        print(f"Output directory ({tree}): {output_dir}")
+
+    # Find all zip files
+    zip_files = list(input_path.glob("*.zip"))
+
+    if not zip_files:
+        print(f"No ZIP files found in '{input_dir}'")
+        return False
+
+    print(f"Found {len(zip_files)} ZIP files to process")
+
+    # Only new or changed archives are extracted, into the trees where they are missing or stale
+    manifests = {tree: Manifest(output_dir) for tree, output_dir in dirs.items()}
+    
+    def plan(zip_path):
+        plans = {tree: manifest.plan(zip_path, overwrite=ExecutionConfig.OVERWRITE_EXISTING, force=force)
+                 for tree, manifest in manifests.items()}
+        targets = {tree: dirs[tree] for tree, action in plans.items() if action == "extract"}
+        if targets:
+            return "extract", targets
+        return ("skipped" if "skipped" in plans.values() else "up_to_date"), None
+    
+    def on_result(zip_path, targets, result):
+        for tree in targets:
+            manifests[tree].record(zip_path, result.get("trees", {}).get(tree, result))
+    
+    summary = process_archives(process_zip_file, zip_files, dirs, workers=workers,
+                               profile_dir=profile_dir, profile_mode=profile_mode, plan=plan, on_result=on_result)
+
+    if summary.get("failed"):
+        print(f"{summary['failed']} ZIP files could not be extracted")
+    else:
+        print("All files have been extracted successfully!")
+    return True
+
+
+def process_zip_file(zip_path, output_dirs):
+    """
+    Process a ZIP file: decompress each member once into every requested tree.
+
+    In the 'all' tree the pack gets the whole archive (a top-level directory
+    named like the archive is flattened, as unzip_files_all.py does); in the
+    'svg_only' tree it gets the shallowest svg directory only. A member needed
+    by both trees is written once and hardlinked into the other (copied if the
+    trees are on different filesystems). Each pack is assembled in a temporary
+    directory and replaces the previous one at the end. Which trees need the
+    archive is decided by the caller (see manifest.Manifest.plan).
+
+    Args:
+        zip_path (Path): Path to the ZIP file
+        output_dirs (dict): "all" and/or "svg_only" -> output directory
+
+    Returns:
+        dict: status ("extracted", "no_svg" or "failed"), files and bytes written,
+        members linked between the trees, fingerprint of the archive, and the same
+        per tree under "trees"
+    """
+    zip_name = zip_path.stem
+    extract_dirs = {tree: Path(output_dir) / zip_name for tree, output_dir in output_dirs.items()}
+    pack_dirs = {tree: Path(output_dir) / f"_pack_{zip_name}" for tree, output_dir in output_dirs.items()}
+
+    print(f"\nProcessing: {zip_path.name}")
+
+    # Remove temporary directories left by a previous failed run
+    for pack_dir in pack_dirs.values():
+        if pack_dir.exists():
+            shutil.rmtree(pack_dir)
+
+    files = total_bytes = linked = 0
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            infos = zip_ref.infolist()
+            fingerprint = archive_fingerprint(zip_path, infos)
+            trees = {}
+            print(f"Number of files/directories in {zip_path.name}: {len(infos)}")
+
+            # 'all' tree: drop a single top-level directory named like the archive
+            all_strip = top_level_strip(infos, zip_name) if "all" in pack_dirs else 0
+
+            # 'svg_only' tree: the svg directory, found from the central directory
+            svg_prefix = None
+            if "svg_only" in pack_dirs:
+                svg_prefix = find_svg_prefix(zip_ref.namelist())
+                if svg_prefix is None:
+                    print(f"Warning: No 'svg' directory found in {zip_path.name}")
+                    trees["svg_only"] = {"status": "no_svg", "fingerprint": fingerprint}
+                    del pack_dirs["svg_only"], extract_dirs["svg_only"]
+                    if not pack_dirs:
+                        return dict(trees["svg_only"], trees=trees)
+                else:
+                    print(f"Found SVG directory: {svg_prefix.rstrip('/')}")
+
+            for pack_dir in pack_dirs.values():
+                pack_dir.mkdir()
+            if svg_prefix is not None:
+                (pack_dirs["svg_only"] / "svg").mkdir()
+
+            with profiling.stage("extract"):
+                for info in infos:
+                    targets = []
+                    if "all" in pack_dirs:
+                        parts = member_parts(info.filename)[all_strip:]
+                        if parts:
+                            targets.append(pack_dirs["all"].joinpath(*parts))
+                    name = info.filename.replace("\\", "/")
+                    if svg_prefix is not None and name.startswith(svg_prefix):
+                        parts = member_parts(name[len(svg_prefix):])
+                        if parts:
+                            targets.append(pack_dirs["svg_only"].joinpath("svg", *parts))
+                    if not targets:
+                        continue
+
+                    if info.is_dir():
+                        for target in targets:
+                            target.mkdir(parents=True, exist_ok=True)
+                        continue
+
+                    # Decompress once, link the other tree to the same bytes
+                    write_member(zip_ref, info, targets[0])
+                    files += 1
+                    total_bytes += info.file_size
+                    for target in targets[1:]:
+                        linked += link_or_copy(targets[0], target)
+
+        # Swap the finished packs in
+        for tree, pack_dir in pack_dirs.items():
+            if extract_dirs[tree].exists():
+                shutil.rmtree(extract_dirs[tree])
+            pack_dir.rename(extract_dirs[tree])
+            print(f"Successfully extracted to {extract_dirs[tree]}")
+
+        # Per-tree counts from the central directory
+        if "all" in pack_dirs:
+            tree_files, tree_dirs = member_counts(infos, all_strip)
+            tree_bytes = sum(info.file_size for info in infos if not info.is_dir())
+            trees["all"] = {"status": "extracted", "files": tree_files, "bytes": tree_bytes, "fingerprint": fingerprint}
+            print(f"Total (all): {tree_files} files, {tree_dirs} directories")
+        if "svg_only" in pack_dirs:
+            svg_infos = [info for info in infos if info.filename.replace("\\", "/").startswith(svg_prefix)]
+            tree_files, tree_dirs = member_counts(svg_infos)
+            tree_bytes = sum(info.file_size for info in svg_infos if not info.is_dir())
+            trees["svg_only"] = {"status": "extracted", "files": tree_files, "bytes": tree_bytes, "fingerprint": fingerprint}
+            print(f"Total (svg_only): {tree_files} files")
+
+        return {"status": "extracted", "files": files, "bytes": total_bytes, "linked": linked,
+                "fingerprint": fingerprint, "trees": trees}
+
+    except Exception as e:
+        print(f"Error extracting {zip_path.name}: {e}")
+        return {"status": "failed"}
+
+    finally:
+        for pack_dir in pack_dirs.values():
+            if pack_dir.exists():
+                with profiling.stage("cleanup"):
+                    shutil.rmtree(pack_dir, ignore_errors=True)
+
+
+def main():
+    """Main function to handle parameters and run the program"""
+    parser = argparse.ArgumentParser(description="Extract the ZIP files in a directory into the 'all' and/or 'svg_only' trees")
+    parser.add_argument("input_dir", nargs="?", default=None,
+                        help=f"Directory containing ZIP files (default: {PathConfig.DEFAULT_INPUT_DIR})")
+    parser.add_argument("--mode", choices=MODES, default=ExecutionConfig.DEFAULT_MODE,
+                        help="all: whole archives, svg_only: svg directories only, both: both trees in one pass "
+                             f"(default: {ExecutionConfig.DEFAULT_MODE})")
+    parser.add_argument("--workers", type=int, default=ExecutionConfig.WORKERS,
+                        help="Archives extracted concurrently; 0 = one per core for deflated archives, "
+                             f"{ExecutionConfig.IO_WORKERS} for stored ones (default: {ExecutionConfig.WORKERS})")
+    parser.add_argument("--force", action="store_true",
+                        help="Extract every ZIP again, even those unchanged since they were last extracted")
+    parser.add_argument("--profile", nargs="?", const=PathConfig.PROFILE_DIR, default=None,
+                        help=f"Profile the run, writing collapsed stacks for flamegraph tools (default: {PathConfig.PROFILE_DIR})")
+    parser.add_argument("--profile_mode", choices=profiling.MODES, default="sample",
+                        help="Stack sampling or deterministic cProfile (default: sample)")
+    args = parser.parse_args()
+
+    with profiling.profile_run(args.profile, role="unzip", mode=args.profile_mode) as profile_dir:
+        success = unzip(args.input_dir, mode=args.mode, workers=args.workers, profile_dir=profile_dir,
+                        profile_mode=args.profile_mode, force=args.force)
+
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import zipfile
+from pathlib import Path
+
+# One manifest per output tree, next to the packs
+MANIFEST_NAME = ".unzip_manifest.json"
+
+
+def crc_digest(infos):
+    """
+    Digest of the member names, CRCs and sizes listed in the central directory.
+
+    Two archives with the same digest extract to the same files, whatever their
+    compression or timestamps.
+
+    Args:
+        infos (list): ZipInfo of every member
+
+    Returns:
+        str: blake2b hex digest
+    """
+    digest = hashlib.blake2b()
+    for name, crc, size in sorted((info.filename, info.CRC, info.file_size) for info in infos):
+        digest.update(f"{name}\0{crc:08x}\0{size}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+def archive_fingerprint(zip_path, infos=None):
+    """
+    Fingerprint of an archive: file size, mtime and CRC set.
+
+    Args:
+        zip_path (Path): Path to the ZIP file
+        infos (list): Members, when the archive is already open (read from the central directory otherwise)
+
+    Returns:
+        dict: size, mtime_ns, crc
+    """
+    stat = os.stat(zip_path)
+    if infos is None:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            infos = zip_ref.infolist()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "crc": crc_digest(infos)}
+
+
+class Manifest:
+    """
+    Fingerprints of the archives extracted into one output tree.
+
+    An archive is extracted again only when its pack is missing or its
+    fingerprint changed. A different size means changed; the same size and
+    mtime means unchanged; the same size with another mtime (copied, touched)
+    is decided by the CRC set, read from the central directory without
+    decompressing anything.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_NAME
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def plan(self, zip_path, overwrite=False, force=False):
+        """
+        What to do with an archive in this tree.
+
+        Args:
+            zip_path (Path): Path to the ZIP file
+            overwrite (bool): Replace packs that exist but were not extracted by a manifest run
+            force (bool): Extract even if the pack is up to date
+
+        Returns:
+            str: "extract", "up_to_date" or "skipped" (existing pack unknown to the manifest, not overwriting)
+        """
+        extract_dir = self.output_dir / zip_path.stem
+        entry = self.entries.get(zip_path.name)
+        if force:
+            return "extract"
+        if entry is None:
+            return "skipped" if extract_dir.exists() and not overwrite else "extract"
+        if not extract_dir.exists() and entry.get("status") != "no_svg":
+            return "extract"
+
+        stat = os.stat(zip_path)
+        if stat.st_size != entry["size"]:
+            return "extract"
+        if stat.st_mtime_ns != entry["mtime_ns"]:
+            try:
+                crc = archive_fingerprint(zip_path)["crc"]
+            except (OSError, zipfile.BadZipFile):
+                return "extract"
+            if crc != entry["crc"]:
+                return "extract"
+            # Same content under a new mtime: remember it so the next run takes the fast path
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self.save()
+        return "up_to_date"
+
+    def record(self, zip_path, result):
+        """
+        Store the outcome of an extraction (extracted or no svg directory); forget the archive otherwise.
+
+        Args:
+            zip_path (Path): Path to the ZIP file
+            result (dict): Result of process_zip_file, with the "fingerprint" of the archive
+        """
+        if result.get("status") in ("extracted", "no_svg") and result.get("fingerprint"):
+            self.entries[zip_path.name] = dict(result["fingerprint"], status=result["status"],
+                                               files=result.get("files", 0), bytes=result.get("bytes", 0))
+        else:
+            self.entries.pop(zip_path.name, None)
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+
+
+def member_parts(name):
+    """
+    Path components of a member name, sanitized the way ZipFile.extract does.
+    
+    Drive letters, empty, '.' and '..' components are dropped, so the result
+    always stays inside the extraction directory.
+    
+    Args:
+        name (str): Member name ('/' or '\\' separated)
+        
+    Returns:
+        list: Components (empty for the extraction directory itself)
+    """
+    name = os.path.splitdrive(name.replace("\\", "/"))[1]
+    return [part for part in name.split("/") if part not in ("", ".", "..")]
+
+
+def top_level_strip(infos, zip_name):
+    """
+    Number of leading components to drop so a pack is not nested in a directory named like its archive.
+    
+    Args:
+        infos (list): ZipInfo of every member
+        zip_name (str): Archive name without extension
+        
+    Returns:
+        int: 1 if every member is inside a single top-level directory named zip_name, else 0
+    """
+    tops = set()
+    nested = False
+    for info in infos:
+        parts = member_parts(info.filename)
+        if not parts:
+            continue
+        tops.add(parts[0])
+        nested = nested or len(parts) > 1 or info.is_dir()
+    return 1 if tops == {zip_name} and nested else 0
+
+
+def member_counts(infos, strip=0):
+    """
+    Files and directories a set of members extracts to, from the central directory only.
+    
+    Directories count once, whether they have their own entry or only appear
+    in the paths of files.
+    
+    Args:
+        infos (list): ZipInfo of the members
+        strip (int): Leading components dropped from every path (see top_level_strip)
+        
+    Returns:
+        tuple: (files, directories)
+    """
+    files = set()
+    dirs = set()
+    for info in infos:
+        parts = tuple(member_parts(info.filename)[strip:])
+        if not parts:
+            continue
+        if info.is_dir():
+            dirs.add(parts)
+        else:
+            files.add(parts)
+        for depth in range(1, len(parts)):
+            dirs.add(parts[:depth])
+    return len(files), len(dirs)
+
+
+def write_member(zip_ref, info, target):
+    """Decompress one file member to target, creating its parent directories."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with zip_ref.open(info) as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def link_or_copy(src, dst):
+    """
+    Hardlink dst to src, copying when the filesystem can't link them.
+    
+    Returns:
+        bool: True if dst is a hardlink
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        shutil.copyfile(src, dst)
+        return False
+
+
+def find_svg_prefix(names):
+    """
+    Archive path of the svg directory to keep, from the member names only.
+    
+    The shallowest directory named 'svg' wins (first in archive order on a tie).
+    This deliberately differs from the former rglob over the extracted tree,
+    which walked depth-first in filesystem order and could pick a deeper svg
+    directory from an earlier sibling; the choice no longer depends on the
+    filesystem, only on the archive.
+    
+    Args:
+        names (list): Member names of the archive
+        
+    Returns:
+        str: Prefix ending with '/', or None if the archive has no svg directory
+    """
+    best = None
+    for name in names:
+        parts = name.replace("\\", "/").split("/")
+        # Directories containing this member (all of it for a directory entry "a/svg/")
+        for depth, part in enumerate(parts[:-1]):
+            if part == "svg":
+                if best is None or depth < best[0]:
+                    best = (depth, "/".join(parts[:depth + 1]) + "/")
+                break
+    return best[1] if best else None
+
+
+def extract_members(zip_ref, prefix, target_dir):
+    """
+    Stream the members under prefix into target_dir, decompressing nothing else.
+    
+    Args:
+        zip_ref (ZipFile): Open archive
+        prefix (str): Archive directory to extract (see find_svg_prefix)
+        target_dir (Path): Directory receiving the content of prefix
+        
+    Returns:
+        tuple: (files written, bytes written)
+    """
+    files = total_bytes = 0
+    for info in zip_ref.infolist():
+        name = info.filename.replace("\\", "/")
+        if not name.startswith(prefix):
+            continue
+        parts = member_parts(name[len(prefix):])
+        if not parts:
+            continue
+        
+        target = target_dir.joinpath(*parts)
+        if info.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            continue
+        write_member(zip_ref, info, target)
+        files += 1
+        total_bytes += info.file_size
+    return files, total_bytes
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import time
+import zipfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import ExecutionConfig
+
+# Shared opt-in profiler (script/profiling.py), on sys.path through the calling script
+from script import profiling
+
+# Share of the archive bytes that must be compressed for extraction to be CPU bound (deflate)
+COMPRESSED_SHARE = 0.5
+
+def archive_stats(zip_path):
+    """
+    Sizes from the ZIP central directory (nothing is decompressed)
+
+    Returns:
+        Tuple (stored bytes, compressed bytes, uncompressed bytes of compressed members)
+    """
+    stored = compressed = inflated = 0
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.compress_type == zipfile.ZIP_STORED:
+                stored += info.file_size
+            else:
+                compressed += info.compress_size
+                inflated += info.file_size
+    return stored, compressed, inflated
+
+def choose_workers(zip_files, workers=0):
+    """
+    Number of archives to extract at once
+
+    With workers=0 the archives decide: when most of their content is deflated,
+    extraction is CPU bound and gets one process per core; when it is mostly
+    stored, the disk is the limit and more processes only add seeks, so it gets
+    ExecutionConfig.IO_WORKERS.
+
+    Args:
+        zip_files: ZIP paths
+        workers: Requested number of processes (0 = automatic)
+
+    Returns:
+        Number of processes, never more than the number of archives
+    """
+    if workers <= 0:
+        stored = inflated = 0
+        for zip_path in zip_files:
+            try:
+                s, _, i = archive_stats(zip_path)
+            except (OSError, zipfile.BadZipFile):
+                continue
+            stored += s
+            inflated += i
+        total = stored + inflated
+        if total and inflated / total >= COMPRESSED_SHARE:
+            workers = os.cpu_count() or 1
+        else:
+            workers = ExecutionConfig.IO_WORKERS
+    return max(1, min(workers, len(zip_files)))
+
+def _init_worker(profile_options):
+    if profile_options:
+        profiling.start_worker(profile_options, role="unzip-worker")
+
+def _run_one(process_zip_file, zip_path, output_dir):
+    """
+    Process one archive, capturing what it prints so archives don't interleave
+
+    Returns:
+        Tuple (printed text, result dict)
+    """
+    buffer = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(buffer):
+        try:
+            result = process_zip_file(zip_path, output_dir) or {}
+        except Exception as e:
+            print(f"Error processing {zip_path.name}: {e}")
+            result = {"status": "failed"}
+    result.setdefault("status", "extracted")
+    result["zip"] = zip_path.name
+    result["seconds"] = time.perf_counter() - start
+    return buffer.getvalue(), result
+
+def process_archives(process_zip_file, zip_files, output_dir, workers=0, profile_dir=None, profile_mode="sample",
+                     plan=None, on_result=None):
+    """
+    Run process_zip_file over all archives in a process pool and print a summary
+
+    Each archive is still extracted by a single process into its own temporary
+    directory and moved into place, so a failure never leaves a half-written pack.
+
+    Args:
+        process_zip_file: Function (zip_path, output_dir) -> result dict with "status", "files", "bytes"
+                          and optionally "linked"
+        zip_files: ZIP paths
+        output_dir: Passed to process_zip_file (directory receiving one subdirectory per archive)
+        workers: Number of processes (0 = automatic, see choose_workers; 1 = in this process)
+        profile_dir: Profile run directory (see profiling.profile_run) to profile the workers too
+        profile_mode: Profiling mode of the workers
+        plan: Function (zip_path) -> (status, output_dir): "extract" and the output_dir to pass to
+              process_zip_file, or the status of an archive left alone ("up_to_date", "skipped")
+        on_result: Function (zip_path, output_dir, result) called in this process after each extraction
+
+    Returns:
+        Summary dict: archives, workers, seconds and per-status counts, files, bytes, linked
+    """
+    start = time.perf_counter()
+    results = []
+    jobs = []
+    for zip_path in zip_files:
+        status, target = plan(zip_path) if plan else ("extract", output_dir)
+        if status == "extract":
+            jobs.append((zip_path, target))
+        else:
+            results.append({"zip": zip_path.name, "status": status, "seconds": 0.0})
+    if results:
+        print(f"{len(results)} ZIP files are up to date or skipped, {len(jobs)} to extract")
+
+    def finish(zip_path, target, output, result):
+        sys.stdout.write(output)
+        results.append(result)
+        if on_result is not None:
+            on_result(zip_path, target, result)
+
+    workers = choose_workers([zip_path for zip_path, _ in jobs], workers)
+    if jobs:
+        print(f"Extracting with {workers} process{'es' if workers > 1 else ''}")
+    if workers == 1:
+        for zip_path, target in jobs:
+            finish(zip_path, target, *_run_one(process_zip_file, zip_path, target))
+    else:
+        profile_options = profiling.options(profile_dir, profile_mode) if profile_dir else None
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(profile_options,)) as executor:
+            futures = {executor.submit(_run_one, process_zip_file, zip_path, target): (zip_path, target)
+                       for zip_path, target in jobs}
+            for future in as_completed(futures):
+                finish(*futures[future], *future.result())
+
+    summary = {"archives": len(results), "workers": workers, "seconds": time.perf_counter() - start,
+               "files": 0, "bytes": 0, "linked": 0}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+        for key in ("files", "bytes", "linked"):
+            summary[key] += result.get(key, 0)
+    print_summary(summary, results)
+    return summary
+
+def print_summary(summary, results):
+    """Print the aggregated counts of a run, and the archives that failed"""
+    seconds = summary["seconds"]
+    mb = summary["bytes"] / (1 << 20)
+    statuses = ", ".join(f"{summary[s]} {s}" for s in ("extracted", "up_to_date", "skipped", "no_svg", "failed") if summary.get(s))
+    print("\n=== Summary ===")
+    print(f"Archives: {summary['archives']} ({statuses}) with {summary['workers']} "
+          f"process{'es' if summary['workers'] > 1 else ''} in {seconds:.1f}s")
+    print(f"Written: {summary['files']} files, {mb:.1f} MB "
+          f"({mb / seconds if seconds else 0:.1f} MB/s, {summary['archives'] / seconds if seconds else 0:.1f} archives/s)")
+    if summary["linked"]:
+        print(f"Hardlinked: {summary['linked']} files shared between the output trees")
+    failed = sorted(r["zip"] for r in results if r["status"] == "failed")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
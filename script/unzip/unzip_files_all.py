@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import argparse
 import zipfile
 import shutil
 import sys
@@ -9,18 +10,29 @@ from pathlib import Path
 
 # Import configuration
 try:
-    from config import PathConfig, ExecutionConfig
+    from config import PROJECT_ROOT, PathConfig, ExecutionConfig
 except ImportError:
     print("Error: Could not import configuration file. Ensure config.py exists.")
     sys.exit(1)
 
-def unzip_all_files(input_dir=None):
+# Shared opt-in profiler (script/profiling.py)
+sys.path.append(str(PROJECT_ROOT))
+from script import profiling
+from parallel import process_archives
+from members import member_counts
+from manifest import Manifest, archive_fingerprint
+
+def unzip_all_files(input_dir=None, workers=None, profile_dir=None, profile_mode="sample", force=False):
     """
     Extract all contents of ZIP files in a directory.
     Creates an 'unziped_all' directory to store the extracted content.
     
     Args:
         input_dir (str): Path to directory containing ZIP files
+        workers (int): Archives extracted concurrently (default: ExecutionConfig.WORKERS, 0 = automatic)
+        profile_dir (str): Profile run directory, to profile the worker processes too
+        profile_mode (str): Profiling mode of the worker processes
+        force (bool): Extract every archive, even those whose pack is up to date
     """
     # Use default path if not provided
     if input_dir is None:
@@ -50,21 +62,38 @@ def unzip_all_files(input_dir=None):
     
     print(f"Found {len(zip_files)} ZIP files to process")
     
-    # Process each zip file
-    for zip_path in zip_files:
-        process_zip_file(zip_path, output_dir)
+    # Only new or changed archives are extracted (see manifest.py)
+    manifest = Manifest(output_dir)
+    
+    def plan(zip_path):
+        return manifest.plan(zip_path, overwrite=ExecutionConfig.OVERWRITE_EXISTING, force=force), output_dir
+    
+    # Process the zip files concurrently, one process per archive at a time
+    if workers is None:
+        workers = ExecutionConfig.WORKERS
+    summary = process_archives(process_zip_file, zip_files, output_dir, workers=workers,
+                               profile_dir=profile_dir, profile_mode=profile_mode, plan=plan,
+                               on_result=lambda zip_path, _, result: manifest.record(zip_path, result))
     
-    print("All files have been extracted successfully!")
+    if summary.get("failed"):
+        print(f"{summary['failed']} ZIP files could not be extracted")
+    else:
+        print("All files have been extracted successfully!")
     return True
 
 
 def process_zip_file(zip_path, output_dir):
     """
-    Process a ZIP file: extract all contents.
+    Process a ZIP file: extract all contents, replacing the existing pack.
+    
+    Whether the archive needs extracting at all is decided by the caller (see manifest.Manifest.plan).
     
     Args:
         zip_path (Path): Path to the ZIP file
         output_dir (Path): Directory to store the extraction results
+        
+    Returns:
+        dict: status ("extracted" or "failed"), files and bytes written, fingerprint of the archive
     """
     zip_name = zip_path.stem
     extract_dir = output_dir / zip_name
@@ -76,26 +105,25 @@ def process_zip_file(zip_path, output_dir):
     if temp_dir.exists():
         shutil.rmtree(temp_dir)
     
-    # Check if destination directory already exists
-    if extract_dir.exists() and not ExecutionConfig.OVERWRITE_EXISTING:
-        print(f"Directory {extract_dir} already exists and overwriting is not allowed")
-        return
-    
     # Create temporary directory for extraction
     temp_dir.mkdir()
     
     try:
         # Extract to temporary directory
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            file_list = zip_ref.namelist()
-            print(f"Number of files/directories in {zip_path.name}: {len(file_list)}")
+        with profiling.stage("extract"), zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            infos = zip_ref.infolist()
+            total_bytes = sum(info.file_size for info in infos)
+            fingerprint = archive_fingerprint(zip_path, infos)
+            print(f"Number of files/directories in {zip_path.name}: {len(infos)}")
             zip_ref.extractall(temp_dir)
         
         # Check for duplicate named directory
         temp_contents = list(temp_dir.iterdir())
+        strip = 0
         if len(temp_contents) == 1 and temp_contents[0].is_dir() and temp_contents[0].name == zip_name:
             # If there's a directory with the same name, move its contents up one level
             duplicate_dir = temp_contents[0]
+            strip = 1
             
             # Remove destination directory if it exists
             if extract_dir.exists():
@@ -111,11 +139,11 @@ def process_zip_file(zip_path, output_dir):
             # Use shutil.move instead of rename
             shutil.move(str(temp_dir), str(extract_dir))
         
-        # Count files and directories
-        total_files = sum(1 for _ in extract_dir.rglob('*') if _.is_file())
-        total_dirs = sum(1 for _ in extract_dir.rglob('*') if _.is_dir())
+        # Count files and directories from the central directory
+        total_files, total_dirs = member_counts(infos, strip)
         print(f"Successfully extracted to {extract_dir}")
         print(f"Total: {total_files} files, {total_dirs} directories")
+        return {"status": "extracted", "files": total_files, "bytes": total_bytes, "fingerprint": fingerprint}
         
     except Exception as e:
         print(f"Error extracting {zip_path.name}: {e}")
@@ -128,16 +156,28 @@ def process_zip_file(zip_path, output_dir):
                 shutil.rmtree(extract_dir)
             except:
                 pass
+        return {"status": "failed"}
 
 
 def main():
     """Main function to handle parameters and run the program"""
-    if len(sys.argv) > 1:
-        input_dir = sys.argv[1]
-    else:
-        input_dir = None  # Use default value
-    
-    success = unzip_all_files(input_dir)
+    parser = argparse.ArgumentParser(description="Extract all contents of the ZIP files in a directory")
+    parser.add_argument("input_dir", nargs="?", default=None,
+                        help=f"Directory containing ZIP files (default: {PathConfig.DEFAULT_INPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=ExecutionConfig.WORKERS,
+                        help="Archives extracted concurrently; 0 = one per core for deflated archives, "
+                             f"{ExecutionConfig.IO_WORKERS} for stored ones (default: {ExecutionConfig.WORKERS})")
+    parser.add_argument("--force", action="store_true",
+                        help="Extract every ZIP again, even those unchanged since they were last extracted")
+    parser.add_argument("--profile", nargs="?", const=PathConfig.PROFILE_DIR, default=None,
+                        help=f"Profile the run, writing collapsed stacks for flamegraph tools (default: {PathConfig.PROFILE_DIR})")
+    parser.add_argument("--profile_mode", choices=profiling.MODES, default="sample",
+                        help="Stack sampling or deterministic cProfile (default: sample)")
+    args = parser.parse_args()
+    
+    with profiling.profile_run(args.profile, role="unzip", mode=args.profile_mode) as profile_dir:
+        success = unzip_all_files(args.input_dir, workers=args.workers, profile_dir=profile_dir,
+                                  profile_mode=args.profile_mode, force=args.force)
     
     return 0 if success else 1
 
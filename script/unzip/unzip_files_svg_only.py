@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import argparse
 import zipfile
 import shutil
 import sys
@@ -9,18 +10,29 @@ from pathlib import Path
 
 # Import configuration
 try:
-    from config import PathConfig, ExecutionConfig
+    from config import PROJECT_ROOT, PathConfig, ExecutionConfig
 except ImportError:
     print("Error: Could not import configuration file. Ensure config.py exists.")
     sys.exit(1)
 
-def unzip_files(input_dir=None):
+# Shared opt-in profiler (script/profiling.py)
+sys.path.append(str(PROJECT_ROOT))
+from script import profiling
+from parallel import process_archives
+from members import find_svg_prefix, extract_members
+from manifest import Manifest, archive_fingerprint
+
+def unzip_files(input_dir=None, workers=None, profile_dir=None, profile_mode="sample", force=False):
     """
     Extract all ZIP files in a directory and keep only the 'svg' folders.
     Creates an 'unziped_svg_only' directory to store the extracted content.
     
     Args:
         input_dir (str): Path to directory containing ZIP files
+        workers (int): Archives extracted concurrently (default: ExecutionConfig.WORKERS, 0 = automatic)
+        profile_dir (str): Profile run directory, to profile the worker processes too
+        profile_mode (str): Profiling mode of the worker processes
+        force (bool): Extract every archive, even those whose pack is up to date
     """
     # Use default path if not provided
     if input_dir is None:
@@ -50,85 +62,107 @@ def unzip_files(input_dir=None):
     
     print(f"Found {len(zip_files)} ZIP files to process")
     
-    # Process each zip file
-    for zip_path in zip_files:
-        process_zip_file(zip_path, output_dir)
+    # Only new or changed archives are extracted (see manifest.py)
+    manifest = Manifest(output_dir)
+    
+    def plan(zip_path):
+        return manifest.plan(zip_path, overwrite=ExecutionConfig.OVERWRITE_EXISTING, force=force), output_dir
     
-    print("All files processed successfully!")
+    # Process the zip files concurrently, one process per archive at a time
+    if workers is None:
+        workers = ExecutionConfig.WORKERS
+    summary = process_archives(process_zip_file, zip_files, output_dir, workers=workers,
+                               profile_dir=profile_dir, profile_mode=profile_mode, plan=plan,
+                               on_result=lambda zip_path, _, result: manifest.record(zip_path, result))
+    
+    if summary.get("failed"):
+        print(f"{summary['failed']} ZIP files could not be extracted")
+    else:
+        print("All files processed successfully!")
     return True
 
 
 def process_zip_file(zip_path, output_dir):
     """
-    Process a ZIP file: extract and keep only the svg directory.
+    Process a ZIP file: extract only the svg directory.
+    
+    The svg directory is located from the central directory and only its
+    members are decompressed, into a temporary pack directory that replaces
+    the previous pack at the end, so a failure keeps the old pack. Whether the
+    archive needs extracting at all is decided by the caller (see manifest.Manifest.plan).
     
     Args:
         zip_path (Path): Path to the ZIP file
         output_dir (Path): Directory to store the extraction results
+        
+    Returns:
+        dict: status ("extracted", "no_svg" or "failed"), files and bytes kept, fingerprint of the archive
     """
     zip_name = zip_path.stem
     extract_dir = output_dir / zip_name
+    pack_dir = output_dir / f"_pack_{zip_name}"
     
     print(f"\nProcessing: {zip_path.name}")
     
-    # Create directory for this zip file
-    if extract_dir.exists():
-        if ExecutionConfig.OVERWRITE_EXISTING:
-            shutil.rmtree(extract_dir)
-        else:
-            print(f"Directory {extract_dir} already exists and overwriting is not allowed")
-            return
-    extract_dir.mkdir(exist_ok=True)
+    # Remove temporary directory left by a previous failed run
+    if pack_dir.exists():
+        shutil.rmtree(pack_dir)
     
-    # Extract zip file
     try:
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+            # Find svg directory
+            fingerprint = archive_fingerprint(zip_path, zip_ref.infolist())
+            svg_prefix = find_svg_prefix(zip_ref.namelist())
+            
+            if svg_prefix is None:
+                print(f"Warning: No 'svg' directory found in {zip_path.name}")
+                return {"status": "no_svg", "fingerprint": fingerprint}
+            
+            print(f"Found SVG directory: {svg_prefix.rstrip('/')}")
+            
+            # Extract only the svg members
+            with profiling.stage("extract"):
+                pack_dir.mkdir()
+                (pack_dir / "svg").mkdir()
+                files, total_bytes = extract_members(zip_ref, svg_prefix, pack_dir / "svg")
+        
+        # Swap the finished pack in
+        if extract_dir.exists():
+            shutil.rmtree(extract_dir)
+        pack_dir.rename(extract_dir)
+        
+        print(f"Successfully processed {zip_path.name}")
+        return {"status": "extracted", "files": files, "bytes": total_bytes, "fingerprint": fingerprint}
+        
     except Exception as e:
         print(f"Error extracting {zip_path.name}: {e}")
-        return
-    
-    # Find svg directories
-    svg_dirs = list(extract_dir.rglob("svg"))
+        return {"status": "failed"}
     
-    if not svg_dirs:
-        print(f"Warning: No 'svg' directory found in {zip_path.name}")
-        return
-    
-    # Keep only the first svg directory found
-    svg_dir = svg_dirs[0]
-    print(f"Found SVG directory: {svg_dir.relative_to(extract_dir)}")
-    
-    # Create temporary location for svg directory
-    temp_dir = extract_dir / "_temp_svg"
-    temp_dir.mkdir()
-    
-    # Move svg directory to temporary location
-    shutil.move(str(svg_dir), str(temp_dir))
-    
-    # Delete all other content
-    for item in extract_dir.iterdir():
-        if item != temp_dir:
-            if item.is_dir():
-                shutil.rmtree(item)
-            else:
-                item.unlink()
-    
-    # Move svg back to extraction directory
-    shutil.move(str(temp_dir / "svg"), str(extract_dir))
-    temp_dir.rmdir()
-    
-    print(f"Successfully processed {zip_path.name}")
+    finally:
+        if pack_dir.exists():
+            with profiling.stage("cleanup"):
+                shutil.rmtree(pack_dir, ignore_errors=True)
 
 
 def main():
     """Main function to handle parameters and run the program"""
-    if len(sys.argv) > 1:
-        input_dir = sys.argv[1]
-    else:
-        input_dir = None  # Use default value
-    
-    success = unzip_files(input_dir)
+    parser = argparse.ArgumentParser(description="Extract the ZIP files in a directory, keeping only the 'svg' folders")
+    parser.add_argument("input_dir", nargs="?", default=None,
+                        help=f"Directory containing ZIP files (default: {PathConfig.DEFAULT_INPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=ExecutionConfig.WORKERS,
+                        help="Archives extracted concurrently; 0 = one per core for deflated archives, "
+                             f"{ExecutionConfig.IO_WORKERS} for stored ones (default: {ExecutionConfig.WORKERS})")
+    parser.add_argument("--force", action="store_true",
+                        help="Extract every ZIP again, even those unchanged since they were last extracted")
+    parser.add_argument("--profile", nargs="?", const=PathConfig.PROFILE_DIR, default=None,
+                        help=f"Profile the run, writing collapsed stacks for flamegraph tools (default: {PathConfig.PROFILE_DIR})")
+    parser.add_argument("--profile_mode", choices=profiling.MODES, default="sample",
+                        help="Stack sampling or deterministic cProfile (default: sample)")
+    args = parser.parse_args()
+    
+    with profiling.profile_run(args.profile, role="unzip", mode=args.profile_mode) as profile_dir:
+        success = unzip_files(args.input_dir, workers=args.workers, profile_dir=profile_dir,
+                              profile_mode=args.profile_mode, force=args.force)
     
     return 0 if success else 1
 